@@ -1,46 +1,60 @@
 # analytics.py
+import pandas as pd
 from sqlalchemy import text
 from db import get_engine
 from auth import has_permission
-from report import fetch_report
+from report import fetch_report, show_dataframe
+from demand_forecast import forecast_products, HORIZON_DAYS
+from etl_state import days_ago, as_datetime
+from notification_inbox import (fetch_page, unread_count, mark_read, mark_read_up_to,
+                                compact_if_due, PAGE_SIZE)
 
 engine = get_engine()
 
 # ----------------- Notification Center -----------------
 def notification_center():
-    """Display and manage all system notifications"""
+    """Page through unread notifications, newest first, marking pages read as they are handled"""
     if not has_permission(["MANAGER", "ADMIN"]):
         return
-        
+
     try:
-        with engine.begin() as conn:
-            # Get unread notifications
-            notifications = conn.execute(text("""
-                SELECT notification_id, message, created_at, notification_type
-                FROM notifications 
-                WHERE status = 'unread'
-                ORDER BY created_at DESC
-            """)).fetchall()
-            
-            if not notifications:
-                print("\n📭 No new notifications!")
-                return
-            
-            print("\n🔔 UNREAD NOTIFICATIONS")
-            print("=" * 50)
-            for notif in notifications:
-                print(f"📌 {notif[1]}")
-                print(f"   ⏰ {notif[2].strftime('%Y-%m-%d %H:%M')} | Type: {notif[3]}")
+        compact_if_due(engine)
+        with engine.connect() as conn:
+            total = unread_count(conn)
+        if not total:
+            print("\n📭 No new notifications!")
+            return
+
+        print(f"\n🔔 UNREAD NOTIFICATIONS ({total})")
+        print("=" * 50)
+        cursor, newest_id, marked = None, None, 0
+        while True:
+            with engine.connect() as conn:
+                page, next_cursor = fetch_page(conn, "unread", PAGE_SIZE, before_id=cursor)
+            if not page:
+                break
+            newest_id = newest_id or page[0][0]
+            for notif in page:
+                created = as_datetime(notif[4])
+                print(f"📌 [{notif[0]}] {notif[1]}")
+                print(f"   ⏰ {created.strftime('%Y-%m-%d %H:%M') if created else '-'} | Type: {notif[3]}")
                 print("-" * 40)
-            
-            # Mark as read when viewed
-            conn.execute(text("""
-                UPDATE notifications 
-                SET status = 'read', read_at = CURRENT_TIMESTAMP 
-                WHERE status = 'unread'
-            """))
-            print(f"\n✅ Marked {len(notifications)} notifications as read")
-            
+
+            choice = input("[Enter] mark page read & continue, [a] mark all read, [s] skip page, [q] quit: ").strip().lower()
+            if choice == "q":
+                break
+            if choice == "a":
+                marked += mark_read_up_to(engine, newest_id)
+                break
+            if choice != "s":
+                with engine.begin() as conn:
+                    marked += mark_read(conn, [notif[0] for notif in page])
+            if next_cursor is None:
+                break
+            cursor = next_cursor
+
+        print(f"\n✅ Marked {marked} notifications as read")
+
     except Exception as e:
         print(f"❌ Error accessing notifications: {e}")
 
@@ -57,7 +71,7 @@ def alert_dashboard():
             low_stock = conn.execute(text("""
                 SELECT p.product_id, p.name, p.stock_quantity, p.low_stock_threshold
                 FROM products p
-                WHERE p.stock_quantity < p.low_stock_threshold
+                WHERE p.is_low_stock
                 ORDER BY p.stock_quantity ASC
             """)).fetchall()
             
@@ -94,11 +108,10 @@ def category_sales_report():
     """Sales breakdown by category"""
     query = """
         SELECT c.name as category, 
-               COUNT(si.sale_item_id) as items_sold,
-               SUM(si.quantity * si.unit_price) as revenue
-        FROM sale_items si
-        JOIN products p ON si.product_id = p.product_id
-        JOIN categories c ON p.category_id = c.category_id
+               COUNT(*) as items_sold,
+               SUM(f.line_revenue) as revenue
+        FROM sale_line_fact f
+        JOIN categories c ON f.category_id = c.category_id
         GROUP BY c.category_id, c.name
         ORDER BY revenue DESC
     """
@@ -119,18 +132,20 @@ def supplier_performance():
     fetch_report(query, "Supplier Performance", "supplier_report")
 
 
-def peak_hours_analysis():
-    """Identify busiest store hours"""
+def peak_hours_analysis(days=None):
+    """Identify busiest store hours (optionally only over the last `days` days)"""
     query = """
-        SELECT EXTRACT(HOUR FROM sale_time) as hour_of_day,
-               COUNT(sale_id) as transaction_count,
-               ROUND(AVG(total_amount), 2) as avg_sale_amount,
-               SUM(total_amount) as total_revenue
-        FROM sales
-        GROUP BY EXTRACT(HOUR FROM sale_time)
+        SELECT CAST(SUBSTR(bucket, 12, 2) AS INTEGER) as hour_of_day,
+               SUM(sale_count) as transaction_count,
+               ROUND(SUM(revenue) / NULLIF(SUM(sale_count), 0), 2) as avg_sale_amount,
+               SUM(revenue) as total_revenue
+        FROM sales_rollups
+        WHERE grain = 'hour' AND dim_type = 'all' AND bucket >= :since
+        GROUP BY CAST(SUBSTR(bucket, 12, 2) AS INTEGER)
         ORDER BY transaction_count DESC
     """
-    fetch_report(query, "Peak Hours Analysis", "peak_hours")
+    since = days_ago(days) if days else ""
+    fetch_report(query, "Peak Hours Analysis", "peak_hours", {"since": since})
 
 
 def customer_analytics():
@@ -141,7 +156,7 @@ def customer_analytics():
                SUM(s.total_amount) as total_spent,
                MAX(s.sale_time) as last_visit
         FROM customers c
-        LEFT JOIN sales s ON c.customer_id = s.customer_id
+        LEFT JOIN sales_history s ON c.customer_id = s.customer_id
         GROUP BY c.customer_id, c.name, c.phone, c.email
         HAVING COUNT(s.sale_id) > 0
         ORDER BY total_spent DESC
@@ -150,36 +165,36 @@ def customer_analytics():
 
 
 def predictive_restocking():
-    """Predict which products will need restocking soon"""
-    query = """
-        SELECT p.product_id, p.name, p.stock_quantity, 
-               p.low_stock_threshold,
-               COALESCE(SUM(si.quantity), 0) as weekly_sales,
-               CASE 
-                   WHEN COALESCE(SUM(si.quantity), 0) = 0 THEN 999
-                   ELSE ROUND(p.stock_quantity / NULLIF(SUM(si.quantity), 0) * 7, 2)
-               END as days_remaining
-        FROM products p
-        LEFT JOIN sale_items si ON p.product_id = si.product_id
-        LEFT JOIN sales s ON si.sale_id = s.sale_id
-        WHERE s.sale_time >= CURRENT_DATE - INTERVAL '7 days' OR s.sale_time IS NULL
-        GROUP BY p.product_id, p.name, p.stock_quantity, p.low_stock_threshold
-        ORDER BY days_remaining ASC
-    """
-    fetch_report(query, "Predictive Restocking Analysis", "predictive_restock")
+    """Forecast demand per product, soonest expected stockouts first"""
+    try:
+        forecast = forecast_products(engine)
+        if forecast.empty:
+            print("\n⚠️ No products to forecast!\n")
+            return
+        never = f"> {HORIZON_DAYS} days"
+        report = forecast.assign(
+            days_until_stockout=[never if pd.isna(d) else int(d) for d in forecast["days_until_stockout"]],
+            stockout_date=[never if pd.isna(d) else d.strftime("%Y-%m-%d") for d in forecast["stockout_date"]],
+        )
+        show_dataframe(report[["product_id", "name", "stock_quantity", "model", "avg_daily_forecast",
+                               "safety_stock", "reorder_point", "days_until_stockout", "stockout_date",
+                               "needs_restock"]],
+                       "Predictive Restocking Analysis")
+    except Exception as e:
+        print(f"❌ Error forecasting demand: {e}")
 
 
 def seasonal_trends():
     """Analyze seasonal sales trends"""
     query = """
-        SELECT EXTRACT(MONTH FROM s.sale_time) as month,
-               EXTRACT(YEAR FROM s.sale_time) as year,
-               COUNT(s.sale_id) as transaction_count,
-               SUM(s.total_amount) as total_revenue,
-               ROUND(AVG(s.total_amount), 2) as avg_sale
-        FROM sales s
-        GROUP BY EXTRACT(YEAR FROM s.sale_time), EXTRACT(MONTH FROM s.sale_time)
-        ORDER BY year, month
+        SELECT CAST(SUBSTR(bucket, 6, 2) AS INTEGER) as month,
+               CAST(SUBSTR(bucket, 1, 4) AS INTEGER) as year,
+               sale_count as transaction_count,
+               revenue as total_revenue,
+               ROUND(revenue / NULLIF(sale_count, 0), 2) as avg_sale
+        FROM sales_rollups
+        WHERE grain = 'month' AND dim_type = 'all'
+        ORDER BY bucket
     """
     fetch_report(query, "Seasonal Sales Trends", "seasonal_trends")
 
@@ -193,7 +208,7 @@ def customer_lifetime_value():
                ROUND(SUM(s.total_amount) / COUNT(s.sale_id), 2) as avg_visit_value,
                MAX(s.sale_time) as last_visit
         FROM customers c
-        JOIN sales s ON c.customer_id = s.customer_id
+        JOIN sales_history s ON c.customer_id = s.customer_id
         GROUP BY c.customer_id, c.name, c.phone
         ORDER BY lifetime_value DESC
     """
@@ -0,0 +1,202 @@
+# analytics_backend.py
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from sqlalchemy import text
+from db import get_engine
+from db_config import SALES_COLUMNS, SALE_ITEM_COLUMNS, sales_archive_path, sales_archive_years
+
+engine = get_engine()
+
+# "sql" runs reports on the transactional database, "duckdb" runs them on an
+# embedded DuckDB engine that attaches the same database read-only.
+ANALYTICS_BACKEND = os.getenv("ANALYTICS_BACKEND", "sql")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+
+
+def _parse_report_backends(spec):
+    """Parse 'category_sales=duckdb,peak_hours=duckdb' into a dict."""
+    backends = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, backend = item.partition("=")
+        backends[name.strip()] = backend.strip() or ANALYTICS_BACKEND
+    return backends
+
+
+# Rows per chunk when streaming a result (exports)
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+
+# Upper bound on queries a dashboard runs at once; keep it within the engine's pool size
+DASHBOARD_WORKERS = int(os.getenv("DASHBOARD_WORKERS", "4"))
+
+# Per-report override, e.g. REPORT_BACKENDS="category_sales=duckdb,supplier_scorecard=duckdb"
+REPORT_BACKENDS = _parse_report_backends(os.getenv("REPORT_BACKENDS", ""))
+
+# One embedded DuckDB connection per attached source database (keyed by URL)
+_duckdb_conns = {}
+# Per-year SQLite sales archives attached to each of those connections
+_duckdb_archives = {}
+_duckdb_lock = threading.Lock()
+_duckdb_warned = False
+
+# :name bind parameters (but not ::casts) -> DuckDB $name parameters
+_BIND_PARAM = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+def backend_for(report=None):
+    """Return the backend configured for a report."""
+    return REPORT_BACKENDS.get(report, ANALYTICS_BACKEND)
+
+
+def set_report_backend(report, backend):
+    """Select the backend for one report at runtime ('sql' or 'duckdb')."""
+    if backend not in ("sql", "duckdb"):
+        raise ValueError("backend must be 'sql' or 'duckdb'")
+    REPORT_BACKENDS[report] = backend
+
+
+def _attach_statement(source_engine):
+    url = source_engine.url
+    if source_engine.dialect.name == "sqlite":
+        return "sqlite", "oltp.main", f"ATTACH '{url.database}' AS oltp (TYPE SQLITE, READ_ONLY)"
+    if source_engine.dialect.name == "postgresql":
+        dsn = " ".join(f"{key}={value}" for key, value in (
+            ("host", url.host), ("port", url.port), ("dbname", url.database),
+            ("user", url.username), ("password", url.password)) if value is not None)
+        return "postgres", "oltp.public", f"ATTACH '{dsn}' AS oltp (TYPE POSTGRES, READ_ONLY)"
+    raise RuntimeError(f"DuckDB cannot attach a '{source_engine.dialect.name}' database")
+
+
+def _sales_history_views(con, key):
+    """
+    SQLite's sales_history / sale_items_history are TEMP views of each
+    SQLAlchemy connection, which DuckDB cannot see; define the same union
+    over oltp and the per-year archives, re-attaching when a rollover added a year.
+    """
+    years = sales_archive_years()
+    if years == _duckdb_archives.get(key):
+        return
+    for year in sorted(set(years) - set(_duckdb_archives.get(key, []))):
+        con.execute(f"ATTACH '{sales_archive_path(year)}' AS archive_{year} (TYPE SQLITE, READ_ONLY)")
+    sales = [f"SELECT {SALES_COLUMNS} FROM oltp.sales"]
+    items = [f"SELECT {SALE_ITEM_COLUMNS} FROM oltp.sale_items"]
+    for year in years:
+        sales.append(f"SELECT {SALES_COLUMNS} FROM archive_{year}.sales")
+        items.append(f"SELECT {SALE_ITEM_COLUMNS} FROM archive_{year}.sale_items")
+    con.execute(f"CREATE OR REPLACE VIEW memory.main.sales_history AS {' UNION ALL '.join(sales)}")
+    con.execute(f"CREATE OR REPLACE VIEW memory.main.sale_items_history AS {' UNION ALL '.join(items)}")
+    _duckdb_archives[key] = years
+
+
+def get_duckdb(source_engine=None):
+    """Return the shared embedded DuckDB connection for a database, attaching it on first use."""
+    source_engine = source_engine or engine
+    key = str(source_engine.url)
+    with _duckdb_lock:
+        if key not in _duckdb_conns:
+            import duckdb
+            extension, schema, attach = _attach_statement(source_engine)
+            con = duckdb.connect()
+            con.execute(f"INSTALL {extension}")
+            con.execute(f"LOAD {extension}")
+            con.execute(attach)
+
+            # Columnar sale-line snapshots (see snapshot_export.py) are exposed as sales_fact
+            fact_glob = os.path.join(SNAPSHOT_DIR, "sales_fact", "*", "*.parquet")
+            if os.path.isdir(os.path.join(SNAPSHOT_DIR, "sales_fact")):
+                con.execute(f"""
+                    CREATE VIEW memory.main.sales_fact AS
+                    SELECT * FROM read_parquet('{fact_glob}', hive_partitioning = true)
+                """)
+            # Postgres tables appear under oltp.public, SQLite tables under oltp.main
+            con.execute(f"SET search_path = '{schema},memory.main'")
+            _duckdb_conns[key] = con
+        if source_engine.dialect.name == "sqlite":
+            _sales_history_views(_duckdb_conns[key], key)
+        return _duckdb_conns[key]
+
+
+def _run_duckdb(query, params, as_frame=True, source_engine=None):
+    # Each call gets its own cursor so concurrent reports do not share state
+    cursor = get_duckdb(source_engine).cursor()
+    try:
+        query = _BIND_PARAM.sub(r"$\1", query)
+        result = cursor.execute(query, params) if params else cursor.execute(query)
+        return result.df() if as_frame else result.fetchall()
+    finally:
+        cursor.close()
+
+
+def _use_duckdb(backend):
+    global _duckdb_warned
+    if backend != "duckdb":
+        return False
+    try:
+        import duckdb  # noqa: F401
+        return True
+    except ImportError:
+        if not _duckdb_warned:
+            print("⚠️ duckdb is not installed; running reports on the database instead")
+            _duckdb_warned = True
+        return False
+
+
+def fetch_dataframe(query, params=None, report=None, backend=None, source_engine=None):
+    """Run a report query on the selected backend and return a DataFrame."""
+    backend = backend or backend_for(report)
+    if _use_duckdb(backend):
+        return _run_duckdb(query, params, source_engine=source_engine)
+    with (source_engine or engine).connect() as conn:
+        return pd.read_sql(text(query), conn, params=params)
+
+
+def fetch_rows(query, params=None, report=None, backend=None, source_engine=None):
+    """Run a report query on the selected backend and return a list of row tuples."""
+    backend = backend or backend_for(report)
+    if _use_duckdb(backend):
+        return _run_duckdb(query, params, as_frame=False, source_engine=source_engine)
+    with (source_engine or engine).connect() as conn:
+        return conn.execute(text(query), params or {}).fetchall()
+
+
+def iter_dataframes(query, params=None, report=None, backend=None, source_engine=None,
+                    chunksize=EXPORT_CHUNK_ROWS):
+    """
+    Run a report query and yield its result as DataFrames of at most
+    chunksize rows. The database side uses a server-side cursor where the
+    driver supports one and DuckDB yields Arrow record batches, so memory
+    stays bounded by the chunk size however large the result is.
+    """
+    backend = backend or backend_for(report)
+    if _use_duckdb(backend):
+        cursor = get_duckdb(source_engine).cursor()
+        try:
+            query = _BIND_PARAM.sub(r"$\1", query)
+            result = cursor.execute(query, params) if params else cursor.execute(query)
+            for batch in result.fetch_record_batch(chunksize):
+                yield batch.to_pandas()
+        finally:
+            cursor.close()
+        return
+    with (source_engine or engine).connect() as conn:
+        conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+        yield from pd.read_sql(text(query), conn, params=params, chunksize=chunksize)
+
+
+def fetch_all(queries, report=None, backend=None, source_engine=None, max_workers=DASHBOARD_WORKERS):
+    """
+    Run independent report queries concurrently and return {name: rows}.
+    queries maps a name to a SQL string or a (sql, params) pair. Each query
+    runs on its own pooled connection (or DuckDB cursor), so a dashboard
+    takes about as long as its slowest query. The first error is re-raised.
+    """
+    jobs = {name: (spec, None) if isinstance(spec, str) else spec for name, spec in queries.items()}
+    if len(jobs) <= 1 or max_workers <= 1:
+        return {name: fetch_rows(query, params, report, backend, source_engine)
+                for name, (query, params) in jobs.items()}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(jobs))) as pool:
+        futures = {name: pool.submit(fetch_rows, query, params, report, backend, source_engine)
+                   for name, (query, params) in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
@@ -1,11 +1,26 @@
 from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from sqlalchemy import text
 from db_config import get_engine
+from sale_events import after_sale
+from etl_state import days_ago
+from stock_alerts import adjust_stock, decrement_for_sale
+from purchase_receiving import receive_purchase_orders, pending_purchase_orders
+from notification_inbox import fetch_page, unread_count, mark_read, mark_read_up_to
+from report_cache import bump_data_version
+from sales_sketches import sketch_metrics
+from report_catalog import REPORTS
+from report_scheduler import list_snapshots, latest_snapshot
+from market_basket import frequently_bought_together
+from customer_segments import segment_summary, segment_customers, customer_segment
+from report_jobs import (submit_report_job, job_status, list_jobs, job_result_path,
+                         shutdown_jobs)
 import bcrypt
 import datetime
+import json
 
 app = FastAPI(title="SuperMarket Management API")
 
@@ -63,6 +78,17 @@ class StockUpdate(BaseModel):
     product_id: int
     quantity: int
 
+class ReceiveOrders(BaseModel):
+    order_ids: List[int]
+
+class ReportJobRequest(BaseModel):
+    report: str
+    params: Optional[Dict[str, Any]] = None
+
+class MarkNotificationsRead(BaseModel):
+    ids: Optional[List[int]] = None
+    up_to: Optional[int] = None
+
 @app.get("/")
 async def root():
     return {"message": "SuperMarket Management API", "version": "1.0"}
@@ -146,6 +172,7 @@ async def add_product(product: Product):
                 "threshold": product.low_stock_threshold
             })
             product_id = result.fetchone()[0]
+            bump_data_version(conn)
         return {"message": "Product added successfully", "product_id": product_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -239,12 +266,9 @@ async def create_sale(sale: Sale):
                     "price": item['price'],
                     "subtotal": item['subtotal']
                 })
-                
-                conn.execute(text("""
-                    UPDATE products 
-                    SET stock_quantity = stock_quantity - :qty
-                    WHERE product_id = :pid
-                """), {"qty": item['quantity'], "pid": item['product_id']})
+            
+            decrement_for_sale(conn, [(item['product_id'], item['quantity']) for item in cart])
+            after_sale(conn, sale_id)
         
         return {"message": "Sale completed successfully", "sale_id": sale_id, "total": total}
     except HTTPException:
@@ -288,7 +312,7 @@ async def get_sale_details(sale_id: int):
         with engine.connect() as conn:
             result = conn.execute(text("""
                 SELECT si.product_id, p.name, si.quantity, si.unit_price, si.subtotal
-                FROM sale_items si
+                FROM sale_items_history si
                 JOIN products p ON si.product_id = p.product_id
                 WHERE si.sale_id = :sid
             """), {"sid": sale_id})
@@ -341,6 +365,47 @@ async def add_customer(customer: Customer):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/customers/segments")
+async def get_customer_segments(segment: Optional[str] = None, limit: int = 50,
+                                after_id: Optional[int] = None):
+    try:
+        # Serves the stored segments; the customer_segments scheduler job refreshes them
+        with engine.connect() as conn:
+            summary = segment_summary(conn)
+            rows = segment_customers(conn, segment, min(limit, 500), after_id)
+        return {
+            "segments": [
+                {"segment": r[0], "customers": r[1], "avg_r": float(r[2]), "avg_f": float(r[3]),
+                 "avg_m": float(r[4]), "monetary": float(r[5])}
+                for r in summary
+            ],
+            "customers": [
+                {"customer_id": r[0], "name": r[1], "phone": r[2], "last_purchase": str(r[3]),
+                 "frequency": r[4], "monetary": float(r[5]), "rfm_score": r[6], "segment": r[7]}
+                for r in rows
+            ],
+            "next_cursor": rows[-1][0] if len(rows) == min(limit, 500) else None,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/customers/{customer_id}/segment")
+async def get_customer_segment(customer_id: int):
+    try:
+        with engine.connect() as conn:
+            row = customer_segment(conn, customer_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Customer has no purchases to segment")
+        return {
+            "customer_id": row[0], "last_purchase": str(row[1]), "frequency": row[2],
+            "monetary": float(row[3]), "r_score": row[4], "f_score": row[5], "m_score": row[6],
+            "rfm_score": row[7], "segment": row[8], "updated_at": str(row[9]),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/employees")
 async def get_employees():
     try:
@@ -376,20 +441,27 @@ async def add_employee(employee: Employee):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/products/{product_id}/bought-together")
+async def get_bought_together(product_id: int, limit: int = 10):
+    try:
+        with engine.connect() as conn:
+            rows = frequently_bought_together(conn, product_id, limit)
+        return {"product_id": product_id, "related": [
+            {"product_id": r[0], "name": r[1], "baskets": r[2],
+             "support": r[3], "confidence": r[4], "lift": r[5]}
+            for r in rows
+        ]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.put("/api/products/{product_id}/stock")
 async def update_stock(product_id: int, stock_update: StockUpdate):
     try:
         with engine.begin() as conn:
-            result = conn.execute(text("""
-                UPDATE products 
-                SET stock_quantity = stock_quantity + :qty
-                WHERE product_id = :pid
-                RETURNING name, stock_quantity
-            """), {"qty": stock_update.quantity, "pid": product_id})
-            
-            updated = result.fetchone()
+            updated = adjust_stock(conn, product_id, stock_update.quantity)
             if not updated:
                 raise HTTPException(status_code=404, detail="Product not found")
+            bump_data_version(conn)
         
         return {"message": f"Stock updated for {updated[0]}", "new_stock": updated[1]}
     except HTTPException:
@@ -397,16 +469,46 @@ async def update_stock(product_id: int, stock_update: StockUpdate):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/purchase-orders")
+async def get_pending_purchase_orders():
+    try:
+        with engine.connect() as conn:
+            rows = pending_purchase_orders(conn)
+        
+        orders = [
+            {"order_id": r[0], "supplier_id": r[1], "supplier": r[2], "order_date": str(r[3]),
+             "lines": r[4], "units": r[5], "value": float(r[6])}
+            for r in rows
+        ]
+        return {"purchase_orders": orders}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/purchase-orders/receive")
+async def receive_orders(receipt: ReceiveOrders):
+    try:
+        with engine.begin() as conn:
+            summary = receive_purchase_orders(conn, receipt.order_ids)
+        return {"message": f"Received {len(summary['orders'])} purchase order(s)", **summary}
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/purchase-orders/{order_id}/receive")
+async def receive_order(order_id: int):
+    return await receive_orders(ReceiveOrders(order_ids=[order_id]))
+
 @app.get("/api/dashboard/stats")
 async def get_dashboard_stats():
     try:
         with engine.connect() as conn:
             total_products = conn.execute(text("SELECT COUNT(*) FROM products")).scalar()
-            total_sales = conn.execute(text("SELECT COUNT(*) FROM sales")).scalar()
-            total_revenue = conn.execute(text("SELECT COALESCE(SUM(total_amount), 0) FROM sales")).scalar()
+            total_sales = conn.execute(text("SELECT COUNT(*) FROM sales_history")).scalar()
+            total_revenue = conn.execute(text("SELECT COALESCE(SUM(total_amount), 0) FROM sales_history")).scalar()
             low_stock_count = conn.execute(text("""
                 SELECT COUNT(*) FROM products 
-                WHERE stock_quantity <= low_stock_threshold
+                WHERE is_low_stock
             """)).scalar()
             
             recent_sales = conn.execute(text("""
@@ -425,19 +527,26 @@ async def get_dashboard_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/dashboard/sketches")
+async def get_dashboard_sketches(start: Optional[str] = None, end: Optional[str] = None, top: int = 10):
+    try:
+        start = start or days_ago(30)
+        end = end or datetime.date.today().isoformat()
+        if start > end:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+        with engine.connect() as conn:
+            return sketch_metrics(conn, start, end, min(top, 50))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/notifications")
-async def get_notifications():
+async def get_notifications(status: Optional[str] = None, limit: int = 50, before_id: Optional[int] = None):
     try:
         with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT n.notification_id, n.message, n.status, n.notification_type, 
-                       n.created_at, p.name as product_name
-                FROM notifications n
-                LEFT JOIN products p ON n.product_id = p.product_id
-                ORDER BY n.created_at DESC
-                LIMIT 50
-            """))
-            rows = result.fetchall()
+            rows, next_cursor = fetch_page(conn, status, limit, before_id)
+            unread = unread_count(conn)
         
         notifications = [
             {
@@ -446,25 +555,109 @@ async def get_notifications():
                 "status": r[2],
                 "type": r[3],
                 "created_at": str(r[4]),
-                "product_name": r[5]
+                "product_name": r[6]
             }
             for r in rows
         ]
-        return {"notifications": notifications}
+        return {"notifications": notifications, "next_cursor": next_cursor, "unread_count": unread}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/notifications/read")
+async def mark_notifications_read(request: MarkNotificationsRead):
+    if not request.ids and request.up_to is None:
+        raise HTTPException(status_code=400, detail="Give notification ids or an up_to cursor")
+    try:
+        marked = 0
+        if request.ids:
+            with engine.begin() as conn:
+                marked += mark_read(conn, request.ids)
+        if request.up_to is not None:
+            marked += mark_read_up_to(engine, request.up_to)
+        return {"message": f"Marked {marked} notification(s) as read", "marked": marked}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/reports/precomputed")
+async def get_precomputed_reports():
+    try:
+        with engine.connect() as conn:
+            snapshots = list_snapshots(conn)
+        return {"reports": [
+            {"report": r[0], "title": REPORTS[r[0]]["title"] if r[0] in REPORTS else r[0],
+             "generated_at": str(r[1]), "rows": r[2], "duration_ms": r[3]}
+            for r in snapshots
+        ]}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/reports/precomputed/{report_name}")
+async def get_precomputed_report(report_name: str):
+    try:
+        with engine.connect() as conn:
+            snapshot = latest_snapshot(conn, report_name)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail=f"No precomputed copy of '{report_name}'")
+        generated_at, df = snapshot
+        return {"report": report_name, "generated_at": generated_at.isoformat(sep=" "),
+                "data": json.loads(df.to_json(orient="records", date_format="iso"))}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/reports/jobs", status_code=202)
+async def create_report_job(request: ReportJobRequest):
+    try:
+        job, deduplicated = submit_report_job(request.report, request.params)
+        return {**job, "deduplicated": deduplicated}
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown report '{request.report}'")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/reports/jobs")
+async def get_report_jobs():
+    return {"jobs": list_jobs()}
+
+@app.get("/api/reports/jobs/{job_id}")
+async def get_report_job(job_id: str):
+    job = job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# Plain def: format conversion of large results runs in the threadpool, off the event loop
+@app.get("/api/reports/jobs/{job_id}/download")
+def download_report_job(job_id: str, format: str = "csv"):
+    try:
+        path = job_result_path(job_id, format)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Job not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    job = job_status(job_id)
+    return FileResponse(path, filename=f"{job['report']}_{job_id[:8]}.{format}")
+
+@app.on_event("shutdown")
+def stop_report_jobs():
+    shutdown_jobs()
+
 @app.get("/api/reports/sales-by-date")
 async def get_sales_by_date(days: int = 7):
     try:
         with engine.connect() as conn:
             result = conn.execute(text("""
-                SELECT DATE(sale_time) as sale_date, COUNT(*) as count, SUM(total_amount) as total
-                FROM sales
-                WHERE sale_time >= DATE('now', :days_ago)
-                GROUP BY DATE(sale_time)
-                ORDER BY sale_date DESC
-            """), {"days_ago": f"-{days} days"})
+                SELECT bucket as sale_date, sale_count as count, revenue as total
+                FROM sales_rollups
+                WHERE grain = 'day' AND dim_type = 'all' AND dim_id = 0
+                  AND bucket >= :since
+                ORDER BY bucket DESC
+            """), {"since": days_ago(days)})
             rows = result.fetchall()
         
         data = [
@@ -0,0 +1,482 @@
+# backup.py
+import os
+import csv
+import gzip
+import json
+import shutil
+import sqlite3
+import hashlib
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import inspect
+from db_config import sales_archive_path, sales_archive_years
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+# Pages copied per step of the SQLite online backup; the source lock is
+# released between steps so checkout writers are never blocked for long.
+SQLITE_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "256"))
+RESTORE_WORKERS = int(os.getenv("RESTORE_WORKERS", "4"))
+# Full SQLite backups retry while a sales rollover is moving months
+SQLITE_ARCHIVE_ATTEMPTS = 5
+
+# Append-only tables that incremental backups export by key range
+INCREMENTAL_TABLES = {"sales": "sale_id", "sale_items": "sale_item_id"}
+
+
+# ------------------ Helpers ------------------
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _file_entry(backup_dir, path, table, fmt, rows=None):
+    return {
+        "table": table,
+        "path": os.path.relpath(path, backup_dir),
+        "format": fmt,
+        "rows": rows,
+        "sha256": _sha256_file(path),
+    }
+
+
+def _list_manifests(backup_dir):
+    if not os.path.isdir(backup_dir):
+        return []
+    names = [n for n in os.listdir(backup_dir) if n.endswith(".manifest.json")]
+    return sorted(os.path.join(backup_dir, n) for n in names)
+
+
+def load_manifest(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def latest_manifest(backup_dir=BACKUP_DIR, dialect=None):
+    """Return the path of the most recent backup manifest (optionally for one dialect)."""
+    for path in reversed(_list_manifests(backup_dir)):
+        if dialect is None or load_manifest(path)["dialect"] == dialect:
+            return path
+    return None
+
+
+def _table_levels(engine, tables):
+    """Group tables into load levels so every FK parent is loaded before its children."""
+    inspector = inspect(engine)
+    parents = {
+        t: {fk["referred_table"] for fk in inspector.get_foreign_keys(t)
+            if fk["referred_table"] in tables and fk["referred_table"] != t}
+        for t in tables
+    }
+    levels, placed = [], set()
+    while len(placed) < len(tables):
+        level = sorted(t for t in tables if t not in placed and parents[t] <= placed)
+        if not level:  # FK cycle: load the remainder together
+            level = sorted(t for t in tables if t not in placed)
+        levels.append(level)
+        placed.update(level)
+    return levels
+
+
+def _copy_columns(engine, table):
+    """Columns that can be written back with COPY (generated columns are skipped)."""
+    columns = inspect(engine).get_columns(table)
+    return [c["name"] for c in columns if not c.get("computed")]
+
+
+# ------------------ Backup ------------------
+def create_backup(engine, mode="full", backup_dir=BACKUP_DIR, progress=None):
+    """
+    Create a compressed, checksummed backup and return its manifest path.
+    mode='full' copies the whole database; mode='incremental' exports only the
+    sales/sale_items rows added since the previous backup's high-water marks.
+    """
+    if mode not in ("full", "incremental"):
+        raise ValueError(f"Unknown backup mode: {mode}")
+
+    os.makedirs(backup_dir, exist_ok=True)
+    dialect = engine.dialect.name
+    base = None
+    high_water = {t: 0 for t in INCREMENTAL_TABLES}
+    if mode == "incremental":
+        base = latest_manifest(backup_dir, dialect)
+        if base is None:
+            raise RuntimeError("No previous backup found; run a full backup first.")
+        high_water.update(load_manifest(base)["high_water"])
+
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    prefix = os.path.join(backup_dir, f"backup_{stamp}_{mode}")
+
+    if dialect == "sqlite":
+        files, new_high_water = _backup_sqlite(engine, mode, prefix, backup_dir, high_water, progress)
+    elif dialect == "postgresql":
+        files, new_high_water = _backup_postgres(engine, mode, prefix, backup_dir, high_water)
+    else:
+        raise RuntimeError(f"Backups are not supported for dialect '{dialect}'")
+
+    manifest = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "mode": mode,
+        "dialect": dialect,
+        "base": os.path.basename(base) if base else None,
+        "high_water": new_high_water,
+        "files": files,
+    }
+    manifest_path = f"{prefix}.manifest.json"
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest_path
+
+
+def _sqlite_snapshot(src_path, snapshot_path, progress=None):
+    """Online-copy one SQLite database file to snapshot_path."""
+    src, dst = sqlite3.connect(src_path), sqlite3.connect(snapshot_path)
+    try:
+        src.backup(dst, pages=SQLITE_PAGES_PER_STEP, progress=progress, sleep=0.005)
+    finally:
+        src.close()
+        dst.close()
+
+
+def _gzip_file(path):
+    with open(path, "rb") as raw, gzip.open(f"{path}.gz", "wb") as gz:
+        shutil.copyfileobj(raw, gz, 1024 * 1024)
+    os.remove(path)
+    return f"{path}.gz"
+
+
+def _sqlite_rollover_state(conn):
+    try:
+        row = conn.execute("SELECT state FROM etl_watermarks WHERE job_name = 'sales_rollover'").fetchone()
+    except sqlite3.OperationalError:  # database predates etl_watermarks
+        return None
+    return row[0] if row else None
+
+
+def _backup_sqlite_full(db_path, prefix, backup_dir, progress):
+    """
+    Snapshot the main database and every per-year sales archive. The archives
+    are copied first and the main database last; if a rollover month committed
+    in between (the rollover state moved), both are copied again so no sale is
+    missing from, or in both of, the snapshots.
+    """
+    snapshot_path = f"{prefix}.db"
+    for _ in range(SQLITE_ARCHIVE_ATTEMPTS):
+        with sqlite3.connect(db_path) as conn:
+            before = _sqlite_rollover_state(conn)
+        archives = {}
+        for year in sales_archive_years():
+            archives[year] = f"{prefix}.sales_{year}.db"
+            _sqlite_snapshot(sales_archive_path(year), archives[year])
+        _sqlite_snapshot(db_path, snapshot_path, progress)
+        dst = sqlite3.connect(snapshot_path)
+        try:
+            after = _sqlite_rollover_state(dst)
+            new_high_water = _sqlite_high_water(dst)
+        finally:
+            dst.close()
+        if after == before:
+            break
+        for path in [snapshot_path, *archives.values()]:
+            os.remove(path)
+    else:
+        raise RuntimeError("Sales were being rolled over during the backup; try again later")
+
+    files = [_file_entry(backup_dir, _gzip_file(snapshot_path), None, "sqlite-db")]
+    for year, path in archives.items():
+        entry = _file_entry(backup_dir, _gzip_file(path), None, "sqlite-archive")
+        entry["year"] = year
+        files.append(entry)
+    return files, new_high_water
+
+
+def _backup_sqlite(engine, mode, prefix, backup_dir, high_water, progress):
+    db_path = engine.url.database
+    if mode == "full":
+        return _backup_sqlite_full(db_path, prefix, backup_dir, progress)
+    src = sqlite3.connect(db_path)
+    try:
+        files, new_high_water = [], dict(high_water)
+        src.execute("BEGIN")  # read both tables from the same snapshot
+        for table, key in INCREMENTAL_TABLES.items():
+            path = f"{prefix}.{table}.csv.gz"
+            cursor = src.execute(
+                f"SELECT * FROM {table} WHERE {key} > ? ORDER BY {key}", (high_water[table],)
+            )
+            header = [d[0] for d in cursor.description]
+            key_index = header.index(key)
+            rows = 0
+            with gzip.open(path, "wt", newline="", encoding="utf-8") as gz:
+                writer = csv.writer(gz)
+                writer.writerow(header)
+                for batch in iter(lambda: cursor.fetchmany(5000), []):
+                    writer.writerows(batch)
+                    rows += len(batch)
+                    new_high_water[table] = batch[-1][key_index]
+            files.append(_file_entry(backup_dir, path, table, "csv", rows))
+        return files, new_high_water
+    finally:
+        src.close()
+
+
+def _sqlite_high_water(conn):
+    return {
+        table: conn.execute(f"SELECT COALESCE(MAX({key}), 0) FROM {table}").fetchone()[0]
+        for table, key in INCREMENTAL_TABLES.items()
+    }
+
+
+def _pg_partitions(cur):
+    """{parent: [(partition, bound)]} for partitioned tables in the current schema."""
+    cur.execute("""
+        SELECT parent.relname, child.relname, pg_get_expr(child.relpartbound, child.oid)
+        FROM pg_inherits i
+        JOIN pg_class child ON child.oid = i.inhrelid
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        WHERE child.relispartition AND child.relkind = 'r'
+          AND child.relnamespace = current_schema()::regnamespace
+        ORDER BY child.relname
+    """)
+    partitions = {}
+    for parent, child, bound in cur.fetchall():
+        partitions.setdefault(parent, []).append((child, bound))
+    return partitions
+
+
+def _backup_postgres(engine, mode, prefix, backup_dir, high_water):
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        # One snapshot for every table so the backup is transactionally consistent
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+        partitions = _pg_partitions(cur)
+        if mode == "full":
+            # Partition rows are exported once, through their parent table
+            children = {child for members in partitions.values() for child, _ in members}
+            tables = sorted(set(inspect(engine).get_table_names()) - children)
+        else:
+            tables = list(INCREMENTAL_TABLES)
+        new_high_water = {}
+        for table, key in INCREMENTAL_TABLES.items():
+            cur.execute(f"SELECT COALESCE(MAX({key}), 0) FROM {table}")
+            new_high_water[table] = cur.fetchone()[0]
+
+        files = []
+        for table in tables:
+            columns = ", ".join(_copy_columns(engine, table))
+            if table in INCREMENTAL_TABLES and mode == "incremental":
+                key = INCREMENTAL_TABLES[table]
+                source = (f"(SELECT {columns} FROM {table} WHERE {key} > {int(high_water[table])} "
+                          f"AND {key} <= {int(new_high_water[table])} ORDER BY {key})")
+            else:
+                source = f"(SELECT {columns} FROM {table})"
+            path = f"{prefix}.{table}.csv.gz"
+            with gzip.open(path, "wb") as gz:
+                cur.copy_expert(f"COPY {source} TO STDOUT WITH (FORMAT csv, HEADER true)", gz)
+            entry = _file_entry(backup_dir, path, table, "csv", cur.rowcount)
+            if table in partitions:
+                entry["partitions"] = partitions[table]
+            files.append(entry)
+        raw.rollback()
+        return files, new_high_water
+    finally:
+        raw.close()
+
+
+# ------------------ Verify ------------------
+def backup_chain(manifest_path):
+    """Return the manifests to apply (full first, then incrementals) for a restore."""
+    backup_dir = os.path.dirname(manifest_path) or "."
+    chain = [manifest_path]
+    manifest = load_manifest(manifest_path)
+    while manifest["base"]:
+        base_path = os.path.join(backup_dir, manifest["base"])
+        if not os.path.exists(base_path):
+            raise FileNotFoundError(f"Missing base backup: {manifest['base']}")
+        chain.append(base_path)
+        manifest = load_manifest(base_path)
+    if manifest["mode"] != "full":
+        raise RuntimeError("Backup chain does not start with a full backup")
+    return list(reversed(chain))
+
+
+def verify_backup(manifest_path):
+    """Check every file in the backup chain against its recorded SHA-256."""
+    problems = []
+    for path in backup_chain(manifest_path):
+        backup_dir = os.path.dirname(path) or "."
+        for entry in load_manifest(path)["files"]:
+            file_path = os.path.join(backup_dir, entry["path"])
+            if not os.path.exists(file_path):
+                problems.append(f"missing {entry['path']}")
+            elif _sha256_file(file_path) != entry["sha256"]:
+                problems.append(f"checksum mismatch {entry['path']}")
+    return problems
+
+
+# ------------------ Restore ------------------
+def restore_backup(engine, manifest_path, workers=RESTORE_WORKERS):
+    """
+    Restore a backup chain into the database behind engine.
+    Checksums are verified before anything is touched.
+    """
+    problems = verify_backup(manifest_path)
+    if problems:
+        raise RuntimeError("Backup verification failed: " + "; ".join(problems))
+
+    chain = backup_chain(manifest_path)
+    dialect = engine.dialect.name
+    for path in chain:
+        if load_manifest(path)["dialect"] != dialect:
+            raise RuntimeError(f"Backup {os.path.basename(path)} is not a {dialect} backup")
+
+    if dialect == "sqlite":
+        _restore_sqlite(engine, chain, workers)
+    else:
+        _restore_postgres(engine, chain, workers)
+
+
+def _read_csv_gz(path):
+    with gzip.open(path, "rt", newline="", encoding="utf-8") as gz:
+        reader = csv.reader(gz)
+        header = next(reader)
+        return header, [[v if v != "" else None for v in row] for row in reader]
+
+
+def _restore_sqlite(engine, chain, workers):
+    db_path = engine.url.database
+    engine.dispose()
+
+    full_dir = os.path.dirname(chain[0]) or "."
+    full_files = load_manifest(chain[0])["files"]
+    full_file = os.path.join(full_dir, full_files[0]["path"])
+    staging_path = f"{db_path}.restoring"
+    with gzip.open(full_file, "rb") as gz, open(staging_path, "wb") as out:
+        shutil.copyfileobj(gz, out, 1024 * 1024)
+
+    # SQLite has a single writer, so incremental files are decompressed and
+    # parsed concurrently while the inserts themselves run in order.
+    conn = sqlite3.connect(staging_path)
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for path in chain[1:]:
+                backup_dir = os.path.dirname(path) or "."
+                entries = load_manifest(path)["files"]
+                parsed = pool.map(lambda e: _read_csv_gz(os.path.join(backup_dir, e["path"])), entries)
+                for entry, (header, rows) in zip(entries, parsed):
+                    placeholders = ", ".join("?" for _ in header)
+                    conn.executemany(
+                        f"INSERT OR REPLACE INTO {entry['table']} ({', '.join(header)}) "
+                        f"VALUES ({placeholders})", rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+    # Per-year sales archives are only in full backups; archives the backup
+    # does not have would double count sales that are back in the hot tables
+    archives = {e["year"]: os.path.join(full_dir, e["path"])
+                for e in full_files if e["format"] == "sqlite-archive"}
+    for year in sales_archive_years():
+        if year not in archives:
+            os.remove(sales_archive_path(year))
+    for year, path in archives.items():
+        target = sales_archive_path(year)
+        os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+        with gzip.open(path, "rb") as gz, open(f"{target}.restoring", "wb") as out:
+            shutil.copyfileobj(gz, out, 1024 * 1024)
+        os.replace(f"{target}.restoring", target)
+    os.replace(staging_path, db_path)
+
+
+def _pg_secondary_indexes(cur, tables):
+    """Index definitions that are not backing a PK/UNIQUE constraint."""
+    # Indexes on partitioned tables are left in place: their definitions
+    # (ON ONLY ...) would not recreate the per-partition indexes
+    cur.execute("""
+        SELECT i.indexname, i.indexdef
+        FROM pg_indexes i
+        JOIN pg_class t ON t.relname = i.tablename AND t.relnamespace = current_schema()::regnamespace
+        WHERE i.schemaname = current_schema()
+          AND t.relkind = 'r'
+          AND i.tablename = ANY(%s)
+          AND NOT EXISTS (
+              SELECT 1 FROM pg_constraint c
+              WHERE c.conindid = (quote_ident(i.schemaname) || '.' || quote_ident(i.indexname))::regclass
+          )
+    """, (list(tables),))
+    return cur.fetchall()
+
+
+def _pg_copy_in(engine, table, path):
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        with gzip.open(path, "rb") as gz:
+            header = gz.readline().decode("utf-8").strip()
+            cur.copy_expert(f"COPY {table} ({header}) FROM STDIN WITH (FORMAT csv)", gz)
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def _pg_run(engine, statement):
+    raw = engine.raw_connection()
+    try:
+        raw.cursor().execute(statement)
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def _restore_postgres(engine, chain, workers):
+    full = load_manifest(chain[0])
+    tables = [e["table"] for e in full["files"]]
+    levels = _table_levels(engine, tables)
+
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        # Partitions must exist before rows are copied in through their parent
+        for entry in full["files"]:
+            for child, bound in entry.get("partitions", []):
+                cur.execute(f"CREATE TABLE IF NOT EXISTS {child} PARTITION OF {entry['table']} {bound}")
+        indexes = _pg_secondary_indexes(cur, tables)
+        cur.execute(f"TRUNCATE {', '.join(tables)} RESTART IDENTITY CASCADE")
+        for name, _ in indexes:
+            cur.execute(f'DROP INDEX IF EXISTS "{name}"')
+        raw.commit()
+    finally:
+        raw.close()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Tables inside one FK level have no dependencies on each other
+        for path in chain:
+            backup_dir = os.path.dirname(path) or "."
+            files = {e["table"]: os.path.join(backup_dir, e["path"]) for e in load_manifest(path)["files"]}
+            for level in levels:
+                jobs = [pool.submit(_pg_copy_in, engine, t, files[t]) for t in level if t in files]
+                for job in jobs:
+                    job.result()
+
+        # Rebuild secondary indexes after the bulk load, in parallel
+        for job in [pool.submit(_pg_run, engine, indexdef) for _, indexdef in indexes]:
+            job.result()
+
+    inspector = inspect(engine)
+    raw = engine.raw_connection()
+    try:
+        cur = raw.cursor()
+        for table in tables:
+            pk = inspector.get_pk_constraint(table)["constrained_columns"]
+            if len(pk) == 1:
+                # setval() is a no-op (NULL) for tables without a serial key
+                cur.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX({pk[0]}), 1), "
+                    f"MAX({pk[0]}) IS NOT NULL) FROM {table}",
+                    (table, pk[0]))
+        cur.execute("ANALYZE")
+        raw.commit()
+    finally:
+        raw.close()
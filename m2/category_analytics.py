@@ -3,7 +3,10 @@ from sqlalchemy import text
 from tabulate import tabulate
 from db import get_engine
 from auth import has_permission
+from analytics_backend import fetch_all
+from etl_state import months_ago
 from report import fetch_report
+from report_cache import bump_data_version
 
 engine = get_engine()
 
@@ -13,64 +16,72 @@ def category_performance_dashboard():
         return
         
     try:
-        with engine.connect() as conn:
+        dashboard = fetch_all({
             # Category Performance Metrics
-            performance_data = conn.execute(text("""
+            "performance": """
                 SELECT 
                     c.category_id,
                     c.name as category_name,
                     c.description,
-                    COUNT(p.product_id) as total_products,
-                    SUM(p.stock_quantity) as total_stock,
-                    COALESCE(SUM(si.quantity * si.unit_price), 0) as total_revenue,
-                    COALESCE(COUNT(DISTINCT s.sale_id), 0) as total_transactions,
-                    COALESCE(SUM(si.quantity), 0) as total_units_sold,
+                    COALESCE(pc.total_products, 0) as total_products,
+                    COALESCE(pc.total_stock, 0) as total_stock,
+                    COALESCE(f.revenue, 0) as total_revenue,
+                    COALESCE(f.transactions, 0) as total_transactions,
+                    COALESCE(f.units, 0) as total_units_sold,
                     CASE 
-                        WHEN COALESCE(SUM(si.quantity), 0) = 0 THEN 0
-                        ELSE ROUND(COALESCE(SUM(si.quantity * si.unit_price), 0) / SUM(si.quantity), 2)
+                        WHEN COALESCE(f.units, 0) = 0 THEN 0
+                        ELSE ROUND(f.revenue / f.units, 2)
                     END as avg_unit_price,
                     CASE 
-                        WHEN COUNT(p.product_id) = 0 THEN 0
-                        ELSE ROUND(COALESCE(SUM(si.quantity * si.unit_price), 0) / COUNT(p.product_id), 2)
+                        WHEN COALESCE(pc.total_products, 0) = 0 THEN 0
+                        ELSE ROUND(COALESCE(f.revenue, 0) / pc.total_products, 2)
                     END as revenue_per_product
                 FROM categories c
-                LEFT JOIN products p ON c.category_id = p.category_id
-                LEFT JOIN sale_items si ON p.product_id = si.product_id
-                LEFT JOIN sales s ON si.sale_id = s.sale_id
-                GROUP BY c.category_id, c.name, c.description
+                LEFT JOIN (
+                    SELECT category_id, COUNT(*) as total_products, SUM(stock_quantity) as total_stock
+                    FROM products
+                    GROUP BY category_id
+                ) pc ON c.category_id = pc.category_id
+                LEFT JOIN (
+                    SELECT category_id,
+                           SUM(line_revenue) as revenue,
+                           COUNT(DISTINCT sale_id) as transactions,
+                           SUM(quantity) as units
+                    FROM sale_line_fact
+                    GROUP BY category_id
+                ) f ON c.category_id = f.category_id
                 ORDER BY total_revenue DESC
-            """)).fetchall()
-            
+            """,
             # Stock Health Analysis
-            stock_health = conn.execute(text("""
+            "stock_health": """
                 SELECT 
                     c.name as category_name,
                     COUNT(p.product_id) as total_products,
                     SUM(CASE WHEN p.stock_quantity = 0 THEN 1 ELSE 0 END) as out_of_stock,
-                    SUM(CASE WHEN p.stock_quantity < p.low_stock_threshold THEN 1 ELSE 0 END) as low_stock,
+                    SUM(CASE WHEN p.is_low_stock THEN 1 ELSE 0 END) as low_stock,
                     SUM(CASE WHEN p.stock_quantity > p.low_stock_threshold * 3 THEN 1 ELSE 0 END) as over_stock,
                     ROUND(AVG(p.stock_quantity::decimal / NULLIF(p.low_stock_threshold, 0)), 2) as avg_stock_health
                 FROM categories c
                 JOIN products p ON c.category_id = p.category_id
                 GROUP BY c.category_id, c.name
                 ORDER BY avg_stock_health
-            """)).fetchall()
-            
+            """,
             # Monthly Trend Analysis
-            monthly_trends = conn.execute(text("""
+            "monthly_trends": ("""
                 SELECT 
                     c.name as category_name,
-                    TO_CHAR(s.sale_time, 'YYYY-MM') as month,
-                    SUM(si.quantity * si.unit_price) as monthly_revenue,
-                    SUM(si.quantity) as monthly_units
-                FROM categories c
-                JOIN products p ON c.category_id = p.category_id
-                JOIN sale_items si ON p.product_id = si.product_id
-                JOIN sales s ON si.sale_id = s.sale_id
-                WHERE s.sale_time >= CURRENT_DATE - INTERVAL '6 months'
-                GROUP BY c.category_id, c.name, TO_CHAR(s.sale_time, 'YYYY-MM')
+                    r.bucket as month,
+                    r.revenue as monthly_revenue,
+                    r.units as monthly_units
+                FROM sales_rollups r
+                JOIN categories c ON r.dim_id = c.category_id
+                WHERE r.grain = 'month' AND r.dim_type = 'category' AND r.bucket >= :since
                 ORDER BY c.name, month DESC
-            """)).fetchall()
+            """, {"since": months_ago(6)[:7]}),
+        }, report="category_performance")
+        performance_data = dashboard["performance"]
+        stock_health = dashboard["stock_health"]
+        monthly_trends = dashboard["monthly_trends"]
             
         print("\n" + "="*80)
         print("📊 CATEGORY PERFORMANCE DASHBOARD")
@@ -198,6 +209,7 @@ def set_category_thresholds():
             """), {"threshold": int(new_threshold), "cat_id": int(category_id)})
             
             updated_count = result.fetchone()[0]
+            bump_data_version(conn)
             category_name = next((cat[1] for cat in categories if cat[0] == int(category_id)), "Unknown")
             
             print(f"✅ Updated {updated_count} products in '{category_name}' to threshold: {new_threshold}")
@@ -209,11 +221,10 @@ def category_sales_report():
     """Sales breakdown by category"""
     query = """
         SELECT c.name as category, 
-               COUNT(si.sale_item_id) as items_sold,
-               SUM(si.quantity * si.unit_price) as revenue
-        FROM sale_items si
-        JOIN products p ON si.product_id = p.product_id
-        JOIN categories c ON p.category_id = c.category_id
+               COUNT(*) as items_sold,
+               SUM(f.line_revenue) as revenue
+        FROM sale_line_fact f
+        JOIN categories c ON f.category_id = c.category_id
         GROUP BY c.category_id, c.name
         ORDER BY revenue DESC
     """
@@ -0,0 +1,130 @@
+# clearance_pricing.py
+import os
+import uuid
+import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from analytics_backend import fetch_dataframe
+from etl_state import days_ago
+from report_cache import bump_data_version
+
+CLEARANCE_AGE_DAYS = 60                       # unsold this long before a product is a candidate
+# Days unsold -> discount; products that never sold get the deepest tier
+AGE_TIERS = [(180, 0.5), (120, 0.4), (90, 0.3), (CLEARANCE_AGE_DAYS, 0.2)]
+OVERSTOCK_FACTOR = 3                          # stock above threshold x this is overstock
+OVERSTOCK_EXTRA = 0.1
+HIGH_VALUE_STOCK = float(os.getenv("CLEARANCE_HIGH_VALUE", "10000"))  # stock value tied up
+HIGH_VALUE_EXTRA = 0.05
+MAX_DISCOUNT = 0.6
+# A product marked down this recently is not marked down again
+COOLDOWN_DAYS = int(os.getenv("CLEARANCE_COOLDOWN_DAYS", "14"))
+
+CANDIDATES_QUERY = """
+    SELECT p.product_id, p.name, c.name as category, p.stock_quantity,
+           p.low_stock_threshold, p.price as current_price,
+           st.last_sale_time as last_sale,
+           COALESCE(st.units_sold_total, 0) as total_sold
+    FROM products p
+    LEFT JOIN categories c ON p.category_id = c.category_id
+    LEFT JOIN product_sales_stats st ON p.product_id = st.product_id
+    WHERE p.stock_quantity > 0
+      AND (st.last_sale_time IS NULL OR st.last_sale_time < :since_age)
+      AND NOT EXISTS (
+          SELECT 1 FROM price_history h
+          WHERE h.product_id = p.product_id AND h.reason = 'clearance'
+            AND h.changed_at >= :cooldown
+      )
+"""
+
+INSERT_HISTORY = text("""
+    INSERT INTO price_history (product_id, old_price, new_price, reason, batch_id, changed_by)
+    VALUES (:product_id, :old_price, :new_price, :reason, :batch_id, :changed_by)
+""")
+
+# Products whose price changed since the plan was read are left alone; the
+# rowcount check in apply_price_changes then rolls the whole batch back
+APPLY_BATCH = text("""
+    UPDATE products
+    SET price = h.new_price
+    FROM price_history h
+    WHERE h.batch_id = :batch_id
+      AND h.product_id = products.product_id
+      AND products.price = h.old_price
+""")
+
+
+def clearance_candidates(engine=None):
+    """In-stock products unsold for CLEARANCE_AGE_DAYS and not marked down recently."""
+    candidates = fetch_dataframe(CANDIDATES_QUERY, {"since_age": days_ago(CLEARANCE_AGE_DAYS),
+                                                    "cooldown": days_ago(COOLDOWN_DAYS)},
+                                 report="clearance_recommendations", source_engine=engine)
+    candidates["current_price"] = candidates["current_price"].astype("float64")
+    return candidates
+
+
+def price_clearance(candidates, today=None):
+    """
+    Add days_unsold, discount, new_price and potential_revenue to the
+    candidates frame in one vectorized pass: an age tier, plus extra
+    markdown for overstock and for large stock value, capped at MAX_DISCOUNT.
+    """
+    if candidates.empty:
+        return candidates.assign(days_unsold=[], discount=[], new_price=[], potential_revenue=[])
+    today = pd.Timestamp(today or datetime.date.today())
+    last_sale = pd.to_datetime(candidates["last_sale"])
+    days_unsold = (today - last_sale.dt.normalize()).dt.days
+    age = days_unsold.fillna(np.inf).to_numpy(dtype="float64")
+    stock = candidates["stock_quantity"].to_numpy(dtype="float64")
+    threshold = candidates["low_stock_threshold"].fillna(0).to_numpy(dtype="float64")
+    price = candidates["current_price"].to_numpy(dtype="float64")
+
+    discount = np.select([age >= days for days, _ in AGE_TIERS], [rate for _, rate in AGE_TIERS], 0.0)
+    discount += np.where(stock > threshold * OVERSTOCK_FACTOR, OVERSTOCK_EXTRA, 0.0)
+    discount += np.where(stock * price >= HIGH_VALUE_STOCK, HIGH_VALUE_EXTRA, 0.0)
+    discount = np.minimum(discount, MAX_DISCOUNT)
+    new_price = np.maximum(np.round(price * (1 - discount), 2), 0.01)
+
+    return candidates.assign(
+        days_unsold=days_unsold.astype("Int64"),
+        discount=discount.round(2),
+        new_price=new_price,
+        potential_revenue=(new_price * stock).round(2),
+    ).sort_values(["discount", "potential_revenue"], ascending=False, ignore_index=True)
+
+
+def plan_clearance(engine=None):
+    return price_clearance(clearance_candidates(engine))
+
+
+def apply_price_changes(conn, changes, reason="clearance", changed_by=None):
+    """
+    Record (product_id, old_price, new_price) changes in price_history under a
+    new batch id and apply them to products with one UPDATE, inside the
+    caller's transaction. Raises ValueError, so the caller rolls back, if any
+    product's price no longer matches old_price. Returns the batch id.
+    """
+    batch_id = uuid.uuid4().hex
+    rows = [{"product_id": int(product_id), "old_price": float(old_price),
+             "new_price": round(float(new_price), 2), "reason": reason,
+             "batch_id": batch_id, "changed_by": changed_by}
+            for product_id, old_price, new_price in changes]
+    if not rows:
+        raise ValueError("No price changes given")
+    conn.execute(INSERT_HISTORY, rows)
+    updated = conn.execute(APPLY_BATCH, {"batch_id": batch_id}).rowcount
+    if updated != len(rows):
+        raise ValueError(f"Prices changed concurrently for {len(rows) - updated} product(s); nothing applied")
+    bump_data_version(conn)
+    return batch_id
+
+
+def apply_clearance_plan(engine, plan, changed_by=None):
+    """Apply every priced row of a clearance plan in one transaction. Returns (batch_id, count)."""
+    changes = plan[plan["new_price"] < plan["current_price"]]
+    if changes.empty:
+        return None, 0
+    with engine.begin() as conn:
+        batch_id = apply_price_changes(conn, zip(changes["product_id"], changes["current_price"],
+                                                 changes["new_price"]), "clearance", changed_by)
+    return batch_id, len(changes)
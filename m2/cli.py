@@ -9,14 +9,17 @@ try:
     from employee_management import manage_employees
     from analytics import notification_center, alert_dashboard
     from report import enhanced_report_mode
-    from inventory_management import restock_products, bulk_stock_update
+    from inventory_management import restock_products, bulk_stock_update, receive_deliveries
     from customer_management import manage_customers
-    from system_admin import system_health_check, system_backup, purge_old_data
+    from system_admin import (system_health_check, system_backup, system_restore, purge_old_data,
+                              refresh_analytics, rebuild_sales_rollups, archive_old_sales)
     from inventory_optimization import apply_clearance_pricing,inventory_health_dashboard
     # New analytics modules
     from category_analytics import category_performance_dashboard, set_category_thresholds
     from supplier_analytics import supplier_scorecard_system, update_supplier_reliability
     from inventory_optimization import dead_stock_identification, generate_clearance_recommendations
+    from snapshot_export import export_analytics_snapshot
+    from replenishment import auto_replenishment
     
 except ImportError as e:
     print(f"❌ Import error: {e}")
@@ -75,6 +78,8 @@ def main_menu():
             print("10. 👥 Manage Customers")
             print("11. 🏥 System Health Check")
             print("12. 🚪 Logout / Exit")
+            print("13. 🧾 Auto Replenishment")
+            print("14. 🚚 Receive Deliveries")
 
             choice = input("Enter choice: ").strip()
             if choice == '1':
@@ -102,6 +107,10 @@ def main_menu():
             elif choice == '12':
                 logout()
                 break
+            elif choice == '13':
+                auto_replenishment()
+            elif choice == '14':
+                receive_deliveries()
             else:
                 print("❌ Invalid choice, try again!")
 
@@ -129,6 +138,13 @@ def main_menu():
             print("21. 🚪 Logout / Exit")
             print("22. 🏥 Inventory Health Dashboard")
             print("23. 🎪 Apply Clearance Pricing")
+            print("24. ♻️ Restore Backup")
+            print("25. 🗄️ Export Analytics Snapshot")
+            print("26. 🔁 Refresh Analytics Tables")
+            print("27. 🧮 Rebuild Sales Rollups")
+            print("28. 🧾 Auto Replenishment")
+            print("29. 🚚 Receive Deliveries")
+            print("30. 🧊 Archive Old Sales")
             choice = input("Enter choice: ").strip()
             if choice == '1':
                 add_product()
@@ -178,6 +194,20 @@ def main_menu():
                 
                 apply_clearance_pricing()  
                 break
+            elif choice == '24':
+                system_restore()
+            elif choice == '25':
+                export_analytics_snapshot()
+            elif choice == '26':
+                refresh_analytics()
+            elif choice == '27':
+                rebuild_sales_rollups()
+            elif choice == '28':
+                auto_replenishment()
+            elif choice == '29':
+                receive_deliveries()
+            elif choice == '30':
+                archive_old_sales()
             else:
                 print("❌ Invalid choice, try again!")
 
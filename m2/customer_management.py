@@ -3,6 +3,7 @@ from sqlalchemy import text
 from tabulate import tabulate
 from db import get_engine
 from auth import has_permission
+from customer_segments import customer_segments_report
 
 engine = get_engine()
 
@@ -13,7 +14,8 @@ def manage_customers():
         print("1. View All Customers")
         print("2. Add New Customer")
         print("3. Customer Purchase History")
-        print("4. Back to Main Menu")
+        print("4. Customer Segments (RFM)")
+        print("5. Back to Main Menu")
         
         choice = input("Choose: ").strip()
         
@@ -24,6 +26,8 @@ def manage_customers():
         elif choice == '3':
             customer_purchase_history()
         elif choice == '4':
+            customer_segments_report()
+        elif choice == '5':
             break
         else:
             print("❌ Invalid choice")
@@ -93,7 +97,7 @@ def customer_purchase_history():
             history = conn.execute(text("""
                 SELECT s.sale_id, s.sale_time, s.total_amount, 
                        s.payment_method, e.name as cashier
-                FROM sales s
+                FROM sales_history s
                 JOIN employees e ON s.employee_id = e.employee_id
                 WHERE s.customer_id = :cid
                 ORDER BY s.sale_time DESC
@@ -0,0 +1,259 @@
+# customer_segments.py
+import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from tabulate import tabulate
+from db import get_engine
+from auth import has_permission
+from etl_state import get_watermark, get_job_state, set_watermark, days_since
+
+engine = get_engine()
+
+JOB_NAME = "customer_segments"
+SCORE_BINS = 5                  # quintile scores 1..5 for each of R, F and M
+WRITE_BATCH = 50000
+
+# First matching rule wins; scores are (recency, frequency, monetary), 5 = best
+SEGMENT_RULES = [
+    ("Champions", lambda r, f, m: (r >= 4) & (f >= 4) & (m >= 4)),
+    ("Loyal Customers", lambda r, f, m: (r >= 3) & (f >= 4)),
+    ("Can't Lose Them", lambda r, f, m: (r <= 1) & (f >= 4) & (m >= 4)),
+    ("At Risk", lambda r, f, m: (r <= 2) & (f >= 3)),
+    ("New Customers", lambda r, f, m: (r >= 4) & (f <= 1)),
+    ("Potential Loyalists", lambda r, f, m: (r >= 4) & (f <= 3)),
+    ("Hibernating", lambda r, f, m: (r <= 2) & (f <= 2)),
+]
+DEFAULT_SEGMENT = "Need Attention"
+
+CUSTOMER_AGGREGATES = """
+    SELECT customer_id,
+           MAX(sale_time) as last_purchase,
+           COUNT(*) as frequency,
+           SUM(total_amount) as monetary
+    FROM sales_history
+    WHERE customer_id IS NOT NULL {where}
+    GROUP BY customer_id
+"""
+
+SEGMENT_COLUMNS = ["customer_id", "last_purchase", "frequency", "monetary",
+                   "r_score", "f_score", "m_score", "rfm_score", "segment"]
+
+UPSERT_SEGMENT = text("""
+    INSERT INTO customer_segments (customer_id, last_purchase, frequency, monetary,
+                                   r_score, f_score, m_score, rfm_score, segment, updated_at)
+    VALUES (:customer_id, :last_purchase, :frequency, :monetary,
+            :r_score, :f_score, :m_score, :rfm_score, :segment, CURRENT_TIMESTAMP)
+    ON CONFLICT (customer_id) DO UPDATE
+    SET last_purchase = excluded.last_purchase, frequency = excluded.frequency,
+        monetary = excluded.monetary, r_score = excluded.r_score, f_score = excluded.f_score,
+        m_score = excluded.m_score, rfm_score = excluded.rfm_score, segment = excluded.segment,
+        updated_at = CURRENT_TIMESTAMP
+""")
+
+
+def rfm_breakpoints(aggregates, today=None):
+    """Quintile cut points for recency (days), frequency and monetary over all customers."""
+    quantiles = np.linspace(0, 1, SCORE_BINS + 1)[1:-1]
+    return {
+        "recency": np.quantile(_recency_days(aggregates, today), quantiles).tolist(),
+        "frequency": np.quantile(aggregates["frequency"].to_numpy(dtype="float64"), quantiles).tolist(),
+        "monetary": np.quantile(aggregates["monetary"].to_numpy(dtype="float64"), quantiles).tolist(),
+    }
+
+
+def _recency_days(aggregates, today=None):
+    today = np.datetime64(today or datetime.date.today(), "D")
+    last = pd.to_datetime(aggregates["last_purchase"]).to_numpy().astype("datetime64[D]")
+    return (today - last).astype("int64")
+
+
+def score_rfm(aggregates, breakpoints, today=None):
+    """
+    Add r/f/m scores (1-5), the three-digit rfm_score and a segment label to
+    per-customer aggregates, binning against the given quintile breakpoints.
+    Fewer days since the last purchase scores higher, and recency equal to a
+    cut point takes the better bin, so customers who bought today score 5
+    however many share that day; a value equal to a frequency/monetary cut
+    point stays in the lower bin, so the large group of one-visit customers
+    all score 1.
+    """
+    recency = np.searchsorted(breakpoints["recency"], _recency_days(aggregates, today), side="left")
+    r = SCORE_BINS - recency
+    f = np.searchsorted(breakpoints["frequency"], aggregates["frequency"].to_numpy(dtype="float64"),
+                        side="left") + 1
+    m = np.searchsorted(breakpoints["monetary"], aggregates["monetary"].to_numpy(dtype="float64"),
+                        side="left") + 1
+    segment = np.select([rule(r, f, m) for _, rule in SEGMENT_RULES],
+                        [name for name, _ in SEGMENT_RULES], default=DEFAULT_SEGMENT)
+    return aggregates.assign(
+        r_score=r, f_score=f, m_score=m,
+        rfm_score=(r * 100 + f * 10 + m).astype(str),
+        segment=segment,
+    )
+
+
+def _store_segments(conn, scored):
+    columns = {
+        "customer_id": scored["customer_id"].astype("int64").tolist(),
+        "last_purchase": list(pd.to_datetime(scored["last_purchase"]).dt.to_pydatetime()),
+        "frequency": scored["frequency"].astype("int64").tolist(),
+        "monetary": scored["monetary"].astype("float64").tolist(),
+        "r_score": scored["r_score"].tolist(),
+        "f_score": scored["f_score"].tolist(),
+        "m_score": scored["m_score"].tolist(),
+        "rfm_score": scored["rfm_score"].tolist(),
+        "segment": scored["segment"].tolist(),
+    }
+    records = [dict(zip(columns, values)) for values in zip(*columns.values())]
+    for start in range(0, len(records), WRITE_BATCH):
+        conn.execute(UPSERT_SEGMENT, records[start:start + WRITE_BATCH])
+
+
+def _load_aggregates(conn, where="", params=None):
+    return pd.read_sql(text(CUSTOMER_AGGREGATES.format(where=where)), conn, params=params)
+
+
+def rescore_customer_segments(engine):
+    """
+    Recompute the quintile breakpoints and every customer's scores from the
+    stored aggregates (no scan of sales). Recency moves every day, so this
+    runs nightly. Returns the number of customers scored.
+    """
+    with engine.connect() as conn:
+        aggregates = pd.read_sql(text("""
+            SELECT customer_id, last_purchase, frequency, monetary FROM customer_segments
+        """), conn)
+    if aggregates.empty:
+        return 0
+    breakpoints = rfm_breakpoints(aggregates)
+    scored = score_rfm(aggregates, breakpoints)
+    with engine.begin() as conn:
+        _store_segments(conn, scored)
+        set_watermark(conn, JOB_NAME, get_watermark(conn, JOB_NAME), {
+            "breakpoints": breakpoints, "as_of": datetime.date.today().isoformat()})
+    return len(scored)
+
+
+def update_customer_segments(engine):
+    """
+    Re-aggregate only the customers with sales newer than the watermark and
+    score them against the stored breakpoints (computing breakpoints first
+    if there are none yet). Returns the number of customers updated.
+    """
+    with engine.connect() as conn:
+        last_id = get_watermark(conn, JOB_NAME)
+        state = get_job_state(conn, JOB_NAME) or {}
+        upper = conn.execute(text("SELECT COALESCE(MAX(sale_id), 0) FROM sales")).scalar()
+        if upper <= last_id:
+            return 0
+        if last_id:
+            aggregates = _load_aggregates(conn, """
+                AND customer_id IN (
+                    SELECT DISTINCT customer_id FROM sales
+                    WHERE sale_id > :after AND sale_id <= :upto AND customer_id IS NOT NULL)
+                AND sale_id <= :upto
+            """, {"after": last_id, "upto": upper})
+        else:
+            aggregates = _load_aggregates(conn, "AND sale_id <= :upto", {"upto": upper})
+    breakpoints = state.get("breakpoints")
+    if breakpoints is None and not aggregates.empty:
+        breakpoints = rfm_breakpoints(aggregates)
+        state = {"breakpoints": breakpoints, "as_of": datetime.date.today().isoformat()}
+    with engine.begin() as conn:
+        if not aggregates.empty:
+            _store_segments(conn, score_rfm(aggregates, breakpoints))
+        set_watermark(conn, JOB_NAME, upper, state or None)
+    return len(aggregates)
+
+
+def refresh_customer_segments(engine):
+    """Pick up customers with new sales, then rescore everyone. Returns customers scored."""
+    update_customer_segments(engine)
+    return rescore_customer_segments(engine)
+
+
+def rebuild_customer_segments(engine):
+    """Recompute every customer's aggregates from sales (e.g. after sales were purged)."""
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM customer_segments"))
+        conn.execute(text("DELETE FROM etl_watermarks WHERE job_name = :job"), {"job": JOB_NAME})
+    return refresh_customer_segments(engine)
+
+
+def segment_summary(conn):
+    """Customers, average R/F/M and total spend per segment, largest first."""
+    return conn.execute(text("""
+        SELECT segment, COUNT(*) as customers,
+               ROUND(AVG(r_score), 2), ROUND(AVG(f_score), 2), ROUND(AVG(m_score), 2),
+               SUM(monetary) as monetary
+        FROM customer_segments
+        GROUP BY segment
+        ORDER BY customers DESC
+    """)).fetchall()
+
+
+def segment_customers(conn, segment=None, limit=50, after_id=None):
+    """Customers in a segment (or all), keyset-paged by customer_id."""
+    conditions, params = [], {"limit": limit}
+    if segment:
+        conditions.append("cs.segment = :segment")
+        params["segment"] = segment
+    if after_id is not None:
+        conditions.append("cs.customer_id > :after_id")
+        params["after_id"] = after_id
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return conn.execute(text(f"""
+        SELECT cs.customer_id, c.name, c.phone, cs.last_purchase, cs.frequency, cs.monetary,
+               cs.rfm_score, cs.segment
+        FROM customer_segments cs
+        JOIN customers c ON c.customer_id = cs.customer_id
+        {where}
+        ORDER BY cs.customer_id
+        LIMIT :limit
+    """), params).fetchall()
+
+
+def customer_segment(conn, customer_id):
+    return conn.execute(text("""
+        SELECT customer_id, last_purchase, frequency, monetary,
+               r_score, f_score, m_score, rfm_score, segment, updated_at
+        FROM customer_segments
+        WHERE customer_id = :cid
+    """), {"cid": customer_id}).fetchone()
+
+
+# ------------------ CLI ------------------
+def customer_segments_report():
+    """Show RFM segments, optionally listing the customers in one segment"""
+    if not has_permission(["MANAGER", "ADMIN"]):
+        return
+
+    try:
+        updated = update_customer_segments(engine)
+        if updated:
+            print(f"🔄 Updated {updated} customer(s) with new sales")
+        with engine.connect() as conn:
+            summary = segment_summary(conn)
+            if not summary:
+                print("📭 No customer purchases to segment yet")
+                return
+            print("\n👥 CUSTOMER SEGMENTS (RFM)")
+            print(tabulate(summary, headers=["Segment", "Customers", "Avg R", "Avg F", "Avg M", "Total Spend"],
+                           tablefmt="grid"))
+            segment = input("Segment to list (blank to skip): ").strip()
+            if not segment:
+                return
+            rows = segment_customers(conn, segment)
+        if not rows:
+            print(f"📭 No customers in segment '{segment}'")
+            return
+        print(tabulate([(r[0], r[1], r[2], str(r[3])[:10], days_since(r[3]), r[4], r[5], r[6]) for r in rows],
+                       headers=["ID", "Name", "Phone", "Last Purchase", "Days Ago", "Visits", "Spend", "RFM"],
+                       tablefmt="grid"))
+    except Exception as e:
+        print(f"❌ Customer segmentation error: {e}")
+
+
+if __name__ == "__main__":
+    print(f"✅ {refresh_customer_segments(engine)} customers segmented")
@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import create_engine
+import glob
+from sqlalchemy import create_engine, event
 import sqlite3
 
 DB_TYPE = os.getenv("DB_TYPE", "sqlite")
@@ -15,6 +16,11 @@ else:
     DB_PORT = os.getenv("PGPORT", "5432")
     CONNECTION_STRING = f"postgresql+psycopg2://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
+# SQLite keeps closed months of sales in one archive database per year
+SALES_ARCHIVE_DIR = os.getenv("SALES_ARCHIVE_DIR", "sales_archive")
+SALES_COLUMNS = "sale_id, sale_time, total_amount, payment_method, customer_id, employee_id"
+SALE_ITEM_COLUMNS = "sale_item_id, sale_id, product_id, quantity, unit_price, subtotal"
+
 
 def get_sqlite_connection():
     try:
@@ -29,9 +35,36 @@ def get_connection_string():
     return CONNECTION_STRING
 
 
+def sales_archive_path(year):
+    return os.path.join(SALES_ARCHIVE_DIR, f"sales_{year}.db")
+
+
+def sales_archive_years():
+    paths = glob.glob(os.path.join(SALES_ARCHIVE_DIR, "sales_[0-9][0-9][0-9][0-9].db"))
+    return sorted(int(os.path.basename(path)[6:10]) for path in paths)
+
+
+def attach_sales_archives(dbapi_conn, _record=None):
+    """
+    Attach every per-year sales archive to a new SQLite connection and
+    define TEMP sales_history / sale_items_history views over hot + archived rows.
+    """
+    cursor = dbapi_conn.cursor()
+    sales, items = [f"SELECT {SALES_COLUMNS} FROM main.sales"], [f"SELECT {SALE_ITEM_COLUMNS} FROM main.sale_items"]
+    for year in sales_archive_years():
+        cursor.execute(f"ATTACH DATABASE ? AS archive_{year}", (sales_archive_path(year),))
+        sales.append(f"SELECT {SALES_COLUMNS} FROM archive_{year}.sales")
+        items.append(f"SELECT {SALE_ITEM_COLUMNS} FROM archive_{year}.sale_items")
+    cursor.execute(f"CREATE TEMP VIEW sales_history AS {' UNION ALL '.join(sales)}")
+    cursor.execute(f"CREATE TEMP VIEW sale_items_history AS {' UNION ALL '.join(items)}")
+    cursor.close()
+
+
 def get_engine():
     try:
         engine = create_engine(get_connection_string(), echo=False)
+        if DB_TYPE == "sqlite":
+            event.listen(engine, "connect", attach_sales_archives)
         return engine
     except Exception as e:
         print(f"Error creating SQLAlchemy engine: {e}")
@@ -0,0 +1,142 @@
+# demand_forecast.py
+import os
+import datetime
+import numpy as np
+import pandas as pd
+from analytics_backend import fetch_dataframe
+from etl_state import days_ago
+
+HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", "56"))   # 8 weeks of daily demand
+HORIZON_DAYS = int(os.getenv("FORECAST_HORIZON_DAYS", "28"))
+LEAD_TIME_DAYS = int(os.getenv("FORECAST_LEAD_TIME_DAYS", "7"))
+SEASON_LENGTH = 7
+SMOOTHING_ALPHA = 0.3
+SERVICE_LEVEL_Z = 1.65  # ~95% cycle service level
+
+PRODUCTS_QUERY = """
+    SELECT product_id, name, stock_quantity, low_stock_threshold, supplier_id, price
+    FROM products
+    ORDER BY product_id
+"""
+
+DAILY_DEMAND_QUERY = """
+    SELECT product_id, sale_date, SUM(quantity) as units
+    FROM sale_line_fact
+    WHERE sale_date >= :since AND sale_date < :today
+    GROUP BY product_id, sale_date
+"""
+
+
+def load_demand_matrix(engine=None, days=HISTORY_DAYS, product_ids=None):
+    """
+    Daily units sold per product over the last `days` full days as a
+    products x days DataFrame (zero-filled; today is excluded as incomplete).
+    """
+    today = datetime.date.today()
+    rows = fetch_dataframe(DAILY_DEMAND_QUERY, {"since": days_ago(days), "today": today.isoformat()},
+                           report="demand_forecast", source_engine=engine)
+    dates = pd.date_range(end=today - datetime.timedelta(days=1), periods=days, freq="D")
+    if rows.empty:
+        matrix = pd.DataFrame(0.0, index=pd.Index([], name="product_id"), columns=dates)
+    else:
+        rows["sale_date"] = pd.to_datetime(rows["sale_date"])
+        matrix = rows.pivot_table(index="product_id", columns="sale_date", values="units",
+                                  aggfunc="sum", fill_value=0)
+        matrix = matrix.reindex(columns=dates, fill_value=0).astype("float64")
+    if product_ids is not None:
+        matrix = matrix.reindex(pd.Index(product_ids, name="product_id"), fill_value=0.0)
+    return matrix
+
+
+def _smooth(history, alpha):
+    """Simple exponential smoothing of every row at once: final level and one-step errors."""
+    level = history[:, 0].copy()
+    errors = np.zeros_like(history)
+    for t in range(1, history.shape[1]):
+        errors[:, t] = history[:, t] - level
+        level += alpha * errors[:, t]
+    return level, errors[:, 1:]
+
+
+def _seasonal_profile(history, season):
+    """Mean demand per day-of-season over the whole seasons at the end of history."""
+    seasons = history.shape[1] // season
+    if seasons == 0:
+        return None
+    tail = history[:, -seasons * season:]
+    return tail.reshape(history.shape[0], seasons, season).mean(axis=1)
+
+
+def forecast_matrix(history, horizon=HORIZON_DAYS, alpha=SMOOTHING_ALPHA, season=SEASON_LENGTH):
+    """
+    Forecast every row of a products x days demand array in one pass.
+    Exponential smoothing and a weekly seasonal-naive model are both fitted;
+    each product gets whichever had the lower error on the last season held out.
+    Returns (forecast products x horizon, daily demand std dev, model names).
+    """
+    history = np.asarray(history, dtype="float64")
+    n_products, n_days = history.shape
+    level, errors = _smooth(history, alpha)
+    ses_forecast = np.repeat(level[:, None], horizon, axis=1)
+
+    if n_days < 2 * season:
+        sigma = np.sqrt((errors ** 2).mean(axis=1)) if errors.size else np.zeros(n_products)
+        return ses_forecast, sigma, np.full(n_products, "smoothing", dtype=object)
+
+    # Back-test both models on the most recent season
+    train, holdout = history[:, :-season], history[:, -season:]
+    train_level, _ = _smooth(train, alpha)
+    ses_mae = np.abs(holdout - train_level[:, None]).mean(axis=1)
+    train_profile = _seasonal_profile(train, season)
+    seasonal_mae = np.abs(holdout - train_profile).mean(axis=1)
+
+    # Day-of-season positions for the horizon, continuing from the end of history
+    profile = _seasonal_profile(history, season)
+    positions = np.arange(horizon) % season
+    seasonal_forecast = profile[:, positions]
+
+    use_seasonal = seasonal_mae < ses_mae
+    forecast = np.where(use_seasonal[:, None], seasonal_forecast, ses_forecast)
+    residuals = np.where(use_seasonal[:, None], holdout - train_profile, holdout - train_level[:, None])
+    sigma = np.sqrt((residuals ** 2).mean(axis=1))
+    models = np.where(use_seasonal, "seasonal", "smoothing").astype(object)
+    return forecast, sigma, models
+
+
+def forecast_products(engine=None, history_days=HISTORY_DAYS, horizon=HORIZON_DAYS,
+                      lead_time=LEAD_TIME_DAYS, z=SERVICE_LEVEL_Z):
+    """
+    Forecast demand for every product and derive safety stock, reorder point
+    and expected stockout date. Returns one DataFrame row per product.
+    """
+    products = fetch_dataframe(PRODUCTS_QUERY, report="demand_forecast", source_engine=engine)
+    if products.empty:
+        return products
+    matrix = load_demand_matrix(engine, history_days, products["product_id"].tolist())
+    forecast, sigma, models = forecast_matrix(matrix.to_numpy(), horizon)
+
+    stock = products["stock_quantity"].to_numpy(dtype="float64")
+    lead = min(lead_time, horizon)
+    lead_demand = forecast[:, :lead].sum(axis=1)
+    safety_stock = z * sigma * np.sqrt(lead)
+
+    # First horizon day on which cumulative demand uses up the stock on hand
+    cumulative = forecast.cumsum(axis=1)
+    runs_out = cumulative >= stock[:, None]
+    has_stockout = runs_out.any(axis=1) & (forecast.sum(axis=1) > 0)
+    days_left = np.where(has_stockout, runs_out.argmax(axis=1) + 1, np.nan)
+    days_left = np.where(stock <= 0, 0, days_left)
+    today = pd.Timestamp(datetime.date.today())
+
+    result = products.assign(
+        model=models,
+        avg_daily_forecast=forecast.mean(axis=1).round(2),
+        forecast_units=forecast.sum(axis=1).round(1),
+        demand_std=sigma.round(2),
+        safety_stock=np.ceil(safety_stock),
+        reorder_point=np.ceil(lead_demand + safety_stock),
+        days_until_stockout=days_left,
+        stockout_date=today + pd.to_timedelta(days_left, unit="D"),
+    )
+    result["needs_restock"] = result["stock_quantity"] <= result["reorder_point"]
+    return result.sort_values(["days_until_stockout", "product_id"], na_position="last")
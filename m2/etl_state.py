@@ -0,0 +1,62 @@
+# etl_state.py
+import json
+import datetime
+from sqlalchemy import text
+
+
+def get_watermark(conn, job_name):
+    """Return the last processed id for an incremental job (0 if it never ran)."""
+    value = conn.execute(text("""
+        SELECT last_id FROM etl_watermarks WHERE job_name = :job
+    """), {"job": job_name}).scalar()
+    return value or 0
+
+
+def get_job_state(conn, job_name):
+    """Return the JSON state saved by an incremental job, or None."""
+    value = conn.execute(text("""
+        SELECT state FROM etl_watermarks WHERE job_name = :job
+    """), {"job": job_name}).scalar()
+    return json.loads(value) if value else None
+
+
+def set_watermark(conn, job_name, last_id, state=None):
+    """Record progress of an incremental job; state is optional JSON-serialisable data."""
+    conn.execute(text("""
+        INSERT INTO etl_watermarks (job_name, last_id, state, updated_at)
+        VALUES (:job, :last_id, :state, CURRENT_TIMESTAMP)
+        ON CONFLICT (job_name) DO UPDATE
+        SET last_id = excluded.last_id,
+            state = COALESCE(excluded.state, etl_watermarks.state),
+            updated_at = CURRENT_TIMESTAMP
+    """), {"job": job_name, "last_id": last_id,
+           "state": json.dumps(state) if state is not None else None})
+
+
+def as_datetime(value):
+    """Normalise a timestamp column (datetime on Postgres, text on SQLite)."""
+    if value is None or isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime.combine(value, datetime.time())
+    return datetime.datetime.fromisoformat(str(value))
+
+
+def days_ago(days):
+    """Date `days` before today, as a bind-parameter friendly ISO string."""
+    return (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+
+
+def days_since(value, today=None):
+    """Whole days between a timestamp column and today, or None if it is NULL."""
+    if value is None:
+        return None
+    today = today or datetime.date.today()
+    return (today - as_datetime(value).date()).days
+
+
+def months_ago(months):
+    """First day of the month `months` calendar months before the current one."""
+    today = datetime.date.today()
+    index = today.year * 12 + today.month - 1 - months
+    return datetime.date(index // 12, index % 12 + 1, 1).isoformat()
@@ -1,14 +1,270 @@
 import sqlite3
 import os
 import bcrypt
+from sqlalchemy import create_engine
+from report_views import refresh_report_views
 
 DB_PATH = "supermarket.db"
 
+# Derived/analytics tables and indexes added after the first release. Every
+# statement is idempotent so upgrade_database() can bring an existing
+# database up to date.
+ANALYTICS_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS etl_watermarks (
+        job_name VARCHAR(50) PRIMARY KEY,
+        last_id INTEGER NOT NULL DEFAULT 0,
+        state TEXT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sale_line_fact (
+        sale_item_id INTEGER PRIMARY KEY,
+        sale_id INTEGER NOT NULL,
+        sale_time TIMESTAMP NOT NULL,
+        sale_date DATE NOT NULL,
+        sale_hour INTEGER NOT NULL,
+        sale_month CHAR(7) NOT NULL,
+        product_id INTEGER NOT NULL,
+        category_id INTEGER NOT NULL,
+        supplier_id INTEGER NOT NULL,
+        customer_id INTEGER,
+        employee_id INTEGER,
+        quantity INTEGER NOT NULL,
+        unit_price DECIMAL(10,2) NOT NULL,
+        line_revenue DECIMAL(12,2) NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sale_line_fact_sale_id ON sale_line_fact(sale_id)",
+    "CREATE INDEX IF NOT EXISTS idx_sale_line_fact_date ON sale_line_fact(sale_date)",
+    "CREATE INDEX IF NOT EXISTS idx_sale_line_fact_product_time ON sale_line_fact(product_id, sale_time)",
+    "CREATE INDEX IF NOT EXISTS idx_sale_line_fact_category_month ON sale_line_fact(category_id, sale_month)",
+    "CREATE INDEX IF NOT EXISTS idx_sale_line_fact_supplier ON sale_line_fact(supplier_id)",
+    """
+    CREATE TABLE IF NOT EXISTS sales_rollups (
+        grain VARCHAR(5) NOT NULL,
+        bucket VARCHAR(13) NOT NULL,
+        dim_type VARCHAR(10) NOT NULL,
+        dim_id INTEGER NOT NULL DEFAULT 0,
+        sale_count INTEGER NOT NULL DEFAULT 0,
+        revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+        units INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (grain, dim_type, dim_id, bucket)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS product_sales_stats (
+        product_id INTEGER PRIMARY KEY,
+        last_sale_time TIMESTAMP,
+        units_sold_total INTEGER NOT NULL DEFAULT 0,
+        units_7d INTEGER NOT NULL DEFAULT 0,
+        units_30d INTEGER NOT NULL DEFAULT 0,
+        units_90d INTEGER NOT NULL DEFAULT 0,
+        revenue_90d DECIMAL(14,2) NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_product_sales_stats_last_sale ON product_sales_stats(last_sale_time)",
+    """
+    CREATE TABLE IF NOT EXISTS supplier_scorecards (
+        supplier_id INTEGER PRIMARY KEY,
+        supplier_name VARCHAR(100) NOT NULL,
+        contact VARCHAR(100),
+        reliability_score INTEGER,
+        products_supplied INTEGER NOT NULL DEFAULT 0,
+        stock_units INTEGER NOT NULL DEFAULT 0,
+        out_of_stock_items INTEGER NOT NULL DEFAULT 0,
+        avg_stock_level DECIMAL(12,2),
+        total_revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+        items_sold INTEGER NOT NULL DEFAULT 0,
+        last_delivery DATE,
+        activity_status VARCHAR(20) NOT NULL,
+        composite_score DECIMAL(5,1) NOT NULL,
+        grade VARCHAR(10) NOT NULL
+    )
+    """,
+    # Unread queue for the paged inbox, per-product dedupe of unread alerts
+    # and compaction of old read rows
+    "CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(notification_id) WHERE status = 'unread'",
+    """
+    CREATE INDEX IF NOT EXISTS idx_notifications_unread_product
+    ON notifications(product_id, notification_type) WHERE status = 'unread'
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_notifications_read_at ON notifications(read_at) WHERE status = 'read'",
+    """
+    CREATE TABLE IF NOT EXISTS price_history (
+        history_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_id INTEGER NOT NULL,
+        old_price DECIMAL(10,2) NOT NULL,
+        new_price DECIMAL(10,2) NOT NULL,
+        reason VARCHAR(20) NOT NULL,
+        batch_id VARCHAR(32) NOT NULL,
+        changed_by INTEGER,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (product_id) REFERENCES products(product_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_price_history_product ON price_history(product_id, changed_at)",
+    "CREATE INDEX IF NOT EXISTS idx_price_history_batch ON price_history(batch_id)",
+    """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        source VARCHAR(30) PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS report_snapshots (
+        report_name VARCHAR(50) PRIMARY KEY,
+        generated_at TIMESTAMP NOT NULL,
+        row_count INTEGER NOT NULL,
+        duration_ms INTEGER,
+        params TEXT,
+        payload TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS product_basket_counts (
+        product_id INTEGER PRIMARY KEY,
+        baskets INTEGER NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS product_pair_counts (
+        product_a INTEGER NOT NULL,
+        product_b INTEGER NOT NULL,
+        baskets INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (product_a, product_b)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS product_associations (
+        product_id INTEGER NOT NULL,
+        related_product_id INTEGER NOT NULL,
+        pair_baskets INTEGER NOT NULL,
+        support REAL NOT NULL,
+        confidence REAL NOT NULL,
+        lift REAL NOT NULL,
+        PRIMARY KEY (product_id, related_product_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS customer_segments (
+        customer_id INTEGER PRIMARY KEY,
+        last_purchase TIMESTAMP NOT NULL,
+        frequency INTEGER NOT NULL,
+        monetary DECIMAL(12,2) NOT NULL,
+        r_score SMALLINT NOT NULL,
+        f_score SMALLINT NOT NULL,
+        m_score SMALLINT NOT NULL,
+        rfm_score VARCHAR(3) NOT NULL,
+        segment VARCHAR(30) NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_customer_segments_segment ON customer_segments(segment, customer_id)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales(customer_id)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_time ON sales(sale_time)",
+    """
+    CREATE TABLE IF NOT EXISTS anomaly_stats (
+        entity_type VARCHAR(10) NOT NULL,
+        entity_id INTEGER NOT NULL,
+        metric VARCHAR(20) NOT NULL,
+        observations INTEGER NOT NULL,
+        mean REAL NOT NULL,
+        variance REAL NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (entity_type, entity_id, metric)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS daily_sketches (
+        sale_date DATE NOT NULL,
+        sketch VARCHAR(20) NOT NULL,
+        payload BLOB NOT NULL,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (sale_date, sketch)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_products_low_stock ON products(stock_quantity) WHERE is_low_stock",
+    "CREATE INDEX IF NOT EXISTS idx_products_out_of_stock ON products(product_id) WHERE stock_quantity = 0",
+    # Summary tables standing in for the Postgres materialized views read by
+    # report.py; report_views.refresh_report_views keeps them current
+    """
+    CREATE TABLE IF NOT EXISTS daily_sales_report (
+        date VARCHAR(10) PRIMARY KEY,
+        transactions INTEGER NOT NULL,
+        total_revenue DECIMAL(14,2) NOT NULL,
+        units_sold INTEGER NOT NULL,
+        avg_sale DECIMAL(12,2)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS best_selling_products (
+        product_id INTEGER PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        category VARCHAR(100),
+        units_sold INTEGER NOT NULL,
+        units_30d INTEGER NOT NULL,
+        revenue_90d DECIMAL(14,2) NOT NULL,
+        last_sale_time TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_best_selling_products_units ON best_selling_products(units_sold DESC)",
+    """
+    CREATE TABLE IF NOT EXISTS low_stock_products (
+        product_id INTEGER PRIMARY KEY,
+        name VARCHAR(100) NOT NULL,
+        category VARCHAR(100),
+        supplier VARCHAR(100),
+        stock_quantity INTEGER NOT NULL,
+        low_stock_threshold INTEGER NOT NULL,
+        shortfall INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_low_stock_products_stock ON low_stock_products(stock_quantity)",
+]
+
+# Columns added to existing tables after their first release: (table, column, definition)
+ADDED_COLUMNS = [
+    ("suppliers", "reliability_score", "INTEGER CHECK (reliability_score BETWEEN 0 AND 100)"),
+    ("purchase_orders", "received_at", "TIMESTAMP"),
+    # The single definition of "low stock"; VIRTUAL because SQLite cannot add a STORED column
+    ("products", "is_low_stock",
+     "INTEGER GENERATED ALWAYS AS (COALESCE(stock_quantity < low_stock_threshold, 0)) VIRTUAL"),
+]
+
+
+def upgrade_database(conn):
+    """Create any missing analytics tables, indexes and columns"""
+    cursor = conn.cursor()
+    for table, column, definition in ADDED_COLUMNS:
+        # table_xinfo also lists generated columns, which table_info hides
+        existing = {row[1] for row in cursor.execute(f"PRAGMA table_xinfo({table})")}
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    for statement in ANALYTICS_SCHEMA:
+        cursor.execute(statement)
+    conn.commit()
+
+
+def fill_report_views():
+    """Populate the report summary tables so the reports have data before the first scheduled refresh"""
+    engine = create_engine(f"sqlite:///{DB_PATH}")
+    refresh_report_views(engine)
+    engine.dispose()
+
+
 def init_database():
     """Initialize SQLite database with schema"""
     
     if os.path.exists(DB_PATH):
-        print(f"Database '{DB_PATH}' already exists")
+        conn = sqlite3.connect(DB_PATH)
+        upgrade_database(conn)
+        conn.close()
+        fill_report_views()
+        print(f"Database '{DB_PATH}' already exists (schema upgraded)")
         return
     
     conn = sqlite3.connect(DB_PATH)
@@ -160,7 +416,9 @@ def init_database():
     """)
     
     conn.commit()
+    upgrade_database(conn)
     conn.close()
+    fill_report_views()
     print(f"✅ Database '{DB_PATH}' created successfully with sample data!")
 
 if __name__ == "__main__":
@@ -2,6 +2,9 @@
 from sqlalchemy import text
 from db import get_engine
 from auth import has_permission
+from stock_alerts import set_stock
+from report_cache import bump_data_version
+from purchase_receiving import receive_purchase_orders, pending_purchase_orders
 
 engine = get_engine()
 
@@ -19,7 +22,7 @@ def restock_products():
                        s.contact_info
                 FROM products p
                 JOIN suppliers s ON p.supplier_id = s.supplier_id
-                WHERE p.stock_quantity < p.low_stock_threshold
+                WHERE p.is_low_stock
                 ORDER BY p.stock_quantity ASC
             """)).fetchall()
             
@@ -47,6 +50,7 @@ def restock_products():
                 SET stock_quantity = stock_quantity + :qty
                 WHERE product_id = :pid
             """), {"qty": quantity, "pid": int(product_id)})
+            bump_data_version(conn)
             
             print(f"✅ Restocked {quantity} units successfully!")
             
@@ -76,10 +80,44 @@ def bulk_stock_update():
         try:
             with engine.begin() as conn:
                 for pid, qty in updates:
-                    conn.execute(text("""
-                        UPDATE products SET stock_quantity = :qty 
-                        WHERE product_id = :pid
-                    """), {"qty": qty, "pid": pid})
+                    set_stock(conn, pid, qty)
                 print(f"✅ Updated {len(updates)} products!")
         except Exception as e:
-            print(f"❌ Bulk update failed: {e}")
\ No newline at end of file
+            print(f"❌ Bulk update failed: {e}")
+
+def receive_deliveries():
+    """Receive one or more pending purchase orders into stock"""
+    if not has_permission(["MANAGER", "ADMIN"]):
+        return
+
+    try:
+        with engine.connect() as conn:
+            pending = pending_purchase_orders(conn)
+
+        if not pending:
+            print("✅ No pending purchase orders")
+            return
+
+        print("\n🚚 PENDING PURCHASE ORDERS:")
+        for order in pending:
+            print(f"PO #{order[0]} - {order[2]} | Ordered: {order[3]} | "
+                  f"{order[4]} lines, {order[5]} units, ₹{float(order[6]):,.2f}")
+        print("-" * 50)
+
+        choice = input("Enter PO IDs to receive (comma separated, 'all' or 'cancel'): ").strip().lower()
+        if not choice or choice == 'cancel':
+            return
+        if choice == 'all':
+            order_ids = [order[0] for order in pending]
+        else:
+            order_ids = [int(part) for part in choice.split(",") if part.strip()]
+
+        with engine.begin() as conn:
+            summary = receive_purchase_orders(conn, order_ids)
+
+        print(f"✅ Received {len(summary['orders'])} purchase order(s): "
+              f"{summary['units']} units across {summary['products']} products")
+    except ValueError as e:
+        print(f"❌ {e}")
+    except Exception as e:
+        print(f"❌ Error receiving deliveries: {e}")
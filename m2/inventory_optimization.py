@@ -1,10 +1,14 @@
 # inventory_optimization.py - FIXED VERSION
-from sqlalchemy import text
 from tabulate import tabulate
 from db import get_engine
-from auth import has_permission
+from auth import has_permission, get_current_user
+from analytics_backend import fetch_all
+from etl_state import days_ago, days_since, as_datetime
+from product_sales_stats import ensure_sales_windows_current
+from clearance_pricing import plan_clearance, apply_clearance_plan
 from datetime import datetime, timedelta
 import decimal
+import pandas as pd
 
 engine = get_engine()
 
@@ -29,9 +33,11 @@ def dead_stock_identification():
         return
         
     try:
-        with engine.connect() as conn:
+        # Roll the 7/30/90 day sales windows forward once a day
+        ensure_sales_windows_current(engine)
+        dashboard = fetch_all({
             # Dead Stock Analysis (no sales in 90 days but have stock)
-            dead_stock = conn.execute(text("""
+            "dead_stock": ("""
                 SELECT 
                     p.product_id,
                     p.name as product_name,
@@ -39,75 +45,66 @@ def dead_stock_identification():
                     p.stock_quantity,
                     p.low_stock_threshold,
                     p.price,
-                    MAX(s.sale_time) as last_sale_date,
-                    COALESCE(SUM(si.quantity), 0) as total_sold,
+                    st.last_sale_time as last_sale_date,
+                    COALESCE(st.units_sold_total, 0) as total_sold,
                     CASE 
-                        WHEN MAX(s.sale_time) IS NULL THEN 'Never Sold'
-                        WHEN MAX(s.sale_time) < CURRENT_DATE - INTERVAL '90 days' THEN '90+ Days'
-                        WHEN MAX(s.sale_time) < CURRENT_DATE - INTERVAL '60 days' THEN '60+ Days'
+                        WHEN st.last_sale_time IS NULL THEN 'Never Sold'
+                        WHEN st.last_sale_time < :since_90d THEN '90+ Days'
+                        WHEN st.last_sale_time < :since_60d THEN '60+ Days'
                         ELSE 'Active'
                     END as sales_status,
                     (p.stock_quantity * p.price) as inventory_value
                 FROM products p
                 LEFT JOIN categories c ON p.category_id = c.category_id
-                LEFT JOIN sale_items si ON p.product_id = si.product_id
-                LEFT JOIN sales s ON si.sale_id = s.sale_id
+                LEFT JOIN product_sales_stats st ON p.product_id = st.product_id
                 WHERE p.stock_quantity > 0
-                GROUP BY p.product_id, p.name, c.name, p.stock_quantity, p.low_stock_threshold, p.price
-                HAVING MAX(s.sale_time) IS NULL OR MAX(s.sale_time) < CURRENT_DATE - INTERVAL '60 days'
+                  AND (st.last_sale_time IS NULL OR st.last_sale_time < :since_60d)
                 ORDER BY last_sale_date NULLS FIRST, total_sold ASC
-            """)).fetchall()
-            
+            """, {"since_60d": days_ago(60), "since_90d": days_ago(90)}),
             # Slow Moving Analysis (low sales velocity)
-            slow_moving = conn.execute(text("""
+            "slow_moving": """
                 SELECT 
                     p.product_id,
                     p.name as product_name,
                     c.name as category,
                     p.stock_quantity,
                     p.price,
-                    COALESCE(SUM(si.quantity), 0) as units_sold_90d,
-                    COALESCE(SUM(si.quantity * si.unit_price), 0) as revenue_90d,
+                    st.units_90d as units_sold_90d,
+                    st.revenue_90d,
                     CASE 
                         WHEN p.stock_quantity = 0 THEN 0
-                        WHEN COALESCE(SUM(si.quantity), 0) = 0 THEN 999
-                        ELSE ROUND(p.stock_quantity / NULLIF(SUM(si.quantity), 0) * 90, 1)
+                        ELSE ROUND(p.stock_quantity * 90.0 / st.units_90d, 1)
                     END as days_of_supply,
                     (p.stock_quantity * p.price) as inventory_value
                 FROM products p
                 LEFT JOIN categories c ON p.category_id = c.category_id
-                LEFT JOIN sale_items si ON p.product_id = si.product_id
-                LEFT JOIN sales s ON si.sale_id = s.sale_id
-                WHERE s.sale_time >= CURRENT_DATE - INTERVAL '90 days' OR s.sale_time IS NULL
-                GROUP BY p.product_id, p.name, c.name, p.stock_quantity, p.price
-                HAVING COALESCE(SUM(si.quantity), 0) > 0  -- Has some sales
+                JOIN product_sales_stats st ON p.product_id = st.product_id
+                WHERE st.units_90d > 0  -- Has some sales
                 ORDER BY days_of_supply DESC NULLS LAST
                 LIMIT 20
-            """)).fetchall()
-            
+            """,
             # Inventory Age Analysis
-            inventory_age = conn.execute(text("""
+            "inventory_age": """
                 SELECT 
                     p.product_id,
                     p.name as product_name,
                     c.name as category,
                     p.stock_quantity,
                     p.price,
-                    MAX(s.sale_time) as last_sale_date,
-                    COALESCE(SUM(si.quantity), 0) as total_sold,
-                    CASE 
-                        WHEN MAX(s.sale_time) IS NULL THEN 999
-                        ELSE EXTRACT(DAY FROM CURRENT_DATE - MAX(s.sale_time))
-                    END as days_since_last_sale,
+                    st.last_sale_time as last_sale_date,
+                    COALESCE(st.units_sold_total, 0) as total_sold,
                     (p.stock_quantity * p.price) as inventory_value
                 FROM products p
                 LEFT JOIN categories c ON p.category_id = c.category_id
-                LEFT JOIN sale_items si ON p.product_id = si.product_id
-                LEFT JOIN sales s ON si.sale_id = s.sale_id
+                LEFT JOIN product_sales_stats st ON p.product_id = st.product_id
                 WHERE p.stock_quantity > 0
-                GROUP BY p.product_id, p.name, c.name, p.stock_quantity, p.price
-                ORDER BY days_since_last_sale DESC, inventory_value DESC
-            """)).fetchall()
+                ORDER BY last_sale_date NULLS FIRST, inventory_value DESC
+                LIMIT 15
+            """,
+        }, report="dead_stock")
+        dead_stock = dashboard["dead_stock"]
+        slow_moving = dashboard["slow_moving"]
+        inventory_age = dashboard["inventory_age"]
             
         print("\n" + "="*100)
         print("📦 DEAD STOCK IDENTIFICATION & INVENTORY OPTIMIZATION")
@@ -123,7 +120,7 @@ def dead_stock_identification():
             
             for product in dead_stock:
                 status_icon = "🔴" if product[8] == 'Never Sold' else "🟡" if product[8] == '90+ Days' else "🟠"
-                last_sale = "Never" if not product[6] else product[6].strftime('%Y-%m-%d')
+                last_sale = "Never" if not product[6] else as_datetime(product[6]).strftime('%Y-%m-%d')
                 
                 # Safe decimal handling for inventory value
                 inventory_value = product[9] or decimal.Decimal('0')
@@ -182,9 +179,9 @@ def dead_stock_identification():
         print("-" * 80)
         
         aged_table = []
-        for product in inventory_age[:15]:  # Show top 15 oldest
-            days_old = product[7]
-            if days_old == 999:
+        for product in inventory_age:  # Top 15 oldest
+            days_old = days_since(product[5])
+            if days_old is None:
                 age_status = "🆕 Never Sold"
             elif days_old > 180:
                 age_status = "🔴 Very Old"
@@ -200,7 +197,7 @@ def dead_stock_identification():
                 'Product Name': product[1][:30] + '...' if len(product[1]) > 30 else product[1],
                 'Category': product[2],
                 'Stock': product[3],
-                'Days Since Sale': days_old if days_old != 999 else 'Never',
+                'Days Since Sale': days_old if days_old is not None else 'Never',
                 'Status': age_status,
                 'Total Sold': product[6]
             })
@@ -236,90 +233,44 @@ def dead_stock_identification():
         import traceback
         print(f"Detailed error: {traceback.format_exc()}")
 
+def _show_clearance_plan(plan):
+    """Print a priced clearance plan; returns False when it is empty"""
+    print("\n🎪 CLEARANCE PRICING RECOMMENDATIONS")
+    print("=" * 80)
+    if plan.empty:
+        print("✅ No clearance candidates identified! Inventory is well-managed.")
+        return False
+
+    recommendations = [{
+        'Product ID': row.product_id,
+        'Product Name': row.name[:25] + '...' if len(row.name) > 25 else row.name,
+        'Category': row.category,
+        'Current Stock': row.stock_quantity,
+        'Current Price': f"₹{row.current_price:.2f}",
+        'Days Unsold': row.days_unsold if not pd.isna(row.days_unsold) else 'Never',
+        'Recommended Price': f"₹{row.new_price:.2f}",
+        'Discount': f"{row.discount*100:.0f}%",
+        'Potential Revenue': f"₹{row.potential_revenue:,.2f}"
+    } for row in plan.itertuples(index=False)]
+    print(tabulate(recommendations, headers="keys", tablefmt="grid"))
+    print(f"\n💰 **TOTAL POTENTIAL CLEARANCE REVENUE: ₹{plan['potential_revenue'].sum():,.2f}**")
+    return True
+
 def generate_clearance_recommendations():
     """Generate specific clearance pricing recommendations"""
     if not has_permission(["MANAGER", "ADMIN"]):
         return
         
     try:
-        with engine.connect() as conn:
-            # Get candidates for clearance
-            clearance_candidates = conn.execute(text("""
-                SELECT 
-                    p.product_id,
-                    p.name,
-                    c.name as category,
-                    p.stock_quantity,
-                    p.price as current_price,
-                    MAX(s.sale_time) as last_sale,
-                    COALESCE(SUM(si.quantity), 0) as total_sold,
-                    CASE 
-                        WHEN MAX(s.sale_time) IS NULL THEN 999
-                        ELSE EXTRACT(DAY FROM CURRENT_DATE - MAX(s.sale_time))
-                    END as days_unsold
-                FROM products p
-                LEFT JOIN categories c ON p.category_id = c.category_id
-                LEFT JOIN sale_items si ON p.product_id = si.product_id
-                LEFT JOIN sales s ON si.sale_id = s.sale_id
-                WHERE p.stock_quantity > 0
-                GROUP BY p.product_id, p.name, c.name, p.stock_quantity, p.price
-                HAVING MAX(s.sale_time) IS NULL OR MAX(s.sale_time) < CURRENT_DATE - INTERVAL '60 days'
-                ORDER BY days_unsold DESC, p.stock_quantity DESC
-            """)).fetchall()
-            
-        print("\n🎪 CLEARANCE PRICING RECOMMENDATIONS")
-        print("=" * 80)
-        
-        if clearance_candidates:
-            recommendations = []
-            total_potential = decimal.Decimal('0')
-            
-            for product in clearance_candidates:
-                days_unsold = product[7]
-                current_price = product[4] or decimal.Decimal('0')
-                stock_quantity = product[3] or 0
-                
-                # Calculate recommended discount
-                if days_unsold >= 180:
-                    discount = decimal.Decimal('0.5')  # 50% off
-                elif days_unsold >= 120:
-                    discount = decimal.Decimal('0.4')  # 40% off
-                elif days_unsold >= 90:
-                    discount = decimal.Decimal('0.3')  # 30% off
-                else:
-                    discount = decimal.Decimal('0.2')  # 20% off
-                
-                # Safe decimal calculations
-                new_price = current_price * (decimal.Decimal('1') - discount)
-                potential_revenue = new_price * decimal.Decimal(str(stock_quantity))
-                total_potential += potential_revenue
-                
-                recommendations.append({
-                    'Product ID': product[0],
-                    'Product Name': product[1][:25] + '...' if len(product[1]) > 25 else product[1],
-                    'Category': product[2],
-                    'Current Stock': stock_quantity,
-                    'Current Price': f"₹{safe_float_convert(current_price):.2f}",
-                    'Days Unsold': days_unsold if days_unsold != 999 else 'Never',
-                    'Recommended Price': f"₹{safe_float_convert(new_price):.2f}",
-                    'Discount': f"{safe_float_convert(discount)*100:.0f}%",
-                    'Potential Revenue': f"₹{safe_float_convert(potential_revenue):,.2f}"
-                })
-            
-            print(tabulate(recommendations, headers="keys", tablefmt="grid"))
-            
-            print(f"\n💰 **TOTAL POTENTIAL CLEARANCE REVENUE: ₹{safe_float_convert(total_potential):,.2f}**")
-            
+        ensure_sales_windows_current(engine)
+        if _show_clearance_plan(plan_clearance(engine)):
             # Action steps
             print("\n📋 **NEXT STEPS:**")
-            print("1. Implement recommended pricing in system")
+            print("1. Apply the recommended prices (Apply Clearance Pricing)")
             print("2. Create 'Clearance Section' promotional display")
             print("3. Train staff on clearance items")
             print("4. Monitor sales velocity weekly")
             
-        else:
-            print("✅ No clearance candidates identified! Inventory is well-managed.")
-            
     except Exception as e:
         print(f"❌ Error generating clearance recommendations: {e}")
         import traceback
@@ -331,22 +282,22 @@ def inventory_health_dashboard():
         return
         
     try:
-        with engine.connect() as conn:
+        ensure_sales_windows_current(engine)
+        dashboard = fetch_all({
             # Overall Inventory Metrics
-            overall_metrics = conn.execute(text("""
+            "overall": """
                 SELECT 
                     COUNT(*) as total_products,
                     SUM(stock_quantity) as total_units,
                     SUM(stock_quantity * price) as total_inventory_value,
                     AVG(stock_quantity) as avg_stock_per_product,
                     COUNT(CASE WHEN stock_quantity = 0 THEN 1 END) as out_of_stock_count,
-                    COUNT(CASE WHEN stock_quantity < low_stock_threshold THEN 1 END) as low_stock_count,
+                    COUNT(CASE WHEN is_low_stock THEN 1 END) as low_stock_count,
                     COUNT(CASE WHEN stock_quantity > low_stock_threshold * 3 THEN 1 END) as over_stock_count
                 FROM products
-            """)).fetchone()
-            
+            """,
             # Category-wise inventory distribution
-            category_inventory = conn.execute(text("""
+            "category_inventory": """
                 SELECT 
                     c.name as category,
                     COUNT(p.product_id) as product_count,
@@ -359,36 +310,36 @@ def inventory_health_dashboard():
                 LEFT JOIN products p ON c.category_id = p.category_id
                 GROUP BY c.category_id, c.name
                 ORDER BY category_value DESC
-            """)).fetchall()
-            
+            """,
             # Stock Turnover Analysis
-            turnover_analysis = conn.execute(text("""
+            "turnover": """
                 SELECT 
                     p.product_id,
                     p.name as product_name,
                     c.name as category,
                     p.stock_quantity,
-                    COALESCE(SUM(si.quantity), 0) as units_sold_30d,
+                    COALESCE(st.units_30d, 0) as units_sold_30d,
                     CASE 
                         WHEN p.stock_quantity = 0 THEN 0
-                        WHEN COALESCE(SUM(si.quantity), 0) = 0 THEN 999
-                        ELSE ROUND(p.stock_quantity / NULLIF(SUM(si.quantity), 0) * 30, 1)
+                        WHEN COALESCE(st.units_30d, 0) = 0 THEN 999
+                        ELSE ROUND(p.stock_quantity * 30.0 / st.units_30d, 1)
                     END as days_of_supply,
                     CASE 
-                        WHEN COALESCE(SUM(si.quantity), 0) = 0 THEN 'No Sales'
-                        WHEN (p.stock_quantity / NULLIF(SUM(si.quantity), 0) * 30) > 90 THEN 'Slow'
-                        WHEN (p.stock_quantity / NULLIF(SUM(si.quantity), 0) * 30) > 30 THEN 'Moderate'
+                        WHEN COALESCE(st.units_30d, 0) = 0 THEN 'No Sales'
+                        WHEN p.stock_quantity * 30.0 / st.units_30d > 90 THEN 'Slow'
+                        WHEN p.stock_quantity * 30.0 / st.units_30d > 30 THEN 'Moderate'
                         ELSE 'Fast'
                     END as turnover_rate
                 FROM products p
                 LEFT JOIN categories c ON p.category_id = c.category_id
-                LEFT JOIN sale_items si ON p.product_id = si.product_id
-                LEFT JOIN sales s ON si.sale_id = s.sale_id
-                WHERE s.sale_time >= CURRENT_DATE - INTERVAL '30 days' OR s.sale_time IS NULL
-                GROUP BY p.product_id, p.name, c.name, p.stock_quantity
+                LEFT JOIN product_sales_stats st ON p.product_id = st.product_id
                 ORDER BY days_of_supply DESC
                 LIMIT 15
-            """)).fetchall()
+            """,
+        }, report="inventory_health")
+        overall_metrics = dashboard["overall"][0]
+        category_inventory = dashboard["category_inventory"]
+        turnover_analysis = dashboard["turnover"]
             
         print("\n" + "="*100)
         print("🏥 INVENTORY HEALTH DASHBOARD")
@@ -487,46 +438,39 @@ def inventory_health_dashboard():
         print(f"Detailed error: {traceback.format_exc()}")
 
 def apply_clearance_pricing():
-    """Apply clearance pricing to selected products"""
+    """Apply clearance pricing to all or selected candidates in one batch"""
     if not has_permission(["ADMIN"]):
         return
         
     try:
-        # First show clearance recommendations
-        generate_clearance_recommendations()
-        
-        product_id = input("\nEnter Product ID to apply clearance pricing (or 'cancel'): ").strip()
-        if product_id.lower() == 'cancel':
+        ensure_sales_windows_current(engine)
+        plan = plan_clearance(engine)
+        if not _show_clearance_plan(plan):
             return
-            
-        new_price = input("Enter new clearance price: ").strip()
         
-        if not product_id or not new_price:
-            print("❌ Product ID and price are required")
+        selection = input("\nProduct IDs to mark down (comma separated), 'all', or 'cancel': ").strip().lower()
+        if not selection or selection == 'cancel':
             return
-            
-        with engine.begin() as conn:
-            # Get current product info
-            product_info = conn.execute(text("""
-                SELECT name, price FROM products WHERE product_id = :pid
-            """), {"pid": int(product_id)}).fetchone()
-            
-            if not product_info:
-                print("❌ Product not found")
+        if selection != 'all':
+            ids = {int(pid) for pid in selection.split(",") if pid.strip()}
+            unknown = ids - set(plan["product_id"])
+            if unknown:
+                print(f"❌ Not clearance candidates: {', '.join(map(str, sorted(unknown)))}")
                 return
-                
-            # Update price
-            conn.execute(text("""
-                UPDATE products SET price = :new_price WHERE product_id = :pid
-            """), {"new_price": decimal.Decimal(new_price), "pid": int(product_id)})
-            
-            old_price = product_info[1]
-            discount = ((old_price - decimal.Decimal(new_price)) / old_price) * 100
-            
-            print(f"✅ Price updated for '{product_info[0]}'")
-            print(f"   Old Price: ₹{safe_float_convert(old_price):.2f}")
-            print(f"   New Price: ₹{safe_float_convert(new_price):.2f}")
-            print(f"   Discount: {safe_float_convert(discount):.1f}%")
+            plan = plan[plan["product_id"].isin(ids)].copy()
+            if len(plan) == 1:
+                custom = input(f"Clearance price (default ₹{plan['new_price'].iloc[0]:.2f}): ").strip()
+                if custom:
+                    plan["new_price"] = float(decimal.Decimal(custom))
+        
+        batch_id, applied = apply_clearance_plan(engine, plan, changed_by=get_current_user())
+        if not applied:
+            print("⚡ No prices changed")
+            return
+        old_value = (plan["current_price"] * plan["stock_quantity"]).sum()
+        new_value = (plan["new_price"] * plan["stock_quantity"]).sum()
+        print(f"✅ Clearance prices applied to {applied} products (batch {batch_id[:8]})")
+        print(f"   Stock value: ₹{old_value:,.2f} → ₹{new_value:,.2f}")
             
     except Exception as e:
         print(f"❌ Error applying clearance pricing: {e}")
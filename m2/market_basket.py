@@ -0,0 +1,209 @@
+# market_basket.py
+import os
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sqlalchemy import text
+from tabulate import tabulate
+from db import get_engine
+from auth import has_permission
+from etl_state import get_watermark, get_job_state, set_watermark
+
+engine = get_engine()
+
+JOB_NAME = "market_basket"
+CHUNK_SALES = 100000            # sales per sparse matrix; a basket is never split across chunks
+MIN_PAIR_BASKETS = int(os.getenv("BASKET_MIN_PAIR_COUNT", "3"))
+TOP_RELATED = int(os.getenv("BASKET_TOP_RELATED", "10"))   # associations kept per product
+
+LINES_QUERY = text("""
+    SELECT sale_id, product_id
+    FROM sale_line_fact
+    WHERE sale_id > :after AND sale_id <= :upto
+""")
+
+UPSERT_PAIRS = text("""
+    INSERT INTO product_pair_counts (product_a, product_b, baskets)
+    VALUES (:a, :b, :n)
+    ON CONFLICT (product_a, product_b) DO UPDATE
+    SET baskets = product_pair_counts.baskets + excluded.baskets
+""")
+
+UPSERT_ITEMS = text("""
+    INSERT INTO product_basket_counts (product_id, baskets)
+    VALUES (:pid, :n)
+    ON CONFLICT (product_id) DO UPDATE
+    SET baskets = product_basket_counts.baskets + excluded.baskets
+""")
+
+
+def basket_counts(sale_ids, product_ids):
+    """
+    Count baskets per product and per product pair for one batch of sale
+    lines. Builds a binary sale x product CSR matrix and takes X.T @ X, so
+    the cost grows with the number of co-occurring pairs, not basket size
+    squared per join. Returns (items, pairs, baskets): items and pairs are
+    DataFrames (product_id, n) and (a, b, n) with a < b.
+    """
+    sales, rows = np.unique(np.asarray(sale_ids), return_inverse=True)
+    products, cols = np.unique(np.asarray(product_ids), return_inverse=True)
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                               shape=(len(sales), len(products)))
+    matrix.data[:] = 1      # a product on two lines of one sale is still one basket
+    co = sparse.triu(matrix.T @ matrix, format="coo")
+    diagonal = co.row == co.col
+    items = pd.DataFrame({"product_id": products[co.row[diagonal]], "n": co.data[diagonal]})
+    pairs = pd.DataFrame({"a": products[co.row[~diagonal]], "b": products[co.col[~diagonal]],
+                          "n": co.data[~diagonal]})
+    return items, pairs, len(sales)
+
+
+def _store_counts(conn, items, pairs):
+    if len(items):
+        conn.execute(UPSERT_ITEMS, [{"pid": int(r.product_id), "n": int(r.n)}
+                                    for r in items.itertuples(index=False)])
+    if len(pairs):
+        conn.execute(UPSERT_PAIRS, [{"a": int(r.a), "b": int(r.b), "n": int(r.n)}
+                                    for r in pairs.itertuples(index=False)])
+
+
+def update_basket_counts(engine, chunk_sales=CHUNK_SALES):
+    """
+    Add sales newer than the watermark to the item and pair counts, one
+    sale_id range at a time. Returns the number of new baskets. Deleted
+    sales are only dropped by rebuild_basket_counts.
+    """
+    with engine.connect() as conn:
+        last_id = get_watermark(conn, JOB_NAME)
+        baskets = (get_job_state(conn, JOB_NAME) or {}).get("baskets", 0)
+        upper = conn.execute(text("SELECT COALESCE(MAX(sale_id), 0) FROM sale_line_fact")).scalar()
+    added = 0
+    while last_id < upper:
+        upto = min(last_id + chunk_sales, upper)
+        with engine.begin() as conn:
+            lines = conn.execute(LINES_QUERY, {"after": last_id, "upto": upto}).fetchall()
+            if lines:
+                sale_ids, product_ids = zip(*lines)
+                items, pairs, count = basket_counts(sale_ids, product_ids)
+                _store_counts(conn, items, pairs)
+                added += count
+                baskets += count
+            set_watermark(conn, JOB_NAME, upto, {"baskets": baskets})
+        last_id = upto
+    return added
+
+
+def rebuild_basket_counts(engine, chunk_sales=CHUNK_SALES):
+    """Recount every basket from sale_line_fact. Returns the number of baskets."""
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM product_pair_counts"))
+        conn.execute(text("DELETE FROM product_basket_counts"))
+        set_watermark(conn, JOB_NAME, 0, {"baskets": 0})
+    return update_basket_counts(engine, chunk_sales)
+
+
+def association_rules(items, pairs, baskets, min_pair_baskets=MIN_PAIR_BASKETS, top_related=TOP_RELATED):
+    """
+    Support, confidence and lift for both directions of every pair seen in
+    at least min_pair_baskets baskets, keeping the top_related products per
+    product by lift (then confidence).
+    """
+    pairs = pairs[pairs["n"] >= min_pair_baskets]
+    if pairs.empty or not baskets:
+        return pd.DataFrame(columns=["product_id", "related_product_id", "pair_baskets",
+                                     "support", "confidence", "lift"])
+    both = pd.concat([
+        pairs.rename(columns={"a": "product_id", "b": "related_product_id"}),
+        pairs.rename(columns={"b": "product_id", "a": "related_product_id"}),
+    ], ignore_index=True).rename(columns={"n": "pair_baskets"})
+    counts = items.set_index("product_id")["n"]
+    antecedent = both["product_id"].map(counts).to_numpy(dtype="float64")
+    consequent = both["related_product_id"].map(counts).to_numpy(dtype="float64")
+    pair_baskets = both["pair_baskets"].to_numpy(dtype="float64")
+    confidence = pair_baskets / antecedent
+    both = both.assign(
+        support=(pair_baskets / baskets).round(6),
+        confidence=confidence.round(4),
+        lift=(confidence / (consequent / baskets)).round(3),
+    )
+    both = both.sort_values(["product_id", "lift", "confidence"], ascending=[True, False, False])
+    return both.groupby("product_id", sort=False).head(top_related).reset_index(drop=True)
+
+
+def refresh_associations(engine):
+    """
+    Bring counts up to date with new sales and recompute the
+    product_associations table. Returns the number of associations.
+    """
+    update_basket_counts(engine)
+    with engine.connect() as conn:
+        baskets = (get_job_state(conn, JOB_NAME) or {}).get("baskets", 0)
+        items = pd.read_sql(text("SELECT product_id, baskets as n FROM product_basket_counts"), conn)
+        pairs = pd.read_sql(text("""
+            SELECT product_a as a, product_b as b, baskets as n
+            FROM product_pair_counts
+            WHERE baskets >= :min_pairs
+        """), conn, params={"min_pairs": MIN_PAIR_BASKETS})
+    rules = association_rules(items, pairs, baskets)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM product_associations"))
+        if len(rules):
+            conn.execute(text("""
+                INSERT INTO product_associations
+                    (product_id, related_product_id, pair_baskets, support, confidence, lift)
+                VALUES (:product_id, :related_product_id, :pair_baskets, :support, :confidence, :lift)
+            """), [{"product_id": int(r.product_id), "related_product_id": int(r.related_product_id),
+                    "pair_baskets": int(r.pair_baskets), "support": float(r.support),
+                    "confidence": float(r.confidence), "lift": float(r.lift)}
+                   for r in rules.itertuples(index=False)])
+    return len(rules)
+
+
+def frequently_bought_together(conn, product_id, limit=TOP_RELATED):
+    """Products most associated with product_id, strongest lift first."""
+    return conn.execute(text("""
+        SELECT a.related_product_id, p.name, a.pair_baskets, a.support, a.confidence, a.lift
+        FROM product_associations a
+        JOIN products p ON p.product_id = a.related_product_id
+        WHERE a.product_id = :pid
+        ORDER BY a.lift DESC, a.confidence DESC
+        LIMIT :limit
+    """), {"pid": product_id, "limit": limit}).fetchall()
+
+
+# ------------------ CLI ------------------
+def bought_together_report():
+    """Show 'frequently bought together' products, for one product or the strongest pairs overall"""
+    if not has_permission(["MANAGER", "ADMIN"]):
+        return
+
+    try:
+        product_id = input("Product ID (blank for the strongest pairs overall): ").strip()
+        with engine.connect() as conn:
+            if product_id:
+                rows = frequently_bought_together(conn, int(product_id))
+                headers = ["Product ID", "Name", "Baskets", "Support", "Confidence", "Lift"]
+                title = f"🛒 FREQUENTLY BOUGHT WITH PRODUCT {product_id}"
+            else:
+                rows = conn.execute(text("""
+                    SELECT pa.name, pb.name, a.pair_baskets, a.confidence, a.lift
+                    FROM product_associations a
+                    JOIN products pa ON pa.product_id = a.product_id
+                    JOIN products pb ON pb.product_id = a.related_product_id
+                    WHERE a.product_id < a.related_product_id
+                    ORDER BY a.lift DESC, a.pair_baskets DESC
+                    LIMIT 20
+                """)).fetchall()
+                headers = ["Product", "Bought With", "Baskets", "Confidence", "Lift"]
+                title = "🛒 STRONGEST PRODUCT PAIRS"
+        if not rows:
+            print("📭 No associations yet - they are computed nightly by the report scheduler")
+            return
+        print(f"\n{title}")
+        print(tabulate(rows, headers=headers, tablefmt="grid"))
+    except Exception as e:
+        print(f"❌ Market basket error: {e}")
+
+
+if __name__ == "__main__":
+    print(f"✅ {refresh_associations(engine)} associations")
@@ -0,0 +1,115 @@
+# notification_inbox.py
+import os
+import datetime
+from sqlalchemy import text, bindparam
+from etl_state import days_ago, get_job_state, set_watermark
+
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+MARK_READ_BATCH = 1000
+# Read notifications older than this are deleted by compaction
+READ_RETENTION_DAYS = int(os.getenv("NOTIFICATION_RETENTION_DAYS", "30"))
+COMPACTION_JOB = "notification_compaction"
+
+STATUSES = ("unread", "read")
+
+
+def fetch_page(conn, status="unread", limit=PAGE_SIZE, before_id=None):
+    """
+    One page of notifications, newest first, with keyset pagination on
+    notification_id. Returns (rows, next_cursor); pass next_cursor as
+    before_id to get the following page (None when there are no more).
+    """
+    if status is not None and status not in STATUSES:
+        raise ValueError("status must be 'unread', 'read' or None")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    conditions, params = [], {"limit": limit + 1}
+    if status is not None:
+        conditions.append("n.status = :status")
+        params["status"] = status
+    if before_id is not None:
+        conditions.append("n.notification_id < :before")
+        params["before"] = before_id
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = conn.execute(text(f"""
+        SELECT n.notification_id, n.message, n.status, n.notification_type,
+               n.created_at, n.product_id, p.name as product_name
+        FROM notifications n
+        LEFT JOIN products p ON n.product_id = p.product_id
+        {where}
+        ORDER BY n.notification_id DESC
+        LIMIT :limit
+    """), params).fetchall()
+    next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def unread_count(conn):
+    return conn.execute(text("SELECT COUNT(*) FROM notifications WHERE status = 'unread'")).scalar()
+
+
+def mark_read(conn, notification_ids):
+    """Mark specific notifications read. Returns how many were unread."""
+    ids = sorted({int(notification_id) for notification_id in notification_ids})
+    if not ids:
+        return 0
+    return conn.execute(text("""
+        UPDATE notifications
+        SET status = 'read', read_at = CURRENT_TIMESTAMP
+        WHERE notification_id IN :ids AND status = 'unread'
+    """).bindparams(bindparam("ids", expanding=True)), {"ids": ids}).rowcount
+
+
+def mark_read_up_to(engine, cursor_id, batch_size=MARK_READ_BATCH):
+    """
+    Mark every unread notification with notification_id <= cursor_id read.
+    Works in short batches, each in its own transaction, so writers raising
+    new alerts are never blocked for long. Returns the number marked.
+    """
+    marked = 0
+    while True:
+        with engine.begin() as conn:
+            count = conn.execute(text("""
+                UPDATE notifications
+                SET status = 'read', read_at = CURRENT_TIMESTAMP
+                WHERE notification_id IN (
+                    SELECT notification_id FROM notifications
+                    WHERE status = 'unread' AND notification_id <= :cursor
+                    ORDER BY notification_id
+                    LIMIT :batch
+                )
+            """), {"cursor": cursor_id, "batch": batch_size}).rowcount
+        marked += count
+        if count < batch_size:
+            return marked
+
+
+def compact_notifications(engine, keep_days=READ_RETENTION_DAYS, batch_size=5000):
+    """Delete read notifications read more than keep_days ago, in batches. Returns rows deleted."""
+    deleted = 0
+    cutoff = days_ago(keep_days)
+    while True:
+        with engine.begin() as conn:
+            count = conn.execute(text("""
+                DELETE FROM notifications
+                WHERE notification_id IN (
+                    SELECT notification_id FROM notifications
+                    WHERE status = 'read' AND read_at < :cutoff
+                    ORDER BY notification_id
+                    LIMIT :batch
+                )
+            """), {"cutoff": cutoff, "batch": batch_size}).rowcount
+            if count < batch_size:
+                set_watermark(conn, COMPACTION_JOB, 0, {"as_of": datetime.date.today().isoformat()})
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def compact_if_due(engine):
+    """Run compaction at most once a day. Returns rows deleted (0 if it already ran today)."""
+    with engine.connect() as conn:
+        state = get_job_state(conn, COMPACTION_JOB)
+    if state and state.get("as_of") == datetime.date.today().isoformat():
+        return 0
+    return compact_notifications(engine)
@@ -4,6 +4,7 @@ from sqlalchemy import text
 from tabulate import tabulate
 from db import get_engine
 from auth import has_permission, get_current_user, get_current_name
+from report_cache import bump_data_version
 
 engine = get_engine()
 
@@ -39,6 +40,7 @@ def add_product():
                 "supplier_id": supplier_id,
                 "threshold": low_stock_threshold
             })
+            bump_data_version(conn)
         print("✅ Product added successfully!")
     except Exception as e:
         print(f"❌ Error adding product: {e}")
@@ -91,6 +93,7 @@ def set_stock_thresholds():
             """), {"threshold": int(new_threshold), "pid": int(product_id)})
             
             updated_product = result.fetchone()
+            bump_data_version(conn)
             if updated_product:
                 print(f"✅ Threshold updated for '{updated_product[0]}' to {new_threshold}")
             else:
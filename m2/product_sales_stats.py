@@ -0,0 +1,129 @@
+# product_sales_stats.py
+import datetime
+from collections import defaultdict
+from sqlalchemy import text
+from etl_state import days_ago, get_job_state, set_watermark
+
+JOB_NAME = "product_sales_windows"
+WINDOWS = (7, 30, 90)
+
+UPSERT_STATS = text("""
+    INSERT INTO product_sales_stats (
+        product_id, last_sale_time, units_sold_total,
+        units_7d, units_30d, units_90d, revenue_90d, updated_at)
+    VALUES (
+        :product_id, :last_sale_time, :units_sold_total,
+        :units_7d, :units_30d, :units_90d, :revenue_90d, CURRENT_TIMESTAMP)
+    ON CONFLICT (product_id) DO UPDATE
+    SET last_sale_time = CASE
+            WHEN product_sales_stats.last_sale_time IS NULL
+              OR excluded.last_sale_time > product_sales_stats.last_sale_time
+            THEN excluded.last_sale_time
+            ELSE product_sales_stats.last_sale_time
+        END,
+        units_sold_total = product_sales_stats.units_sold_total + excluded.units_sold_total,
+        units_7d = product_sales_stats.units_7d + excluded.units_7d,
+        units_30d = product_sales_stats.units_30d + excluded.units_30d,
+        units_90d = product_sales_stats.units_90d + excluded.units_90d,
+        revenue_90d = product_sales_stats.revenue_90d + excluded.revenue_90d,
+        updated_at = CURRENT_TIMESTAMP
+""")
+
+WINDOW_TOTALS = """
+    SELECT product_id,
+           SUM(CASE WHEN sale_date >= :since_7d THEN quantity ELSE 0 END),
+           SUM(CASE WHEN sale_date >= :since_30d THEN quantity ELSE 0 END),
+           SUM(quantity),
+           SUM(line_revenue)
+    FROM sale_line_fact
+    WHERE sale_date >= :since_90d
+    GROUP BY product_id
+"""
+
+
+def _window_starts():
+    return {f"since_{days}d": days_ago(days) for days in WINDOWS}
+
+
+def apply_facts_to_product_stats(conn, facts):
+    """Add freshly inserted sale_line_fact rows to the per-product sales stats."""
+    if not facts:
+        return
+    starts = _window_starts()
+    stats = defaultdict(lambda: {"last_sale_time": None, "units_sold_total": 0, "units_7d": 0,
+                                 "units_30d": 0, "units_90d": 0, "revenue_90d": 0})
+    for fact in facts:
+        entry = stats[fact["product_id"]]
+        if entry["last_sale_time"] is None or fact["sale_time"] > entry["last_sale_time"]:
+            entry["last_sale_time"] = fact["sale_time"]
+        entry["units_sold_total"] += fact["quantity"]
+        for days in WINDOWS:
+            if fact["sale_date"] >= starts[f"since_{days}d"]:
+                entry[f"units_{days}d"] += fact["quantity"]
+        if fact["sale_date"] >= starts["since_90d"]:
+            entry["revenue_90d"] += fact["line_revenue"]
+
+    conn.execute(UPSERT_STATS, [
+        {"product_id": product_id, **entry} for product_id, entry in stats.items()
+    ])
+
+
+def refresh_sales_windows(engine):
+    """
+    Recompute the rolling 7/30/90 day columns from sale_line_fact so sales
+    that aged out of a window are dropped. Meant to run once a day.
+    Returns the number of products with sales in the last 90 days.
+    """
+    starts = _window_starts()
+    with engine.begin() as conn:
+        rows = conn.execute(text(WINDOW_TOTALS), starts).fetchall()
+        conn.execute(text("""
+            UPDATE product_sales_stats
+            SET units_7d = 0, units_30d = 0, units_90d = 0, revenue_90d = 0
+            WHERE units_90d <> 0 OR revenue_90d <> 0
+        """))
+        if rows:
+            conn.execute(text("""
+                UPDATE product_sales_stats
+                SET units_7d = :units_7d, units_30d = :units_30d,
+                    units_90d = :units_90d, revenue_90d = :revenue_90d,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE product_id = :product_id
+            """), [{"product_id": r[0], "units_7d": r[1], "units_30d": r[2],
+                    "units_90d": r[3], "revenue_90d": r[4]} for r in rows])
+        set_watermark(conn, JOB_NAME, 0,
+                      {"as_of": datetime.date.today().isoformat(), "products": len(rows)})
+    return len(rows)
+
+
+def ensure_sales_windows_current(engine):
+    """Run the rolling-window refresh if it has not run yet today."""
+    with engine.connect() as conn:
+        state = get_job_state(conn, JOB_NAME)
+    if state and state.get("as_of") == datetime.date.today().isoformat():
+        return False
+    refresh_sales_windows(engine)
+    return True
+
+
+def rebuild_product_sales_stats(engine):
+    """Recompute every product's stats from sale_line_fact. Returns the number of products."""
+    starts = _window_starts()
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM product_sales_stats"))
+        result = conn.execute(text("""
+            INSERT INTO product_sales_stats (
+                product_id, last_sale_time, units_sold_total,
+                units_7d, units_30d, units_90d, revenue_90d, updated_at)
+            SELECT product_id, MAX(sale_time), SUM(quantity),
+                   SUM(CASE WHEN sale_date >= :since_7d THEN quantity ELSE 0 END),
+                   SUM(CASE WHEN sale_date >= :since_30d THEN quantity ELSE 0 END),
+                   SUM(CASE WHEN sale_date >= :since_90d THEN quantity ELSE 0 END),
+                   SUM(CASE WHEN sale_date >= :since_90d THEN line_revenue ELSE 0 END),
+                   CURRENT_TIMESTAMP
+            FROM sale_line_fact
+            GROUP BY product_id
+        """), starts)
+        set_watermark(conn, JOB_NAME, 0,
+                      {"as_of": datetime.date.today().isoformat(), "products": result.rowcount})
+    return result.rowcount
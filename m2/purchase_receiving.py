@@ -0,0 +1,96 @@
+# purchase_receiving.py
+import datetime
+import pandas as pd
+from sqlalchemy import text, bindparam
+from analytics_backend import fetch_dataframe
+from etl_state import days_ago
+from report_cache import bump_data_version
+
+LEAD_TIME_HISTORY_DAYS = 180
+
+CLAIM_ORDERS = text("""
+    UPDATE purchase_orders
+    SET status = 'RECEIVED', received_at = :received_at
+    WHERE order_id IN :order_ids AND status = 'PENDING'
+    RETURNING order_id
+""").bindparams(bindparam("order_ids", expanding=True))
+
+# All lines of all orders are summed per product and applied in one statement
+APPLY_RECEIPTS = text("""
+    UPDATE products
+    SET stock_quantity = products.stock_quantity + r.quantity
+    FROM (
+        SELECT product_id, SUM(quantity) as quantity
+        FROM purchase_order_items
+        WHERE order_id IN :order_ids
+        GROUP BY product_id
+    ) r
+    WHERE products.product_id = r.product_id
+""").bindparams(bindparam("order_ids", expanding=True))
+
+RECEIPT_SUMMARY = text("""
+    SELECT COUNT(*), COUNT(DISTINCT product_id), COALESCE(SUM(quantity), 0)
+    FROM purchase_order_items
+    WHERE order_id IN :order_ids
+""").bindparams(bindparam("order_ids", expanding=True))
+
+
+def receive_purchase_orders(conn, order_ids, received_at=None):
+    """
+    Mark PENDING purchase orders RECEIVED and add their item quantities to
+    stock. Call inside a transaction: if any order is unknown or was already
+    received/cancelled, ValueError is raised and nothing should be committed.
+    Returns a summary dict.
+    """
+    order_ids = sorted({int(order_id) for order_id in order_ids})
+    if not order_ids:
+        raise ValueError("No purchase orders given")
+    received_at = received_at or datetime.datetime.now().replace(microsecond=0)
+
+    claimed = {row[0] for row in conn.execute(CLAIM_ORDERS, {"order_ids": order_ids,
+                                                             "received_at": received_at})}
+    if len(claimed) != len(order_ids):
+        unavailable = [order_id for order_id in order_ids if order_id not in claimed]
+        raise ValueError(f"Purchase orders not pending: {', '.join(map(str, unavailable))}")
+
+    lines, products, units = conn.execute(RECEIPT_SUMMARY, {"order_ids": order_ids}).fetchone()
+    conn.execute(APPLY_RECEIPTS, {"order_ids": order_ids})
+    bump_data_version(conn)
+    return {"orders": order_ids, "lines": lines, "products": products, "units": int(units),
+            "received_at": received_at.isoformat(sep=" ")}
+
+
+def pending_purchase_orders(conn):
+    """PENDING purchase orders with supplier name, line count and units."""
+    return conn.execute(text("""
+        SELECT po.order_id, po.supplier_id, s.name, po.order_date,
+               COUNT(poi.order_item_id) as lines,
+               COALESCE(SUM(poi.quantity), 0) as units,
+               COALESCE(SUM(poi.quantity * poi.unit_price), 0) as value
+        FROM purchase_orders po
+        JOIN suppliers s ON s.supplier_id = po.supplier_id
+        LEFT JOIN purchase_order_items poi ON poi.order_id = po.order_id
+        WHERE po.status = 'PENDING'
+        GROUP BY po.order_id, po.supplier_id, s.name, po.order_date
+        ORDER BY po.order_date, po.order_id
+    """)).fetchall()
+
+
+def supplier_lead_times(engine=None, history_days=LEAD_TIME_HISTORY_DAYS):
+    """
+    Observed order-to-receipt lead time per supplier over recently received
+    orders: supplier_id, orders_received, avg_lead_days, std_lead_days.
+    """
+    receipts = fetch_dataframe("""
+        SELECT supplier_id, order_date, received_at
+        FROM purchase_orders
+        WHERE status = 'RECEIVED' AND received_at IS NOT NULL AND order_date >= :since
+    """, {"since": days_ago(history_days)}, report="supplier_lead_times", source_engine=engine)
+    if receipts.empty:
+        return pd.DataFrame(columns=["supplier_id", "orders_received", "avg_lead_days", "std_lead_days"])
+    lead = pd.to_datetime(receipts["received_at"]) - pd.to_datetime(receipts["order_date"])
+    receipts["lead_days"] = lead.dt.total_seconds() / 86400
+    return (receipts.groupby("supplier_id")["lead_days"]
+                    .agg(orders_received="count", avg_lead_days="mean", std_lead_days="std")
+                    .round(2)
+                    .reset_index())
@@ -0,0 +1,157 @@
+# replenishment.py
+import os
+import numpy as np
+from sqlalchemy import text
+from tabulate import tabulate
+from db import get_engine
+from auth import has_permission
+from analytics_backend import fetch_dataframe
+from demand_forecast import forecast_products, LEAD_TIME_DAYS, SERVICE_LEVEL_Z
+from purchase_receiving import supplier_lead_times
+
+engine = get_engine()
+
+REVIEW_PERIOD_DAYS = int(os.getenv("REPLENISH_REVIEW_DAYS", "7"))
+ORDER_COST = float(os.getenv("REPLENISH_ORDER_COST", "500"))        # fixed cost of placing one order
+HOLDING_RATE = float(os.getenv("REPLENISH_HOLDING_RATE", "0.25"))   # yearly, share of unit cost
+# Products carry no purchase cost, so the last purchase price is used and
+# the shelf price times this ratio when a product was never ordered
+COST_RATIO = float(os.getenv("REPLENISH_COST_RATIO", "0.7"))
+
+OPEN_ORDERS_QUERY = """
+    SELECT poi.product_id, SUM(poi.quantity) as on_order
+    FROM purchase_order_items poi
+    JOIN purchase_orders po ON po.order_id = poi.order_id
+    WHERE po.status = 'PENDING'
+    GROUP BY poi.product_id
+"""
+
+LAST_COST_QUERY = """
+    SELECT poi.product_id, poi.unit_price as last_cost
+    FROM purchase_order_items poi
+    JOIN (
+        SELECT product_id, MAX(order_item_id) as order_item_id
+        FROM purchase_order_items
+        GROUP BY product_id
+    ) latest ON latest.order_item_id = poi.order_item_id
+"""
+
+
+def plan_replenishment(engine=engine, lead_time=LEAD_TIME_DAYS, review_days=REVIEW_PERIOD_DAYS,
+                       order_cost=ORDER_COST, holding_rate=HOLDING_RATE, z=SERVICE_LEVEL_Z):
+    """
+    Compute reorder point, order-up-to level, EOQ and the quantity to order for
+    every product in one pass over the demand forecast. Stock already on
+    pending purchase orders counts towards the inventory position. Suppliers
+    with received orders use their observed lead time instead of lead_time.
+    """
+    lead_times = supplier_lead_times(engine)
+    longest = max([lead_time] + lead_times["avg_lead_days"].tolist())
+    plan = forecast_products(engine, horizon=int(np.ceil(longest)) + review_days, lead_time=lead_time, z=z)
+    if plan.empty:
+        return plan
+    open_orders = fetch_dataframe(OPEN_ORDERS_QUERY, report="replenishment", source_engine=engine)
+    last_costs = fetch_dataframe(LAST_COST_QUERY, report="replenishment", source_engine=engine)
+    plan = (plan.merge(open_orders, on="product_id", how="left")
+                .merge(last_costs, on="product_id", how="left")
+                .merge(lead_times[["supplier_id", "avg_lead_days"]], on="supplier_id", how="left"))
+
+    daily = plan["avg_daily_forecast"].to_numpy(dtype="float64")
+    sigma = plan["demand_std"].to_numpy(dtype="float64")
+    stock = plan["stock_quantity"].to_numpy(dtype="float64")
+    threshold = plan["low_stock_threshold"].fillna(0).to_numpy(dtype="float64")
+    on_order = plan["on_order"].fillna(0).to_numpy(dtype="float64")
+    unit_cost = plan["last_cost"].fillna(plan["price"] * COST_RATIO).to_numpy(dtype="float64")
+    lead = np.ceil(plan["avg_lead_days"].astype("float64").fillna(lead_time).to_numpy())
+
+    position = stock + on_order
+    reorder_point = np.maximum(np.ceil(daily * lead + z * sigma * np.sqrt(lead)), threshold)
+    protection = lead + review_days
+    order_up_to = np.maximum(np.ceil(daily * protection + z * sigma * np.sqrt(protection)), reorder_point)
+
+    holding_cost = np.maximum(unit_cost * holding_rate, 0.01)
+    eoq = np.ceil(np.sqrt(2 * daily * 365 * order_cost / holding_cost))
+
+    shortfall = np.maximum(order_up_to - position, 0)
+    order_qty = np.where((position <= reorder_point) & (shortfall > 0), np.maximum(shortfall, eoq), 0)
+
+    return plan.assign(
+        lead_time_days=lead.astype(int),
+        on_order=on_order.astype(int),
+        unit_cost=unit_cost.round(2),
+        inventory_position=position.astype(int),
+        reorder_point=reorder_point.astype(int),
+        order_up_to=order_up_to.astype(int),
+        eoq=eoq.astype(int),
+        order_qty=order_qty.astype(int),
+    )
+
+
+def create_draft_purchase_orders(engine, plan):
+    """
+    Insert one PENDING purchase order per supplier with a line for every
+    product in plan with order_qty > 0, all in one transaction.
+    Returns {supplier_id: order_id}.
+    """
+    lines = plan[plan["order_qty"] > 0]
+    if lines.empty:
+        return {}
+    orders = {}
+    with engine.begin() as conn:
+        for supplier_id in sorted(lines["supplier_id"].unique()):
+            orders[int(supplier_id)] = conn.execute(text("""
+                INSERT INTO purchase_orders (supplier_id, status)
+                VALUES (:sid, 'PENDING')
+                RETURNING order_id
+            """), {"sid": int(supplier_id)}).scalar()
+        conn.execute(text("""
+            INSERT INTO purchase_order_items (order_id, product_id, quantity, unit_price)
+            VALUES (:order_id, :product_id, :quantity, :unit_price)
+        """), [{"order_id": orders[int(row.supplier_id)], "product_id": int(row.product_id),
+                "quantity": int(row.order_qty), "unit_price": float(row.unit_cost)}
+               for row in lines.itertuples(index=False)])
+    return orders
+
+
+# ------------------ CLI ------------------
+def auto_replenishment():
+    """Plan replenishment for every product and create draft purchase orders"""
+    if not has_permission(["MANAGER", "ADMIN"]):
+        return
+
+    try:
+        plan = plan_replenishment(engine)
+        to_order = plan[plan["order_qty"] > 0] if not plan.empty else plan
+        if to_order.empty:
+            print("✅ Nothing to reorder - every product is above its reorder point")
+            return
+
+        print("\n🧾 REPLENISHMENT PLAN")
+        print("-" * 100)
+        print(tabulate(to_order[["product_id", "name", "supplier_id", "stock_quantity", "on_order",
+                                 "lead_time_days", "reorder_point", "order_up_to", "eoq",
+                                 "order_qty", "unit_cost"]],
+                       headers="keys", tablefmt="grid", showindex=False))
+
+        by_supplier = (to_order.assign(value=to_order["order_qty"] * to_order["unit_cost"])
+                               .groupby("supplier_id")
+                               .agg(products=("product_id", "count"), units=("order_qty", "sum"),
+                                    value=("value", "sum")))
+        print(f"\n📦 {len(to_order)} products from {len(by_supplier)} supplier(s), "
+              f"estimated cost ₹{by_supplier['value'].sum():,.2f}")
+
+        confirm = input("Create draft purchase orders? (y/n): ").strip().lower()
+        if confirm != "y":
+            print("⚡ No purchase orders created")
+            return
+        orders = create_draft_purchase_orders(engine, to_order)
+        for supplier_id, order_id in orders.items():
+            summary = by_supplier.loc[supplier_id]
+            print(f"✅ PO #{order_id} for supplier {supplier_id}: "
+                  f"{int(summary['products'])} products, {int(summary['units'])} units")
+    except Exception as e:
+        print(f"❌ Replenishment error: {e}")
+
+
+if __name__ == "__main__":
+    print(plan_replenishment(engine))
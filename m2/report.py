@@ -1,51 +1,80 @@
 # report.py
-import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 from tabulate import tabulate
 from db import get_connection_string 
+from analytics_backend import iter_dataframes
+from report_cache import cached_dataframe
+from report_export import export_chunks, EXPORT_FORMATS
+from report_catalog import REPORTS
 import datetime
 
 # ------------------ Setup Engine ------------------
 engine = create_engine(get_connection_string(), echo=False, future=True)
 
-# ------------------ Helper Function ------------------
-def fetch_report(query, report_name, file_name, params=None):
+PREVIEW_ROWS = 50
+
+# ------------------ Helper Functions ------------------
+def preview_query(query, rows=PREVIEW_ROWS):
+    """Wrap a report query so only its first rows are fetched for the terminal."""
+    return f"SELECT * FROM ({query}) report_preview LIMIT {int(rows)}"
+
+def print_preview(df, report_name, rows=PREVIEW_ROWS):
+    """Pretty-print the first rows of a report; returns False when there is no data."""
+    if df.empty:
+        print(f"\n⚠️ No data found for {report_name}!\n")
+        return False
+
+    # Pretty print table
+    print(f"\n📊 {report_name}\n")
+    print(tabulate(df.head(rows), headers="keys", tablefmt="psql", showindex=False))
+    if len(df) > rows:
+        print(f"… showing the first {rows} rows; export the report for the full result")
+    return True
+
+def ask_export_format():
+    """Ask whether to export; returns the chosen format or None."""
+    choice = input("\n💾 Do you want to export this report? (y/n): ").strip().lower()
+    if choice != "y":
+        print("⚡ Skipped exporting.\n")
+        return None
+    answer = input(f"Choose export format [{'/'.join(EXPORT_FORMATS)}]: ").strip().lower()
+    if answer not in EXPORT_FORMATS:
+        print(f"❌ Unsupported export type! Please choose {', '.join(EXPORT_FORMATS)}.")
+        return None
+    return answer
+
+def export_file_name(fmt):
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"report_{fmt}_{timestamp}"
+
+def show_dataframe(df, report_name):
+    """Pretty-print a report DataFrame and offer to export it."""
+    if not print_preview(df, report_name):
+        return
+    fmt = ask_export_format()
+    if fmt:
+        path, rows = export_chunks([df], export_file_name(fmt), fmt)
+        print(f"\n✅ Exported {rows} rows to {path}\n")
+
+def fetch_report(query, report_name, file_name, params=None, backend=None):
     """
-    Fetches data from DB, pretty-prints it, and optionally exports to CSV/Excel/JSON.
+    Fetches the first rows of a report, pretty-prints them, and optionally
+    streams the full result to CSV/JSON-lines/JSON/Parquet/TXT in chunks.
+    backend selects where the query runs ('sql' or 'duckdb'); by default the
+    backend configured for file_name in analytics_backend is used. Previews
+    are served from the report cache until sales or catalog data change.
     """
     try:
-        with engine.connect() as conn:
-            df = pd.read_sql(text(query), conn, params=params)
-
-        if df.empty:
-            print(f"\n⚠️ No data found for {report_name}!\n")
+        df = cached_dataframe(preview_query(query, PREVIEW_ROWS + 1), params, report=file_name,
+                              backend=backend, source_engine=engine)
+        if not print_preview(df, report_name):
             return
-
-        # Pretty print table
-        print(f"\n📊 {report_name}\n")
-        print(tabulate(df, headers="keys", tablefmt="psql", showindex=False))
-
-        # Ask before exporting
-        choice = input("\n💾 Do you want to export this report? (y/n): ").strip().lower()
-        if choice == "y":
-            answer = input("Choose export format [csv/txt/json]: ").strip().lower()
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_name = f"report_{answer}_{timestamp}"
-            if answer=="csv":
-                df.to_csv(f"{file_name}.csv", index=False)
-                print(f"\n✅ Exported to {file_name}.csv\n")
-            elif answer == "txt":
-                with open(f"{file_name}.txt", "w", encoding="utf-8") as f:
-                    f.write(df.to_markdown(index=False))
-                print(f"\n✅ Exported to {file_name}.txt \n")
-            elif answer=="json":
-                df.to_json(f"{file_name}.json", orient="records", indent=2)
-                print(f"\n✅ Exported to {file_name}.json\n")
-            else:
-                print("❌ Unsupported export type! Please choose csv, txt or json.")
-        else:
-            print("⚡ Skipped exporting.\n")
-
+        fmt = ask_export_format()
+        if fmt:
+            chunks = iter_dataframes(query, params, report=file_name, backend=backend,
+                                     source_engine=engine)
+            path, rows = export_chunks(chunks, export_file_name(fmt), fmt)
+            print(f"\n✅ Exported {rows} rows to {path}\n")
     except Exception as e:
         print("❌ Error while fetching report:", e)
 
@@ -56,26 +85,59 @@ def daily_sales_report(start_date=None, end_date=None):
     if start_date and end_date:
         query += " WHERE date BETWEEN :start AND :end"
         params = {"start": start_date, "end": end_date}
+    query += " ORDER BY date DESC"
     fetch_report(query, "Daily Sales Report", "daily_sales_report", params)
 
 def best_selling_products(top_n=10):
-    query = "SELECT * FROM best_selling_products LIMIT :limit"
+    query = "SELECT * FROM best_selling_products ORDER BY units_sold DESC, product_id LIMIT :limit"
     fetch_report(query, f"Top {top_n} Best Selling Products", "best_selling_products", {"limit": top_n})
 
-def low_stock_report(threshold=10):
+def low_stock_report(threshold=None):
+    """Products below their own low-stock threshold, optionally only those under `threshold` units."""
+    if threshold is None:
+        query = "SELECT * FROM low_stock_products ORDER BY stock_quantity ASC, product_id"
+        fetch_report(query, "Low Stock Report", "low_stock_report")
+        return
     query = """
         SELECT * FROM low_stock_products
         WHERE stock_quantity < :threshold
-        ORDER BY stock_quantity ASC
+        ORDER BY stock_quantity ASC, product_id
     """
     fetch_report(query, f"Low Stock (<{threshold}) Report", "low_stock_report", {"threshold": threshold})
 
+def precomputed_reports():
+    """Show the latest precomputed copy of a standard report"""
+    from report_scheduler import list_snapshots, latest_snapshot
+    try:
+        with engine.connect() as conn:
+            snapshots = list_snapshots(conn)
+        if not snapshots:
+            print("\n⚠️ No precomputed reports yet - run report_scheduler.py\n")
+            return
+        print("\n🗂️ PRECOMPUTED REPORTS")
+        for i, snap in enumerate(snapshots, 1):
+            print(f"{i}. {REPORTS[snap[0]]['title'] if snap[0] in REPORTS else snap[0]} "
+                  f"({snap[2]} rows, generated {snap[1]})")
+        choice = input("Choose report: ").strip()
+        if not choice.isdigit() or not 1 <= int(choice) <= len(snapshots):
+            print("❌ Invalid choice")
+            return
+        name = snapshots[int(choice) - 1][0]
+        with engine.connect() as conn:
+            generated_at, df = latest_snapshot(conn, name)
+        show_dataframe(df, f"{REPORTS.get(name, {}).get('title', name)} (as of {generated_at:%Y-%m-%d %H:%M})")
+    except Exception as e:
+        print("❌ Error loading precomputed report:", e)
+
 # ------------------ Enhanced Report Mode ------------------
 def enhanced_report_mode():
     """Extended reporting with new analytics"""
     from analytics import (category_sales_report, supplier_performance, 
                          peak_hours_analysis, customer_analytics, employee_performance,
                          predictive_restocking, seasonal_trends, customer_lifetime_value)
+    from market_basket import bought_together_report
+    from sale_anomalies import sales_anomaly_report
+    from sales_sketches import sketch_dashboard
     
     while True:
         print("\n=== 📊 ENHANCED REPORT MODE ===")
@@ -90,7 +152,11 @@ def enhanced_report_mode():
         print("9. Predictive Restocking")
         print("10. Seasonal Trends")
         print("11. Customer Lifetime Value")
-        print("12. Back to Main Menu")
+        print("12. Precomputed Reports")
+        print("13. Frequently Bought Together")
+        print("14. Unusual Sales")
+        print("15. Sales Snapshot (Approximate)")
+        print("16. Back to Main Menu")
 
         choice = input("Enter choice: ").strip()
 
@@ -105,11 +171,8 @@ def enhanced_report_mode():
                 n = 10
             best_selling_products(n)
         elif choice == "3":
-            try:
-                threshold = int(input("Enter stock threshold (default 10): ").strip() or 10)
-            except ValueError:
-                threshold = 10
-            low_stock_report(threshold)
+            answer = input("Only stock below (units, blank for each product's own threshold): ").strip()
+            low_stock_report(int(answer) if answer.isdigit() else None)
         elif choice == "4":
             category_sales_report()
         elif choice == "5":
@@ -127,6 +190,14 @@ def enhanced_report_mode():
         elif choice == "11":
             customer_lifetime_value()
         elif choice == "12":
+            precomputed_reports()
+        elif choice == "13":
+            bought_together_report()
+        elif choice == "14":
+            sales_anomaly_report()
+        elif choice == "15":
+            sketch_dashboard()
+        elif choice == "16":
             print("👋 Exiting Enhanced Report Mode...")
             break
         else:
@@ -0,0 +1,101 @@
+# report_cache.py
+import os
+import time
+import threading
+from collections import OrderedDict
+from sqlalchemy import text
+import analytics_backend
+from analytics_backend import fetch_dataframe, backend_for
+
+REPORT_CACHE_MB = float(os.getenv("REPORT_CACHE_MB", "64"))
+# Safety net for writers that do not bump a data version (e.g. manual SQL)
+REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", "300"))
+
+BUMP_VERSION = text("""
+    INSERT INTO data_versions (source, version, updated_at)
+    VALUES (:source, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (source) DO UPDATE
+    SET version = data_versions.version + 1, updated_at = CURRENT_TIMESTAMP
+""")
+
+_cache = OrderedDict()   # key -> (versions, created, nbytes, DataFrame), least recently used first
+_cache_bytes = 0
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def bump_data_version(conn, source="catalog"):
+    """
+    Record that rows behind cached reports changed, inside the writer's
+    transaction. New sales need no bump (the cache tracks MAX(sale_id));
+    call it for catalog/stock/price edits ('catalog') and for deleted
+    sales ('sales').
+    """
+    conn.execute(BUMP_VERSION, {"source": source})
+
+
+def data_versions(conn):
+    """Current version vector: the highest sale_id plus every bumped data version."""
+    versions = [("sale_id", conn.execute(text("SELECT COALESCE(MAX(sale_id), 0) FROM sales")).scalar())]
+    versions += conn.execute(text("SELECT source, version FROM data_versions ORDER BY source")).fetchall()
+    return tuple(tuple(row) for row in versions)
+
+
+def _cache_key(query, params, backend):
+    return query, repr(sorted((params or {}).items())), backend
+
+
+def _evict(max_bytes):
+    global _cache_bytes
+    while _cache and _cache_bytes > max_bytes:
+        _, (_, _, nbytes, _) = _cache.popitem(last=False)
+        _cache_bytes -= nbytes
+        _stats["evictions"] += 1
+
+
+def cached_dataframe(query, params=None, report=None, backend=None, source_engine=None,
+                     max_mb=REPORT_CACHE_MB, ttl=REPORT_CACHE_TTL):
+    """
+    fetch_dataframe with an LRU result cache keyed on (query, params, backend).
+    A cached result is reused while the data versions are unchanged and it is
+    younger than ttl seconds. Returned frames are shared; do not modify them.
+    """
+    global _cache_bytes
+    source_engine = source_engine or analytics_backend.engine
+    backend = backend or backend_for(report)
+    key = _cache_key(query, params, backend)
+    with source_engine.connect() as conn:
+        versions = data_versions(conn)
+
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] == versions and time.monotonic() - entry[1] < ttl:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return entry[3]
+        _stats["misses"] += 1
+
+    df = fetch_dataframe(query, params, report=report, backend=backend, source_engine=source_engine)
+    nbytes = int(df.memory_usage(index=True, deep=True).sum())
+    max_bytes = max_mb * 1024 * 1024
+    if nbytes <= max_bytes:
+        with _cache_lock:
+            old = _cache.pop(key, None)
+            if old:
+                _cache_bytes -= old[2]
+            _cache[key] = (versions, time.monotonic(), nbytes, df)
+            _cache_bytes += nbytes
+            _evict(max_bytes)
+    return df
+
+
+def clear_report_cache():
+    global _cache_bytes
+    with _cache_lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+
+def report_cache_stats():
+    with _cache_lock:
+        return {**_stats, "entries": len(_cache), "bytes": _cache_bytes}
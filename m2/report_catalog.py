@@ -0,0 +1,143 @@
+# report_catalog.py
+from analytics_backend import fetch_dataframe, iter_dataframes, EXPORT_CHUNK_ROWS
+from etl_state import days_ago
+from supplier_scorecards import refresh_supplier_scorecards, SCORECARD_COLUMNS
+
+# Standard reports that can be precomputed or run as background jobs.
+# "defaults" lists the accepted parameters (with their types); "bind" turns
+# them into the query's bind parameters; "prepare" runs before the query.
+REPORTS = {
+    "daily_sales": {
+        "title": "Daily Sales",
+        "defaults": {"days": 90},
+        "bind": lambda p: {"since": days_ago(p["days"])},
+        "query": """
+            SELECT bucket as sale_date,
+                   sale_count as transactions,
+                   revenue,
+                   units,
+                   ROUND(revenue / NULLIF(sale_count, 0), 2) as avg_sale
+            FROM sales_rollups
+            WHERE grain = 'day' AND dim_type = 'all' AND dim_id = 0 AND bucket >= :since
+            ORDER BY bucket DESC
+        """,
+    },
+    "best_sellers": {
+        "title": "Best Selling Products",
+        "defaults": {"days": 30, "limit": 20},
+        "bind": lambda p: {"since": days_ago(p["days"]), "limit": p["limit"]},
+        "query": """
+            SELECT p.product_id, p.name,
+                   SUM(f.quantity) as units_sold,
+                   SUM(f.line_revenue) as revenue
+            FROM sale_line_fact f
+            JOIN products p ON p.product_id = f.product_id
+            WHERE f.sale_date >= :since
+            GROUP BY p.product_id, p.name
+            ORDER BY units_sold DESC, revenue DESC
+            LIMIT :limit
+        """,
+    },
+    "low_stock": {
+        "title": "Low Stock Products",
+        "defaults": {},
+        "bind": lambda p: {},
+        "query": """
+            SELECT p.product_id, p.name, c.name as category, s.name as supplier,
+                   p.stock_quantity, p.low_stock_threshold
+            FROM products p
+            LEFT JOIN categories c ON c.category_id = p.category_id
+            LEFT JOIN suppliers s ON s.supplier_id = p.supplier_id
+            WHERE p.is_low_stock
+            ORDER BY p.stock_quantity, p.product_id
+        """,
+    },
+    "category_performance": {
+        "title": "Category Performance",
+        "defaults": {"days": 365},
+        "bind": lambda p: {"since": days_ago(p["days"])},
+        "query": """
+            SELECT c.name as category,
+                   COUNT(*) as items_sold,
+                   SUM(f.quantity) as units,
+                   SUM(f.line_revenue) as revenue
+            FROM sale_line_fact f
+            JOIN categories c ON f.category_id = c.category_id
+            WHERE f.sale_date >= :since
+            GROUP BY c.category_id, c.name
+            ORDER BY revenue DESC
+        """,
+    },
+    "supplier_scorecards": {
+        "title": "Supplier Scorecards",
+        "defaults": {},
+        "bind": lambda p: {},
+        "prepare": refresh_supplier_scorecards,
+        "query": f"""
+            SELECT {SCORECARD_COLUMNS}
+            FROM supplier_scorecards
+            ORDER BY composite_score DESC, total_revenue DESC
+        """,
+    },
+    "sales_lines": {
+        "title": "Sales Lines",
+        "defaults": {"days": 30},
+        "bind": lambda p: {"since": days_ago(p["days"])},
+        "query": """
+            SELECT sale_item_id, sale_id, sale_time, product_id, category_id, supplier_id,
+                   customer_id, employee_id, quantity, unit_price, line_revenue
+            FROM sale_line_fact
+            WHERE sale_date >= :since
+            ORDER BY sale_item_id
+        """,
+    },
+    "customer_lifetime_value": {
+        "title": "Customer Lifetime Value",
+        "defaults": {},
+        "bind": lambda p: {},
+        "query": """
+            SELECT c.customer_id, c.name, c.phone,
+                   COUNT(s.sale_id) as total_visits,
+                   SUM(s.total_amount) as lifetime_value,
+                   ROUND(SUM(s.total_amount) / COUNT(s.sale_id), 2) as avg_visit_value,
+                   MAX(s.sale_time) as last_visit
+            FROM customers c
+            JOIN sales_history s ON c.customer_id = s.customer_id
+            GROUP BY c.customer_id, c.name, c.phone
+            ORDER BY lifetime_value DESC
+        """,
+    },
+}
+
+
+def report_params(name, params=None):
+    """Validate params for a report and fill in defaults. Raises KeyError/ValueError."""
+    spec = REPORTS[name]
+    params = dict(params or {})
+    unknown = set(params) - set(spec["defaults"])
+    if unknown:
+        raise ValueError(f"Unknown parameter(s) for {name}: {', '.join(sorted(unknown))}")
+    resolved = {}
+    for key, default in spec["defaults"].items():
+        value = params.get(key, default)
+        resolved[key] = type(default)(value)
+    return resolved
+
+
+def run_report(engine, name, params=None):
+    """Run a catalog report and return its DataFrame."""
+    spec = REPORTS[name]
+    resolved = report_params(name, params)
+    if "prepare" in spec:
+        spec["prepare"](engine)
+    return fetch_dataframe(spec["query"], spec["bind"](resolved), report=name, source_engine=engine)
+
+
+def iter_report(engine, name, params=None, chunksize=EXPORT_CHUNK_ROWS):
+    """Run a catalog report and yield its result in DataFrame chunks."""
+    spec = REPORTS[name]
+    resolved = report_params(name, params)
+    if "prepare" in spec:
+        spec["prepare"](engine)
+    yield from iter_dataframes(spec["query"], spec["bind"](resolved), report=name,
+                               source_engine=engine, chunksize=chunksize)
@@ -0,0 +1,115 @@
+# report_export.py
+import os
+
+EXPORT_FORMATS = ("csv", "jsonl", "json", "parquet", "txt")
+EXPORT_DIR = os.getenv("EXPORT_DIR", ".")
+# Rows a Parquet export may hold back while some column has only seen nulls
+PARQUET_SCHEMA_ROWS = 200000
+
+
+def _write_csv(chunks, f):
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(f, index=False, header=(i == 0))
+        rows += len(chunk)
+    return rows
+
+
+def _write_jsonl(chunks, f):
+    rows = 0
+    for chunk in chunks:
+        if not chunk.empty:
+            f.write(chunk.to_json(orient="records", lines=True, date_format="iso").rstrip("\n") + "\n")
+        rows += len(chunk)
+    return rows
+
+
+def _write_json(chunks, f):
+    # A JSON array written record by record, so no chunk is held after it is written
+    rows = 0
+    f.write("[")
+    for chunk in chunks:
+        for line in chunk.to_json(orient="records", lines=True, date_format="iso").splitlines():
+            f.write(",\n  " if rows else "\n  ")
+            f.write(line)
+            rows += 1
+    f.write("\n]\n" if rows else "]\n")
+    return rows
+
+
+def _write_txt(chunks, f):
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        table = chunk.to_markdown(index=False)
+        if i == 0:
+            f.write(table + "\n")
+        elif not chunk.empty:
+            # Header and separator only once; later chunks continue the same table
+            f.write(table.split("\n", 2)[2] + "\n")
+        rows += len(chunk)
+    return rows
+
+
+def _null_fields(schema):
+    return [field.name for field in schema if field.type == "null"]
+
+
+def _write_parquet(chunks, path):
+    """
+    A Parquet file has one schema, fixed when the writer opens. Chunks are
+    held back while a column has only been null so far (a null-typed Arrow
+    column could not take later values), up to PARQUET_SCHEMA_ROWS rows;
+    a column still all null by then is written as strings.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+    writer, schema, rows = None, None, 0
+    pending, pending_rows = [], 0
+    try:
+        for chunk in chunks:
+            rows += len(chunk)
+            if writer is not None:
+                for name in string_fallback:
+                    chunk = chunk.assign(**{name: chunk[name].astype("string")})
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+                continue
+            pending.append(pa.Table.from_pandas(chunk, preserve_index=False))
+            pending_rows += len(chunk)
+            schema = pa.unify_schemas([t.schema for t in pending])
+            if _null_fields(schema) and pending_rows < PARQUET_SCHEMA_ROWS:
+                continue
+            string_fallback = _null_fields(schema)
+            for name in string_fallback:
+                schema = schema.set(schema.get_field_index(name), pa.field(name, pa.large_string()))
+            writer = pq.ParquetWriter(path, schema)
+            for table in pending:
+                writer.write_table(table.cast(schema))
+            pending = []
+        if pending:
+            # Every chunk arrived before the schema was settled; all-null columns stay null
+            writer = pq.ParquetWriter(path, schema)
+            for table in pending:
+                writer.write_table(table.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def export_chunks(chunks, file_name, fmt, directory=EXPORT_DIR):
+    """
+    Write an iterable of DataFrames to directory/file_name.<fmt> one chunk
+    at a time, so memory is bounded by the chunk size. Returns (path, rows written).
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export type '{fmt}'; choose {', '.join(EXPORT_FORMATS)}")
+    path = os.path.join(directory, f"{file_name}.{fmt}")
+    if fmt == "parquet":
+        return path, _write_parquet(chunks, path)
+    writers = {"csv": _write_csv, "jsonl": _write_jsonl, "json": _write_json, "txt": _write_txt}
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        rows = writers[fmt](chunks, f)
+    return path, rows
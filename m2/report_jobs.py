@@ -0,0 +1,215 @@
+# report_jobs.py
+import os
+import json
+import time
+import uuid
+import datetime
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from report_catalog import REPORTS, report_params, iter_report
+from report_export import export_chunks
+
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "2"))
+REPORT_JOB_DIR = os.getenv("REPORT_JOB_DIR", "report_jobs")
+# Finished jobs and their files are dropped after this many seconds
+REPORT_JOB_RETENTION = int(os.getenv("REPORT_JOB_RETENTION", "3600"))
+DOWNLOAD_FORMATS = ("parquet", "csv", "json", "jsonl")
+
+_jobs = {}      # job_id -> job dict
+_active = {}    # (report, params) -> job_id of a queued/running job
+_lock = threading.Lock()
+_pool = None
+
+
+def _status_path(job_id, job_dir=REPORT_JOB_DIR):
+    return os.path.join(job_dir, f"{job_id}.status.json")
+
+
+def _write_progress(job_id, job_dir, **progress):
+    path = _status_path(job_id, job_dir)
+    with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(progress, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _execute_job(job_id, report, params, job_dir):
+    """
+    Runs in a worker process: streams the report into job_dir/<job_id>.parquet,
+    reporting rows written to a status file as it goes. Returns the row count.
+    """
+    from db_config import get_engine
+    engine = get_engine()
+    rows = 0
+    _write_progress(job_id, job_dir, stage="running", rows=0)
+
+    def chunks():
+        nonlocal rows
+        for chunk in iter_report(engine, report, params):
+            yield chunk
+            rows += len(chunk)
+            _write_progress(job_id, job_dir, stage="running", rows=rows)
+
+    _, rows = export_chunks(chunks(), job_id, "parquet", directory=job_dir)
+    engine.dispose()
+    return rows
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        os.makedirs(REPORT_JOB_DIR, exist_ok=True)
+        # spawn, not fork: the API process runs an event loop and threads
+        _pool = ProcessPoolExecutor(max_workers=REPORT_JOB_WORKERS,
+                                    mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _discard_pool(pool):
+    """Forget a pool whose worker died so the next job starts a fresh one (call with _lock held)."""
+    global _pool
+    if _pool is pool:
+        _pool = None
+
+
+def _finish(job_id, future, pool):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        _active.pop(job["key"], None)
+        job["finished_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+        try:
+            job["rows"] = future.result()
+            job["status"] = "done"
+        except BrokenProcessPool as e:
+            # A worker was killed (OOM, crash); every job on that pool fails
+            _discard_pool(pool)
+            job["status"] = "failed"
+            job["error"] = f"Report worker exited unexpectedly: {e}"
+        except Exception as e:
+            job["status"] = "failed"
+            job["error"] = str(e)
+        job["finished"] = time.monotonic()
+
+
+def _remove_files(job_id):
+    for fmt in DOWNLOAD_FORMATS:
+        path = os.path.join(REPORT_JOB_DIR, f"{job_id}.{fmt}")
+        if os.path.exists(path):
+            os.remove(path)
+    if os.path.exists(_status_path(job_id)):
+        os.remove(_status_path(job_id))
+
+
+def purge_expired_jobs(retention=REPORT_JOB_RETENTION):
+    """Forget finished jobs older than retention seconds and delete their files."""
+    now = time.monotonic()
+    with _lock:
+        expired = [job_id for job_id, job in _jobs.items()
+                   if job.get("finished") and now - job["finished"] > retention]
+        for job_id in expired:
+            del _jobs[job_id]
+    for job_id in expired:
+        _remove_files(job_id)
+    return len(expired)
+
+
+def submit_report_job(report, params=None):
+    """
+    Queue a catalog report on the worker pool. An identical request (same
+    report and resolved params) that is still queued or running is joined
+    instead of starting a second job. Returns (job, deduplicated).
+    Raises KeyError for an unknown report and ValueError for bad params.
+    """
+    if report not in REPORTS:
+        raise KeyError(report)
+    resolved = report_params(report, params)
+    key = (report, json.dumps(resolved, sort_keys=True))
+    purge_expired_jobs()
+    with _lock:
+        if key in _active:
+            return job_status(_active[key], locked=True), True
+        job_id = uuid.uuid4().hex
+        _jobs[job_id] = {
+            "job_id": job_id, "report": report, "params": resolved, "key": key,
+            "status": "queued", "rows": 0, "error": None,
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "finished_at": None, "finished": None,
+        }
+        _active[key] = job_id
+        try:
+            try:
+                pool = _get_pool()
+                future = pool.submit(_execute_job, job_id, report, resolved, REPORT_JOB_DIR)
+            except BrokenProcessPool:
+                _discard_pool(pool)
+                pool = _get_pool()
+                future = pool.submit(_execute_job, job_id, report, resolved, REPORT_JOB_DIR)
+        except Exception:
+            del _jobs[job_id], _active[key]
+            raise
+        # Status is set to running by the worker's status file, not here
+        job = job_status(job_id, locked=True)
+    future.add_done_callback(lambda f: _finish(job_id, f, pool))
+    return job, False
+
+
+def job_status(job_id, locked=False):
+    """Public view of a job (status, rows so far, timestamps), or None if unknown."""
+    if not locked:
+        with _lock:
+            return job_status(job_id, locked=True)
+    job = _jobs.get(job_id)
+    if job is None:
+        return None
+    view = {k: v for k, v in job.items() if k not in ("key", "finished")}
+    if job["status"] == "queued" and os.path.exists(_status_path(job_id)):
+        try:
+            with open(_status_path(job_id), "r", encoding="utf-8") as f:
+                progress = json.load(f)
+            view["status"], view["rows"] = progress["stage"], progress["rows"]
+        except (OSError, ValueError):
+            pass
+    return view
+
+
+def list_jobs():
+    with _lock:
+        return [job_status(job_id, locked=True) for job_id in _jobs]
+
+
+def job_result_path(job_id, fmt="parquet"):
+    """
+    Path of a finished job's result in fmt, converting from the stored
+    Parquet file in chunks on first request. Raises KeyError for an unknown
+    job and ValueError if the job is not done or fmt is unsupported.
+    """
+    if fmt not in DOWNLOAD_FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}'; choose {', '.join(DOWNLOAD_FORMATS)}")
+    job = job_status(job_id)
+    if job is None:
+        raise KeyError(job_id)
+    if job["status"] != "done":
+        raise ValueError(f"Job is {job['status']}")
+    path = os.path.join(REPORT_JOB_DIR, f"{job_id}.{fmt}")
+    if not os.path.exists(path):
+        import pyarrow.parquet as pq
+        source = pq.ParquetFile(os.path.join(REPORT_JOB_DIR, f"{job_id}.parquet"))
+        if source.metadata.num_rows:
+            chunks = (batch.to_pandas() for batch in source.iter_batches())
+        else:
+            # Keep the header/columns of an empty result
+            chunks = [source.schema_arrow.empty_table().to_pandas()]
+        tmp_name = f"{job_id}.{uuid.uuid4().hex[:8]}"
+        tmp_path, _ = export_chunks(chunks, tmp_name, fmt, directory=REPORT_JOB_DIR)
+        os.replace(tmp_path, path)
+    return path
+
+
+def shutdown_jobs():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,259 @@
+# report_scheduler.py
+import os
+import io
+import json
+import time
+import datetime
+import decimal
+import argparse
+import pandas as pd
+from sqlalchemy import text
+from db import get_engine
+from etl_state import get_job_state, set_watermark, as_datetime
+from report_catalog import REPORTS, report_params, run_report
+from product_sales_stats import refresh_sales_windows
+from notification_inbox import compact_notifications
+from market_basket import refresh_associations
+from customer_segments import refresh_customer_segments
+from sale_anomalies import rebuild_anomaly_baselines
+from report_views import refresh_report_views
+from sales_partitions import rollover_sales
+from sales_sketches import refresh_sketches
+
+engine = get_engine()
+
+# Cron expressions (minute hour day-of-month month day-of-week), off-peak by
+# default. REPORT_SCHEDULE_FILE may point to a JSON file overriding entries;
+# a null value disables a job.
+DEFAULT_SCHEDULE = {
+    "sales_windows": "5 0 * * *",
+    "daily_sales": "15 2 * * *",
+    "best_sellers": "20 2 * * *",
+    "category_performance": "25 2 * * *",
+    "supplier_scorecards": "30 2 * * *",
+    "customer_lifetime_value": "40 2 * * *",
+    "market_basket": "50 2 * * *",
+    "customer_segments": "55 2 * * *",
+    "anomaly_baselines": "10 3 * * *",
+    "notification_compaction": "0 3 * * *",
+    "low_stock": "0 6,22 * * *",
+    "report_views": "*/15 * * * *",
+    "sales_rollover": "30 3 1 * *",
+    "sales_sketches": "*/5 * * * *",
+}
+REPORT_SCHEDULE_FILE = os.getenv("REPORT_SCHEDULE_FILE", "")
+# How far back a job that has never run looks for a missed fire time; jobs
+# that have run catch up on any fire time since their last run
+CATCH_UP_DAYS = 8
+
+MAINTENANCE_JOBS = {
+    "sales_windows": refresh_sales_windows,
+    "notification_compaction": compact_notifications,
+    "market_basket": refresh_associations,
+    "customer_segments": refresh_customer_segments,
+    "anomaly_baselines": rebuild_anomaly_baselines,
+    "report_views": refresh_report_views,
+    "sales_rollover": rollover_sales,
+    "sales_sketches": refresh_sketches,
+}
+
+STORE_SNAPSHOT = text("""
+    INSERT INTO report_snapshots (report_name, generated_at, row_count, duration_ms, params, payload)
+    VALUES (:name, :generated_at, :row_count, :duration_ms, :params, :payload)
+    ON CONFLICT (report_name) DO UPDATE
+    SET generated_at = excluded.generated_at, row_count = excluded.row_count,
+        duration_ms = excluded.duration_ms, params = excluded.params, payload = excluded.payload
+""")
+
+CRON_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+# ------------------ Cron ------------------
+def parse_cron(expr):
+    """Parse a 5-field cron expression into a list of allowed-value sets (plus restricted flags)."""
+    fields = expr.split()
+    if len(fields) != 5:
+        raise ValueError(f"Cron expression needs 5 fields: '{expr}'")
+    parsed = []
+    for field, (low, high) in zip(fields, CRON_RANGES):
+        values = set()
+        for part in field.split(","):
+            base, _, step = part.partition("/")
+            if base == "*":
+                start, end = low, high
+            elif "-" in base:
+                start, end = map(int, base.split("-"))
+            else:
+                start = end = int(base)
+            if start < low or end > high or start > end:
+                raise ValueError(f"Cron field '{field}' out of range in '{expr}'")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        parsed.append((values, field != "*"))
+    dow, restricted = parsed[4]
+    if 7 in dow:
+        parsed[4] = (dow | {0}, restricted)
+    return parsed
+
+
+def _day_matches(schedule, moment):
+    _, _, (days, dom_set), _, (weekdays, dow_set) = schedule
+    dom_ok = moment.day in days
+    dow_ok = (moment.weekday() + 1) % 7 in weekdays
+    # Standard cron: when both day fields are restricted either may match
+    if dom_set and dow_set:
+        return dom_ok or dow_ok
+    return dom_ok and dow_ok
+
+
+def cron_matches(schedule, moment):
+    (minutes, _), (hours, _), _, (months, _), _ = schedule
+    if moment.minute not in minutes or moment.hour not in hours or moment.month not in months:
+        return False
+    return _day_matches(schedule, moment)
+
+
+def next_fire(schedule, after, until):
+    """
+    First minute after `after` and <= until matching the schedule, or None.
+    Non-matching months, days and hours are skipped whole, so a long gap
+    (e.g. a monthly job after weeks of downtime) is cheap to search.
+    """
+    (minutes, _), (hours, _), _, (months, _), _ = schedule
+    moment = after.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+    while moment <= until:
+        if moment.month not in months:
+            moment = (moment.replace(day=28) + datetime.timedelta(days=4)).replace(day=1, hour=0, minute=0)
+        elif not _day_matches(schedule, moment):
+            moment = moment.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+        elif moment.hour not in hours:
+            moment = moment.replace(minute=0) + datetime.timedelta(hours=1)
+        elif moment.minute not in minutes:
+            moment += datetime.timedelta(minutes=1)
+        else:
+            return moment
+    return None
+
+
+def load_schedule(path=REPORT_SCHEDULE_FILE):
+    schedule = dict(DEFAULT_SCHEDULE)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            schedule.update(json.load(f))
+    unknown = set(schedule) - set(REPORTS) - set(MAINTENANCE_JOBS)
+    if unknown:
+        raise ValueError(f"Unknown scheduled job(s): {', '.join(sorted(unknown))}")
+    return {name: parse_cron(expr) for name, expr in schedule.items() if expr}
+
+
+# ------------------ Snapshots ------------------
+def _jsonable(df):
+    # NUMERIC/DECIMAL columns come back as Decimal objects on some drivers
+    return df.assign(**{column: df[column].map(lambda v: float(v) if isinstance(v, decimal.Decimal) else v)
+                        for column in df.columns if df[column].dtype == object})
+
+
+def store_snapshot(conn, name, df, duration_ms, params=None, generated_at=None):
+    conn.execute(STORE_SNAPSHOT, {
+        "name": name,
+        "generated_at": generated_at or datetime.datetime.now().replace(microsecond=0),
+        "row_count": len(df),
+        "duration_ms": int(duration_ms),
+        "params": json.dumps(params or {}),
+        "payload": _jsonable(df).to_json(orient="split", index=False, date_format="iso"),
+    })
+
+
+def latest_snapshot(conn, name):
+    """(generated_at, DataFrame) of the latest precomputed copy of a report, or None."""
+    row = conn.execute(text("""
+        SELECT generated_at, payload FROM report_snapshots WHERE report_name = :name
+    """), {"name": name}).fetchone()
+    if row is None:
+        return None
+    return as_datetime(row[0]), pd.read_json(io.StringIO(row[1]), orient="split")
+
+
+def list_snapshots(conn):
+    return conn.execute(text("""
+        SELECT report_name, generated_at, row_count, duration_ms
+        FROM report_snapshots
+        ORDER BY report_name
+    """)).fetchall()
+
+
+# ------------------ Jobs ------------------
+def run_job(engine, name):
+    """Run one scheduled job now and record it. Returns a short result message."""
+    started = time.monotonic()
+    if name in MAINTENANCE_JOBS:
+        result = MAINTENANCE_JOBS[name](engine)
+        message = f"{result} rows"
+    else:
+        params = report_params(name)
+        df = run_report(engine, name, params)
+        with engine.begin() as conn:
+            store_snapshot(conn, name, df, (time.monotonic() - started) * 1000, params)
+        message = f"{len(df)} rows precomputed"
+    with engine.begin() as conn:
+        set_watermark(conn, f"schedule:{name}", 0, {
+            "last_run": datetime.datetime.now().isoformat(timespec="seconds"),
+            "duration_s": round(time.monotonic() - started, 2),
+        })
+    return message
+
+
+def due_jobs(engine, schedule, now=None):
+    """Jobs whose latest fire time has passed since they last ran."""
+    now = now or datetime.datetime.now()
+    due = []
+    with engine.connect() as conn:
+        for name, cron in schedule.items():
+            state = get_job_state(conn, f"schedule:{name}")
+            last_run = as_datetime(state["last_run"]) if state else None
+            since = last_run or now - datetime.timedelta(days=CATCH_UP_DAYS)
+            if next_fire(cron, since, now) is not None:
+                due.append(name)
+    return due
+
+
+def run_due_jobs(engine, schedule=None, now=None):
+    """Run every due job once, in schedule order. Returns [(name, ok, message)]."""
+    schedule = schedule or load_schedule()
+    results = []
+    for name in due_jobs(engine, schedule, now):
+        try:
+            results.append((name, True, run_job(engine, name)))
+        except Exception as e:
+            results.append((name, False, str(e)))
+    return results
+
+
+def run_daemon(engine, poll_seconds=30):
+    """Run due jobs forever, checking every poll_seconds."""
+    schedule = load_schedule()
+    print(f"🕑 Report scheduler started with {len(schedule)} jobs")
+    while True:
+        for name, ok, message in run_due_jobs(engine, schedule):
+            stamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
+            print(f"{'✅' if ok else '❌'} [{stamp}] {name}: {message}")
+        time.sleep(poll_seconds)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute standard reports and run maintenance jobs")
+    parser.add_argument("--daemon", action="store_true", help="keep running and fire jobs on schedule")
+    parser.add_argument("--run", metavar="JOB", action="append", help="run a job now (repeatable)")
+    parser.add_argument("--api-db", action="store_true",
+                        help="run against the API database (db_config, SQLite by default) instead of db.py")
+    args = parser.parse_args()
+    if args.api_db:
+        import db_config
+        engine = db_config.get_engine()
+    if args.daemon:
+        run_daemon(engine)
+    elif args.run:
+        for job in args.run:
+            print(f"✅ {job}: {run_job(engine, job)}")
+    else:
+        for name, ok, message in run_due_jobs(engine):
+            print(f"{'✅' if ok else '❌'} {name}: {message}")
@@ -0,0 +1,69 @@
+# report_views.py
+from sqlalchemy import text
+from db import get_engine
+from report_cache import bump_data_version
+
+engine = get_engine()
+
+# Precomputed sources behind report.py's daily sales, best sellers and low
+# stock reports. On Postgres they are materialized views (schema[1].sql); on
+# SQLite they are summary tables (init_db.py) that refresh rewrites. Each
+# reads an already-aggregated table, so a refresh is cheap enough to run
+# every few minutes from the report scheduler.
+REPORT_VIEWS = {
+    "daily_sales_report": """
+        SELECT bucket as date,
+               sale_count as transactions,
+               revenue as total_revenue,
+               units as units_sold,
+               ROUND(revenue / NULLIF(sale_count, 0), 2) as avg_sale
+        FROM sales_rollups
+        WHERE grain = 'day' AND dim_type = 'all' AND dim_id = 0
+    """,
+    "best_selling_products": """
+        SELECT p.product_id, p.name, c.name as category,
+               s.units_sold_total as units_sold,
+               s.units_30d,
+               s.revenue_90d,
+               s.last_sale_time
+        FROM product_sales_stats s
+        JOIN products p ON p.product_id = s.product_id
+        LEFT JOIN categories c ON c.category_id = p.category_id
+        WHERE s.units_sold_total > 0
+    """,
+    "low_stock_products": """
+        SELECT p.product_id, p.name, c.name as category, sp.name as supplier,
+               p.stock_quantity, p.low_stock_threshold,
+               p.low_stock_threshold - p.stock_quantity as shortfall
+        FROM products p
+        LEFT JOIN categories c ON c.category_id = p.category_id
+        LEFT JOIN suppliers sp ON sp.supplier_id = p.supplier_id
+        WHERE p.is_low_stock
+    """,
+}
+
+
+def refresh_report_views(engine, names=None):
+    """
+    Recompute the report views (all, or just names). Postgres refreshes the
+    materialized views concurrently so reports keep reading the old rows
+    meanwhile; SQLite rewrites the summary tables in one transaction.
+    Returns the total number of rows now in the refreshed views.
+    """
+    names = names or list(REPORT_VIEWS)
+    rows = 0
+    with engine.begin() as conn:
+        for name in names:
+            if conn.dialect.name == "postgresql":
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {name}"))
+            else:
+                conn.execute(text(f"DELETE FROM {name}"))
+                conn.execute(text(f"INSERT INTO {name} {REPORT_VIEWS[name]}"))
+            rows += conn.execute(text(f"SELECT COUNT(*) FROM {name}")).scalar()
+        # Cached report previews are keyed on data versions, not on the views
+        bump_data_version(conn, "report_views")
+    return rows
+
+
+if __name__ == "__main__":
+    print(f"✅ Report views refreshed ({refresh_report_views(engine)} rows)")
@@ -0,0 +1,279 @@
+# sale_anomalies.py
+import os
+import math
+import numpy as np
+import pandas as pd
+from sqlalchemy import text, bindparam
+from tabulate import tabulate
+from db import get_engine
+from auth import has_permission
+from etl_state import days_ago
+
+engine = get_engine()
+
+EWMA_ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.05"))     # weight of the newest observation
+Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "4.0"))
+MIN_OBSERVATIONS = int(os.getenv("ANOMALY_MIN_OBSERVATIONS", "20"))   # warm-up before flagging
+# Spread never counts as smaller than this share of the mean, so a product
+# always sold at one price still flags a deep discount instead of any change
+MIN_RELATIVE_SD = 0.04
+NOTIFICATION_TYPE = "anomaly"
+
+# (entity_type, metric, side): "high" flags only unusually large values,
+# "both" also flags unusually small ones (e.g. a discounted unit price)
+METRICS = [
+    ("employee", "basket_total", "high"),
+    ("employee", "basket_units", "high"),
+    ("product", "quantity", "high"),
+    ("product", "unit_price", "both"),
+]
+METRIC_LABELS = {
+    "basket_total": "sale total",
+    "basket_units": "units in sale",
+    "quantity": "quantity on one line",
+    "unit_price": "unit price",
+}
+
+UPSERT_STATS = text("""
+    INSERT INTO anomaly_stats (entity_type, entity_id, metric, observations, mean, variance, updated_at)
+    VALUES (:entity_type, :entity_id, :metric, :observations, :mean, :variance, CURRENT_TIMESTAMP)
+    ON CONFLICT (entity_type, entity_id, metric) DO UPDATE
+    SET observations = excluded.observations, mean = excluded.mean,
+        variance = excluded.variance, updated_at = CURRENT_TIMESTAMP
+""")
+
+INSERT_NOTIFICATION = text("""
+    INSERT INTO notifications (product_id, message, notification_type)
+    VALUES (:product_id, :message, :type)
+""")
+
+
+def _spread(mean, variance):
+    return max(math.sqrt(max(variance, 0.0)), MIN_RELATIVE_SD * abs(mean), 1e-9)
+
+
+def _is_outlier(z, side):
+    return z > Z_THRESHOLD if side == "high" else abs(z) > Z_THRESHOLD
+
+
+def observe(state, value, alpha=EWMA_ALPHA):
+    """
+    Score value against a running (observations, mean, variance) state and
+    fold it in with an exponentially weighted update. Returns (z, new_state);
+    z is None during warm-up.
+    """
+    observations, mean, variance = state or (0, 0.0, 0.0)
+    if observations == 0:
+        return None, (1, value, 0.0)
+    diff = value - mean
+    z = diff / _spread(mean, variance) if observations >= MIN_OBSERVATIONS else None
+    increment = alpha * diff
+    return z, (observations + 1, mean + increment, (1 - alpha) * (variance + diff * increment))
+
+
+def _sale_observations(facts):
+    """Per-metric observations (entity_type, entity_id, metric, value, sale_id, product_id) for new sale lines."""
+    observations = []
+    baskets = {}
+    for fact in facts:
+        observations.append(("product", fact["product_id"], "quantity", float(fact["quantity"]),
+                             fact["sale_id"], fact["product_id"]))
+        observations.append(("product", fact["product_id"], "unit_price", float(fact["unit_price"]),
+                             fact["sale_id"], fact["product_id"]))
+        if fact["employee_id"] is not None:
+            basket = baskets.setdefault(fact["sale_id"], {"employee_id": fact["employee_id"],
+                                                          "total": 0.0, "units": 0})
+            basket["total"] += float(fact["line_revenue"])
+            basket["units"] += fact["quantity"]
+    for sale_id, basket in baskets.items():
+        observations.append(("employee", basket["employee_id"], "basket_total", basket["total"], sale_id, None))
+        observations.append(("employee", basket["employee_id"], "basket_units", float(basket["units"]), sale_id, None))
+    return observations
+
+
+def _load_states(conn, keys):
+    states = {}
+    for entity_type in {key[0] for key in keys}:
+        ids = sorted({key[1] for key in keys if key[0] == entity_type})
+        rows = conn.execute(text("""
+            SELECT entity_id, metric, observations, mean, variance
+            FROM anomaly_stats
+            WHERE entity_type = :entity_type AND entity_id IN :ids
+        """).bindparams(bindparam("ids", expanding=True)), {"entity_type": entity_type, "ids": ids})
+        for entity_id, metric, observations, mean, variance in rows:
+            states[(entity_type, entity_id, metric)] = (observations, mean, variance)
+    return states
+
+
+def anomaly_message(sale_id, entity_type, entity_id, metric, value, expected, z):
+    direction = "above" if z > 0 else "below"
+    who = f"employee {entity_id}" if entity_type == "employee" else f"product {entity_id}"
+    return (f"Sale #{sale_id}: {METRIC_LABELS[metric]} {value:,.2f} for {who} is "
+            f"{abs(z):.1f}σ {direction} the usual {expected:,.2f}")
+
+
+def detect_sale_anomalies(conn, facts):
+    """
+    Update the running statistics with freshly written sale lines and raise
+    a notification for every outlier. Runs in the checkout transaction.
+    Returns the number of anomalies flagged.
+    """
+    if not facts:
+        return 0
+    observations = _sale_observations(facts)
+    states = _load_states(conn, [(o[0], o[1]) for o in observations])
+    sides = {(entity_type, metric): side for entity_type, metric, side in METRICS}
+    flagged = []
+    for entity_type, entity_id, metric, value, sale_id, product_id in observations:
+        key = (entity_type, entity_id, metric)
+        previous = states.get(key)
+        z, states[key] = observe(previous, value)
+        if z is not None and _is_outlier(z, sides[(entity_type, metric)]):
+            flagged.append({"product_id": product_id, "type": NOTIFICATION_TYPE,
+                            "message": anomaly_message(sale_id, entity_type, entity_id, metric,
+                                                       value, previous[1], z)})
+    conn.execute(UPSERT_STATS, [
+        {"entity_type": key[0], "entity_id": key[1], "metric": key[2],
+         "observations": state[0], "mean": state[1], "variance": state[2]}
+        for key, state in states.items()
+    ])
+    if flagged:
+        conn.execute(INSERT_NOTIFICATION, flagged)
+    return len(flagged)
+
+
+# ------------------ Batch mode ------------------
+def _history_series(lines):
+    """Long-format (entity_type, entity_id, metric, value, sale_id, sale_time, product_id) in sale order."""
+    products = pd.concat([
+        lines.assign(entity_type="product", entity_id=lines["product_id"], metric=metric,
+                     value=lines[column].astype("float64"))
+        for metric, column in (("quantity", "quantity"), ("unit_price", "unit_price"))
+    ])
+    with_employee = lines[lines["employee_id"].notna()]
+    baskets = with_employee.groupby("sale_id", sort=False).agg(
+        sale_time=("sale_time", "first"), employee_id=("employee_id", "first"),
+        basket_total=("line_revenue", "sum"), basket_units=("quantity", "sum"),
+    ).reset_index()
+    employees = pd.concat([
+        baskets.assign(entity_type="employee", entity_id=baskets["employee_id"], metric=metric,
+                       value=baskets[metric].astype("float64"), product_id=np.nan)
+        for metric in ("basket_total", "basket_units")
+    ])
+    columns = ["entity_type", "entity_id", "metric", "value", "sale_id", "sale_time", "product_id"]
+    series = pd.concat([products[columns], employees[columns]], ignore_index=True)
+    series["entity_id"] = series["entity_id"].astype("int64")
+    return series.sort_values(["entity_type", "entity_id", "metric", "sale_id"], kind="stable",
+                              ignore_index=True)
+
+
+def score_history(lines, alpha=EWMA_ALPHA):
+    """
+    Vectorized equivalent of feeding every sale line through observe():
+    per-key EWMA mean/variance via pandas, each value scored against the
+    statistics before it. Returns (anomalies, final_states) DataFrames.
+    """
+    series = _history_series(lines)
+    keys = ["entity_type", "entity_id", "metric"]
+    ewm = series.groupby(keys, sort=False)["value"].ewm(alpha=alpha, adjust=False)
+    series["mean"] = ewm.mean().to_numpy()
+    series["variance"] = ewm.var(bias=True).fillna(0.0).to_numpy()
+    grouped = series.groupby(keys, sort=False)
+    expected = grouped["mean"].shift()
+    prior_variance = grouped["variance"].shift()
+    observations = grouped.cumcount()
+    spread = np.maximum.reduce([np.sqrt(prior_variance.clip(lower=0).to_numpy()),
+                                MIN_RELATIVE_SD * expected.abs().to_numpy(),
+                                np.full(len(series), 1e-9)])
+    z = (series["value"] - expected).to_numpy() / spread
+    sides = series["metric"].map({metric: side for _, metric, side in METRICS}).to_numpy()
+    outlier = np.where(sides == "high", z > Z_THRESHOLD, np.abs(z) > Z_THRESHOLD)
+    outlier &= observations.to_numpy() >= MIN_OBSERVATIONS
+    anomalies = series.loc[outlier, ["sale_id", "sale_time", "entity_type", "entity_id", "metric",
+                                     "value", "product_id"]].assign(expected=expected[outlier].round(2),
+                                                                    z=z[outlier].round(2))
+    states = grouped.agg(observations=("value", "size"), mean=("mean", "last"),
+                         variance=("variance", "last")).reset_index()
+    return anomalies.sort_values("sale_id", ignore_index=True), states
+
+
+ANOMALY_COLUMNS = ["sale_id", "sale_time", "entity_type", "entity_id", "metric",
+                   "value", "product_id", "expected", "z"]
+
+
+def _load_lines(engine):
+    with engine.connect() as conn:
+        return pd.read_sql(text("""
+            SELECT sale_id, sale_time, employee_id, product_id, quantity, unit_price, line_revenue
+            FROM sale_line_fact
+            ORDER BY sale_id, sale_item_id
+        """), conn)
+
+
+def find_anomalies(engine):
+    """Score all of sale_line_fact without touching anomaly_stats. Returns the anomalies found."""
+    lines = _load_lines(engine)
+    if lines.empty:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    return score_history(lines)[0]
+
+
+def backfill_anomaly_stats(engine, notify_since=None):
+    """
+    Rebuild the running statistics from all of sale_line_fact in one
+    vectorized pass. Anomalies in sales on or after notify_since (ISO date)
+    are also written as notifications. Returns the anomalies found.
+    """
+    lines = _load_lines(engine)
+    if lines.empty:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    anomalies, states = score_history(lines)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM anomaly_stats"))
+        conn.execute(UPSERT_STATS, [
+            {"entity_type": r.entity_type, "entity_id": int(r.entity_id), "metric": r.metric,
+             "observations": int(r.observations), "mean": float(r.mean), "variance": float(r.variance)}
+            for r in states.itertuples(index=False)
+        ])
+        if notify_since is not None:
+            recent = anomalies[pd.to_datetime(anomalies["sale_time"]) >= pd.Timestamp(notify_since)]
+            if len(recent):
+                conn.execute(INSERT_NOTIFICATION, [
+                    {"product_id": None if pd.isna(r.product_id) else int(r.product_id),
+                     "type": NOTIFICATION_TYPE,
+                     "message": anomaly_message(r.sale_id, r.entity_type, r.entity_id, r.metric,
+                                                r.value, r.expected, r.z)}
+                    for r in recent.itertuples(index=False)
+                ])
+    return anomalies
+
+
+def rebuild_anomaly_baselines(engine):
+    """Scheduler entry point: rebuild the statistics. Returns the number of baselines."""
+    backfill_anomaly_stats(engine)
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT COUNT(*) FROM anomaly_stats")).scalar()
+
+
+# ------------------ CLI ------------------
+def sales_anomaly_report():
+    """List recent outliers, scored from history (baselines are rebuilt by the scheduler)"""
+    if not has_permission(["MANAGER", "ADMIN"]):
+        return
+
+    try:
+        days = int(input("Show anomalies from the last N days (default 30): ").strip() or 30)
+        anomalies = find_anomalies(engine)
+        recent = anomalies[pd.to_datetime(anomalies["sale_time"]) >= pd.Timestamp(days_ago(days))]
+        if recent.empty:
+            print(f"✅ No unusual sales in the last {days} days")
+            return
+        print(f"\n🚨 UNUSUAL SALES (last {days} days, |z| > {Z_THRESHOLD})")
+        rows = [(r.sale_id, str(r.sale_time)[:16], r.entity_type, r.entity_id, METRIC_LABELS[r.metric],
+                 r.value, r.expected, r.z) for r in recent.tail(50).itertuples(index=False)]
+        print(tabulate(rows, headers=["Sale", "Time", "Who", "ID", "Metric", "Value", "Usual", "z"],
+                       tablefmt="grid", floatfmt=".2f"))
+        if len(recent) > 50:
+            print(f"... {len(recent) - 50} earlier anomalies not shown")
+    except Exception as e:
+        print(f"❌ Anomaly detection error: {e}")
@@ -0,0 +1,31 @@
+# sale_events.py
+from sale_line_fact import append_sale_lines, refresh_sale_line_fact
+from sales_rollups import apply_facts_to_rollups
+from product_sales_stats import apply_facts_to_product_stats
+from sale_anomalies import detect_sale_anomalies
+from sales_sketches import refresh_sketches
+
+
+def after_sale(conn, sale_id):
+    """
+    Keep derived tables in step with a sale that was just written.
+    Runs inside the checkout transaction so they commit or roll back together.
+    """
+    facts = append_sale_lines(conn, sale_id)
+    on_new_facts(conn, facts)
+    # Live sales only: history loaded by catch_up is scored by backfill_anomaly_stats
+    detect_sale_anomalies(conn, facts)
+
+
+def on_new_facts(conn, facts):
+    """Update every table that is derived from new sale_line_fact rows."""
+    apply_facts_to_rollups(conn, facts)
+    apply_facts_to_product_stats(conn, facts)
+
+
+def catch_up(engine):
+    """Load sales that bypassed the checkout hook into the fact and derived tables."""
+    added = refresh_sale_line_fact(engine, on_new_facts=on_new_facts)
+    # Daily sketches are folded in batches here and by the scheduler, never at checkout
+    refresh_sketches(engine)
+    return added
@@ -3,6 +3,8 @@ from sqlalchemy import text
 from tabulate import tabulate
 from db import get_engine
 from auth import has_permission, get_current_user, get_current_name
+from sale_events import after_sale
+from stock_alerts import decrement_for_sale
 
 engine = get_engine()
 
@@ -122,6 +124,9 @@ def process_sale():
                     "price": item['price']
                 })
 
+            decrement_for_sale(conn, [(item['product_id'], item['quantity']) for item in cart])
+            after_sale(conn, sale_id)
+
         print("🎉 Sale completed successfully!")
         print(f"🧾 Sale ID: {sale_id} | Total: ₹{total:.2f} | Cashier: {current_name}")
 
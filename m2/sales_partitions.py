@@ -0,0 +1,164 @@
+# sales_partitions.py
+import os
+import sqlite3
+import datetime
+from sqlalchemy import text
+from db import get_engine
+from db_config import SALES_COLUMNS, SALE_ITEM_COLUMNS, sales_archive_path
+from etl_state import get_watermark, set_watermark, months_ago, as_datetime
+from report_cache import bump_data_version
+
+engine = get_engine()
+
+JOB_NAME = "sales_rollover"
+# Months kept in the hot sales/sale_items tables besides the current one;
+# everything older is moved to the archive once it has reached sale_line_fact
+HOT_MONTHS = int(os.getenv("SALES_HOT_MONTHS", "4"))
+
+SQLITE_ARCHIVE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS sales (
+        sale_id INTEGER PRIMARY KEY,
+        sale_time TIMESTAMP NOT NULL,
+        total_amount DECIMAL(10,2) NOT NULL,
+        payment_method VARCHAR(50) NOT NULL,
+        customer_id INTEGER,
+        employee_id INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sales_time ON sales(sale_time)",
+    "CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales(customer_id)",
+    """
+    CREATE TABLE IF NOT EXISTS sale_items (
+        sale_item_id INTEGER PRIMARY KEY,
+        sale_id INTEGER NOT NULL,
+        sale_time TIMESTAMP NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL,
+        unit_price DECIMAL(10,2) NOT NULL,
+        subtotal DECIMAL(10,2)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_sale_items_sale ON sale_items(sale_id)",
+]
+
+IN_MONTH = "sale_time >= :start AND sale_time < :end AND sale_id <= :loaded"
+
+
+def _next_month(day):
+    return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+
+
+def closed_months(conn, hot_months=HOT_MONTHS):
+    """First days of the months still in the hot tables that are older than the hot window."""
+    cutoff = datetime.date.fromisoformat(months_ago(hot_months))
+    oldest = as_datetime(conn.execute(text("SELECT MIN(sale_time) FROM sales")).scalar())
+    if oldest is None:
+        return []
+    month, months = oldest.date().replace(day=1), []
+    while month < cutoff:
+        months.append(month)
+        month = _next_month(month)
+    return months
+
+
+def _create_sqlite_archive(year):
+    path = sales_archive_path(year)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    created = not os.path.exists(path)
+    archive = sqlite3.connect(path)
+    for statement in SQLITE_ARCHIVE_SCHEMA:
+        archive.execute(statement)
+    archive.commit()
+    archive.close()
+    return created
+
+
+def _pg_partitions(conn, month):
+    """Create the archive partitions for a month if needed; returns (sales, sale_items) table names."""
+    start, end = month.isoformat(), _next_month(month).isoformat()
+    for parent in ("sales_archive", "sale_items_archive"):
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {parent}_{month:%Y_%m} PARTITION OF {parent}
+            FOR VALUES FROM ('{start}') TO ('{end}')
+        """))
+    return "sales_archive", "sale_items_archive"
+
+
+def move_month(conn, month, loaded, sales_table, items_table):
+    """Copy one month of loaded sales and their lines to the archive, then delete them from the hot tables."""
+    params = {"start": month.isoformat(), "end": _next_month(month).isoformat(), "loaded": loaded}
+    conn.execute(text(f"""
+        INSERT INTO {sales_table} ({SALES_COLUMNS})
+        SELECT {SALES_COLUMNS} FROM sales WHERE {IN_MONTH}
+    """), params)
+    conn.execute(text(f"""
+        INSERT INTO {items_table} (sale_time, {SALE_ITEM_COLUMNS})
+        SELECT s.sale_time, si.sale_item_id, si.sale_id, si.product_id, si.quantity, si.unit_price, si.subtotal
+        FROM sale_items si
+        JOIN sales s ON s.sale_id = si.sale_id
+        WHERE s.sale_time >= :start AND s.sale_time < :end AND s.sale_id <= :loaded
+    """), params)
+    conn.execute(text(f"""
+        DELETE FROM sale_items WHERE sale_id IN (SELECT sale_id FROM sales WHERE {IN_MONTH})
+    """), params)
+    return conn.execute(text(f"DELETE FROM sales WHERE {IN_MONTH}"), params).rowcount
+
+
+def rollover_sales(engine, hot_months=HOT_MONTHS):
+    """
+    Move closed months older than the hot window from sales/sale_items to
+    cold storage: monthly partitions of sales_archive/sale_items_archive on
+    Postgres, one attached archive database per year on SQLite. Each month
+    moves in its own transaction; sales not yet in sale_line_fact stay hot
+    so derived tables can still load them. Returns the number of sales moved.
+    """
+    with engine.connect() as conn:
+        months = closed_months(conn, hot_months)
+    if not months:
+        return 0
+    sqlite = engine.dialect.name == "sqlite"
+    if sqlite and any([_create_sqlite_archive(year) for year in sorted({m.year for m in months})]):
+        # New archive files are attached (and added to sales_history) on connect
+        engine.dispose()
+    moved = 0
+    for month in months:
+        with engine.begin() as conn:
+            loaded = get_watermark(conn, "sale_line_fact")
+            if sqlite:
+                tables = f"archive_{month.year}.sales", f"archive_{month.year}.sale_items"
+            else:
+                tables = _pg_partitions(conn, month)
+            count = move_month(conn, month, loaded, *tables)
+            if count:
+                bump_data_version(conn, "sales")
+            set_watermark(conn, JOB_NAME, 0, {"through": _next_month(month).isoformat()})
+        moved += count
+    return moved
+
+
+def purge_archive(conn, before):
+    """Delete archived sales (and their lines) older than the ISO date `before`."""
+    if conn.dialect.name == "postgresql":
+        schemas = [("sales_archive", "sale_items_archive")]
+    else:
+        names = [row[1] for row in conn.execute(text("PRAGMA database_list"))]
+        schemas = [(f"{name}.sales", f"{name}.sale_items") for name in names if name.startswith("archive_")]
+    deleted = 0
+    for sales_table, items_table in schemas:
+        conn.execute(text(f"DELETE FROM {items_table} WHERE sale_time < :before"), {"before": before})
+        deleted += conn.execute(text(f"DELETE FROM {sales_table} WHERE sale_time < :before"),
+                                {"before": before}).rowcount
+    return deleted
+
+
+def partition_summary(engine):
+    """Rows and date range of the hot tables and of the archive."""
+    with engine.connect() as conn:
+        hot = conn.execute(text("SELECT COUNT(*), MIN(sale_time), MAX(sale_time) FROM sales")).fetchone()
+        total = conn.execute(text("SELECT COUNT(*), MIN(sale_time), MAX(sale_time) FROM sales_history")).fetchone()
+    return {"hot": tuple(hot), "all": tuple(total), "archived": total[0] - hot[0]}
+
+
+if __name__ == "__main__":
+    print(f"✅ {rollover_sales(engine)} sales moved to the archive")
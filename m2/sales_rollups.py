@@ -0,0 +1,107 @@
+# sales_rollups.py
+from collections import defaultdict
+from sqlalchemy import text
+
+GRAINS = ("hour", "day", "month")
+
+UPSERT_ROLLUP = text("""
+    INSERT INTO sales_rollups (grain, bucket, dim_type, dim_id, sale_count, revenue, units)
+    VALUES (:grain, :bucket, :dim_type, :dim_id, :sale_count, :revenue, :units)
+    ON CONFLICT (grain, dim_type, dim_id, bucket) DO UPDATE
+    SET sale_count = sales_rollups.sale_count + excluded.sale_count,
+        revenue = sales_rollups.revenue + excluded.revenue,
+        units = sales_rollups.units + excluded.units
+""")
+
+
+def bucket_for(grain, sale_date, sale_hour=None, sale_month=None):
+    """Bucket key: 'YYYY-MM-DD HH' (hour), 'YYYY-MM-DD' (day) or 'YYYY-MM' (month)."""
+    if grain == "hour":
+        return f"{sale_date} {int(sale_hour):02d}"
+    if grain == "day":
+        return str(sale_date)
+    return str(sale_month) if sale_month else str(sale_date)[:7]
+
+
+def _dimension_ids(fact):
+    return {
+        "all": 0,
+        "category": fact["category_id"],
+        "employee": fact["employee_id"] or 0,
+    }
+
+
+def apply_facts_to_rollups(conn, facts):
+    """
+    Add freshly inserted sale_line_fact rows to the hourly/daily/monthly rollups.
+    sale_count counts each sale once per bucket and dimension value.
+    """
+    if not facts:
+        return
+    totals = defaultdict(lambda: {"sales": set(), "revenue": 0, "units": 0})
+    for fact in facts:
+        for grain in GRAINS:
+            bucket = bucket_for(grain, fact["sale_date"], fact["sale_hour"], fact["sale_month"])
+            for dim_type, dim_id in _dimension_ids(fact).items():
+                entry = totals[(grain, bucket, dim_type, dim_id)]
+                entry["sales"].add(fact["sale_id"])
+                entry["revenue"] += fact["line_revenue"]
+                entry["units"] += fact["quantity"]
+
+    conn.execute(UPSERT_ROLLUP, [
+        {"grain": grain, "bucket": bucket, "dim_type": dim_type, "dim_id": dim_id,
+         "sale_count": len(entry["sales"]), "revenue": entry["revenue"], "units": entry["units"]}
+        for (grain, bucket, dim_type, dim_id), entry in totals.items()
+    ])
+
+
+_GRAIN_KEYS = {
+    "hour": "sale_date, sale_hour",
+    "day": "sale_date",
+    "month": "sale_month",
+}
+_DIM_KEYS = {
+    "all": None,
+    "category": "category_id",
+    "employee": "COALESCE(employee_id, 0)",
+}
+
+
+def rebuild_rollups(engine, since_month=None):
+    """
+    Recompute rollups from sale_line_fact, either entirely or from the first day
+    of since_month ('YYYY-MM') onwards. Runs in one transaction.
+    Returns the number of rollup rows written.
+    """
+    since_date = f"{since_month}-01" if since_month else "0001-01-01"
+    written = 0
+    with engine.begin() as conn:
+        for grain in GRAINS:
+            conn.execute(text("""
+                DELETE FROM sales_rollups WHERE grain = :grain AND bucket >= :since
+            """), {"grain": grain, "since": since_month or ""})
+            for dim_type, dim_expr in _DIM_KEYS.items():
+                keys = _GRAIN_KEYS[grain]
+                group_by = f"{keys}, {dim_expr}" if dim_expr else keys
+                rows = conn.execute(text(f"""
+                    SELECT {keys}, {dim_expr or 0} as dim_id,
+                           COUNT(DISTINCT sale_id), SUM(line_revenue), SUM(quantity)
+                    FROM sale_line_fact
+                    WHERE sale_date >= :since
+                    GROUP BY {group_by}
+                """), {"since": since_date}).fetchall()
+                params = []
+                for row in rows:
+                    if grain == "hour":
+                        bucket = bucket_for(grain, row[0], row[1])
+                        dim_id, count, revenue, units = row[2:]
+                    else:
+                        bucket = str(row[0])
+                        dim_id, count, revenue, units = row[1:]
+                    params.append({"grain": grain, "bucket": bucket, "dim_type": dim_type,
+                                   "dim_id": dim_id, "sale_count": count,
+                                   "revenue": revenue, "units": units})
+                if params:
+                    conn.execute(UPSERT_ROLLUP, params)
+                written += len(params)
+    return written
@@ -0,0 +1,341 @@
+# sales_sketches.py
+import io
+import json
+import math
+import heapq
+import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import text, bindparam
+from tabulate import tabulate
+from db import get_engine
+from auth import has_permission
+from etl_state import days_ago, as_datetime, get_watermark, set_watermark
+
+engine = get_engine()
+
+HLL_PRECISION = 12              # 4096 one-byte registers, ~1.6% standard error
+QUANTILE_ACCURACY = 0.01        # basket-value percentiles within 1% of the true value
+CMS_DEPTH, CMS_WIDTH = 4, 2048  # count-min table for units sold per product
+TOP_CAPACITY = 50               # candidate products kept per day for top-K
+JOB_NAME = "daily_sketches"
+SKETCH_BATCH = 50000            # sale lines folded per transaction
+# Lines newer than this are left for the next pass, so a checkout that commits
+# after a later one (higher sale_item_id) is not skipped by the watermark
+SETTLE_SECONDS = 60
+MASK64 = (1 << 64) - 1
+
+
+def _hash64(values, seed=0):
+    """splitmix64 over integer ids, vectorized; different seeds give independent hashes."""
+    x = np.asarray(values, dtype=np.int64).astype(np.uint64)
+    with np.errstate(over="ignore"):
+        x = x + np.uint64((0x9E3779B97F4A7C15 * (seed + 1)) & MASK64)
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+class HyperLogLog:
+    """Distinct-count sketch; merging is an element-wise max of registers."""
+
+    def __init__(self, registers=None):
+        self.registers = (np.zeros(1 << HLL_PRECISION, dtype=np.uint8)
+                          if registers is None else registers)
+
+    def add(self, values):
+        if len(values) == 0:
+            return
+        hashes = _hash64(values)
+        index = (hashes >> np.uint64(64 - HLL_PRECISION)).astype(np.int64)
+        # The remaining 52 bits fit a float64 exactly, so frexp gives their bit length
+        rest = (hashes & np.uint64((1 << (64 - HLL_PRECISION)) - 1)).astype(np.float64)
+        rank = (64 - HLL_PRECISION) - np.frexp(rest)[1] + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        raw = (0.7213 / (1 + 1.079 / m)) * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+    def to_bytes(self):
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, payload):
+        return cls(np.frombuffer(payload, dtype=np.uint8).copy())
+
+
+class QuantileSketch:
+    """
+    Log-bucketed histogram (DDSketch): every value lands in a bucket no more
+    than QUANTILE_ACCURACY wide relative to itself, and sketches merge by
+    adding bucket counts.
+    """
+    GAMMA = (1 + QUANTILE_ACCURACY) / (1 - QUANTILE_ACCURACY)
+    MIN_VALUE = 0.01
+
+    def __init__(self, bins=None, zero=0, total=0.0):
+        self.bins = bins or {}
+        self.zero = zero        # values below MIN_VALUE (e.g. fully discounted sales)
+        self.total = total
+
+    @property
+    def count(self):
+        return self.zero + sum(self.bins.values())
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.total += float(values.sum())
+        positive = values[values >= self.MIN_VALUE]
+        self.zero += len(values) - len(positive)
+        index = np.ceil(np.log(positive) / math.log(self.GAMMA)).astype(np.int64)
+        for key, n in zip(*np.unique(index, return_counts=True)):
+            self.bins[int(key)] = self.bins.get(int(key), 0) + int(n)
+
+    def merge(self, other):
+        for key, n in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + n
+        self.zero += other.zero
+        self.total += other.total
+
+    def quantile(self, q):
+        count = self.count
+        if not count:
+            return None
+        rank = q * (count - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return 2 * self.GAMMA ** key / (self.GAMMA + 1)
+        return 2 * self.GAMMA ** max(self.bins) / (self.GAMMA + 1)
+
+    def to_bytes(self):
+        return json.dumps({"bins": self.bins, "zero": self.zero, "total": self.total}).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, payload):
+        data = json.loads(bytes(payload).decode("utf-8"))
+        return cls({int(k): v for k, v in data["bins"].items()}, data["zero"], data["total"])
+
+
+class TopProducts:
+    """
+    Count-min sketch of units per product plus the TOP_CAPACITY heaviest
+    products seen, so top sellers over many days come from merging tables
+    and re-estimating the union of candidates.
+    """
+
+    def __init__(self, table=None, candidates=None):
+        self.table = np.zeros((CMS_DEPTH, CMS_WIDTH), dtype=np.int64) if table is None else table
+        self.candidates = candidates or {}
+
+    def _columns(self, ids):
+        return [(_hash64(ids, seed=row + 1) % np.uint64(CMS_WIDTH)).astype(np.int64)
+                for row in range(CMS_DEPTH)]
+
+    def estimate(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        return np.min([self.table[row, cols] for row, cols in enumerate(self._columns(ids))], axis=0)
+
+    def add(self, ids, counts):
+        ids = np.asarray(ids, dtype=np.int64)
+        for row, cols in enumerate(self._columns(ids)):
+            np.add.at(self.table[row], cols, np.asarray(counts, dtype=np.int64))
+        self._update_candidates(np.unique(ids))
+
+    def _update_candidates(self, ids):
+        ids = np.union1d(ids, np.fromiter(self.candidates, dtype=np.int64, count=len(self.candidates)))
+        estimates = self.estimate(ids)
+        self.candidates = dict(heapq.nlargest(TOP_CAPACITY, zip(ids.tolist(), estimates.tolist()),
+                                              key=lambda item: item[1]))
+
+    def merge(self, other):
+        self.table += other.table
+        self._update_candidates(np.fromiter(other.candidates, dtype=np.int64, count=len(other.candidates)))
+
+    def top(self, k):
+        return sorted(self.candidates.items(), key=lambda item: -item[1])[:k]
+
+    def to_bytes(self):
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, table=self.table.astype(np.int32),
+                            ids=np.array(list(self.candidates), dtype=np.int64),
+                            counts=np.array(list(self.candidates.values()), dtype=np.int64))
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, payload):
+        data = np.load(io.BytesIO(bytes(payload)))
+        return cls(data["table"].astype(np.int64), dict(zip(data["ids"].tolist(), data["counts"].tolist())))
+
+
+SKETCHES = {
+    "customers": HyperLogLog,
+    "basket_value": QuantileSketch,
+    "product_units": TopProducts,
+}
+
+
+def build_day_sketches(lines):
+    """
+    Sketches for one day's sale lines (DataFrame with sale_id, customer_id,
+    product_id, quantity, line_revenue). Returns {sketch name: sketch}.
+    """
+    customers = HyperLogLog()
+    customers.add(lines["customer_id"].dropna().unique())
+    baskets = QuantileSketch()
+    baskets.add(lines.groupby("sale_id")["line_revenue"].sum().astype("float64").to_numpy())
+    units = lines.groupby("product_id")["quantity"].sum()
+    products = TopProducts()
+    products.add(units.index.to_numpy(), units.to_numpy())
+    return {"customers": customers, "basket_value": baskets, "product_units": products}
+
+
+def _lock_clause(conn):
+    return " FOR UPDATE" if conn.dialect.name == "postgresql" else ""
+
+
+def merge_into_day(conn, sale_date, sketches):
+    """Merge sketches into the stored ones for sale_date (creating them if needed)."""
+    for name in sorted(sketches):
+        conn.execute(text("""
+            INSERT INTO daily_sketches (sale_date, sketch, payload, updated_at)
+            VALUES (:day, :sketch, :payload, CURRENT_TIMESTAMP)
+            ON CONFLICT (sale_date, sketch) DO NOTHING
+        """), {"day": sale_date, "sketch": name, "payload": SKETCHES[name]().to_bytes()})
+        stored = conn.execute(text("""
+            SELECT payload FROM daily_sketches WHERE sale_date = :day AND sketch = :sketch
+        """ + _lock_clause(conn)), {"day": sale_date, "sketch": name}).scalar()
+        merged = SKETCHES[name].from_bytes(stored)
+        merged.merge(sketches[name])
+        conn.execute(text("""
+            UPDATE daily_sketches SET payload = :payload, updated_at = CURRENT_TIMESTAMP
+            WHERE sale_date = :day AND sketch = :sketch
+        """), {"day": sale_date, "sketch": name, "payload": merged.to_bytes()})
+
+
+def _settled_cutoff(conn):
+    # sale_time comes from the database's CURRENT_TIMESTAMP (UTC on SQLite), so
+    # the cutoff is computed from the same clock rather than Python's local time
+    if conn.dialect.name == "sqlite":
+        return f"datetime(CURRENT_TIMESTAMP, '-{SETTLE_SECONDS} seconds')"
+    return f"CURRENT_TIMESTAMP - INTERVAL '{SETTLE_SECONDS} seconds'"
+
+
+def refresh_sketches(engine, batch_size=SKETCH_BATCH):
+    """
+    Fold sale_line_fact rows added since the last run into their days'
+    sketches. Runs from the scheduler and catch_up rather than at checkout, so
+    concurrent sales never queue on the day's sketch rows. Returns lines folded.
+    """
+    folded = 0
+    while True:
+        with engine.begin() as conn:
+            last_id = get_watermark(conn, JOB_NAME)
+            pending = conn.execute(text(f"""
+                SELECT MIN(sale_item_id) FROM sale_line_fact
+                WHERE sale_item_id > :after AND sale_time > {_settled_cutoff(conn)}
+            """), {"after": last_id}).scalar()
+            lines = pd.read_sql(text("""
+                SELECT sale_item_id, sale_id, sale_date, customer_id, product_id, quantity, line_revenue
+                FROM sale_line_fact
+                WHERE sale_item_id > :after AND sale_item_id < :before
+                ORDER BY sale_item_id
+                LIMIT :limit
+            """), conn, params={"after": last_id, "before": pending or 2 ** 62, "limit": batch_size})
+            if lines.empty:
+                return folded
+            for sale_date, day in lines.groupby(lines["sale_date"].astype(str)):
+                merge_into_day(conn, sale_date, build_day_sketches(day))
+            set_watermark(conn, JOB_NAME, int(lines["sale_item_id"].max()))
+        folded += len(lines)
+
+
+def rebuild_sketches(engine):
+    """Recompute all daily sketches from sale_line_fact and reset the refresh watermark. Returns days built."""
+    with engine.begin() as conn:
+        lines = pd.read_sql(text("""
+            SELECT sale_item_id, sale_id, sale_date, customer_id, product_id, quantity, line_revenue
+            FROM sale_line_fact
+        """), conn)
+        conn.execute(text("DELETE FROM daily_sketches"))
+        set_watermark(conn, JOB_NAME, 0 if lines.empty else int(lines["sale_item_id"].max()))
+        for sale_date, day in lines.groupby(lines["sale_date"].astype(str)):
+            for name, sketch in build_day_sketches(day).items():
+                conn.execute(text("""
+                    INSERT INTO daily_sketches (sale_date, sketch, payload, updated_at)
+                    VALUES (:day, :sketch, :payload, CURRENT_TIMESTAMP)
+                """), {"day": sale_date, "sketch": name, "payload": sketch.to_bytes()})
+    return lines["sale_date"].nunique()
+
+
+def range_sketches(conn, start, end):
+    """Merge the stored daily sketches for start..end (ISO dates, inclusive)."""
+    merged = {name: cls() for name, cls in SKETCHES.items()}
+    rows = conn.execute(text("""
+        SELECT sketch, payload FROM daily_sketches
+        WHERE sale_date >= :start AND sale_date <= :end
+    """), {"start": start, "end": end})
+    for name, payload in rows:
+        merged[name].merge(SKETCHES[name].from_bytes(payload))
+    return merged
+
+
+def sketch_metrics(conn, start, end, top_k=10):
+    """Approximate dashboard metrics for a date range from the daily sketches."""
+    merged = range_sketches(conn, start, end)
+    baskets = merged["basket_value"]
+    top = merged["product_units"].top(top_k)
+    names = {}
+    if top:
+        names = dict(conn.execute(text("""
+            SELECT product_id, name FROM products WHERE product_id IN :ids
+        """).bindparams(bindparam("ids", expanding=True)), {"ids": [pid for pid, _ in top]}).fetchall())
+    return {
+        "start": start,
+        "end": end,
+        "distinct_customers": merged["customers"].estimate(),
+        "sales": baskets.count,
+        "avg_basket_value": round(baskets.total / baskets.count, 2) if baskets.count else None,
+        "basket_value_percentiles": {
+            f"p{int(q * 100)}": None if baskets.quantile(q) is None else round(baskets.quantile(q), 2)
+            for q in (0.5, 0.9, 0.99)
+        },
+        "top_products": [{"product_id": pid, "name": names.get(pid), "units": units} for pid, units in top],
+    }
+
+
+# ------------------ CLI ------------------
+def sketch_dashboard():
+    """Approximate distinct customers, basket percentiles and top sellers for a date range"""
+    if not has_permission(["MANAGER", "ADMIN"]):
+        return
+
+    try:
+        start = input("Start date (YYYY-MM-DD, default 30 days ago): ").strip() or days_ago(30)
+        end = input("End date (YYYY-MM-DD, default today): ").strip() or datetime.date.today().isoformat()
+        with engine.connect() as conn:
+            metrics = sketch_metrics(conn, as_datetime(start).date().isoformat(),
+                                     as_datetime(end).date().isoformat())
+        if not metrics["sales"]:
+            print("📭 No sales in this period")
+            return
+        p = metrics["basket_value_percentiles"]
+        print(f"\n📊 SALES SNAPSHOT {metrics['start']} → {metrics['end']} (approximate)")
+        print(f"👥 Distinct customers: ~{metrics['distinct_customers']:,}")
+        print(f"🧾 Sales: {metrics['sales']:,}  |  Avg basket: {metrics['avg_basket_value']:.2f}")
+        print(f"💰 Basket value p50 {p['p50']:.2f}  |  p90 {p['p90']:.2f}  |  p99 {p['p99']:.2f}")
+        print(tabulate([(t["product_id"], t["name"], t["units"]) for t in metrics["top_products"]],
+                       headers=["Product ID", "Name", "Units (≈)"], tablefmt="grid"))
+    except Exception as e:
+        print(f"❌ Sketch dashboard error: {e}")
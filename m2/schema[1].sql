@@ -99,3 +99,279 @@ CREATE TABLE IF NOT EXISTS notifications (
     read_at TIMESTAMP
 );
 
+
+-- Incremental job progress (max processed id per job)
+CREATE TABLE IF NOT EXISTS etl_watermarks (
+    job_name VARCHAR(50) PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    state TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Denormalized sale lines written at checkout; analytics read this instead of
+-- joining products, categories, sale_items and sales
+CREATE TABLE IF NOT EXISTS sale_line_fact (
+    sale_item_id INT PRIMARY KEY,
+    sale_id INT NOT NULL,
+    sale_time TIMESTAMP NOT NULL,
+    sale_date DATE NOT NULL,
+    sale_hour SMALLINT NOT NULL,
+    sale_month CHAR(7) NOT NULL,             -- 'YYYY-MM'
+    product_id INT NOT NULL,
+    category_id INT NOT NULL,
+    supplier_id INT NOT NULL,
+    customer_id INT,
+    employee_id INT,
+    quantity INT NOT NULL,
+    unit_price DECIMAL(10,2) NOT NULL,
+    line_revenue DECIMAL(12,2) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_sale_line_fact_sale_id ON sale_line_fact(sale_id);
+CREATE INDEX IF NOT EXISTS idx_sale_line_fact_date ON sale_line_fact(sale_date);
+CREATE INDEX IF NOT EXISTS idx_sale_line_fact_product_time ON sale_line_fact(product_id, sale_time);
+CREATE INDEX IF NOT EXISTS idx_sale_line_fact_category_month ON sale_line_fact(category_id, sale_month);
+CREATE INDEX IF NOT EXISTS idx_sale_line_fact_supplier ON sale_line_fact(supplier_id);
+
+-- Hourly/daily/monthly sales aggregates, updated as sales land
+CREATE TABLE IF NOT EXISTS sales_rollups (
+    grain VARCHAR(5) NOT NULL,               -- 'hour' / 'day' / 'month'
+    bucket VARCHAR(13) NOT NULL,             -- 'YYYY-MM-DD HH' / 'YYYY-MM-DD' / 'YYYY-MM'
+    dim_type VARCHAR(10) NOT NULL,           -- 'all' / 'category' / 'employee'
+    dim_id INT NOT NULL DEFAULT 0,
+    sale_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (grain, dim_type, dim_id, bucket)
+);
+
+-- Supplier reliability (0-100), maintained by managers
+ALTER TABLE suppliers ADD COLUMN IF NOT EXISTS reliability_score INT CHECK (reliability_score BETWEEN 0 AND 100);
+
+-- Cached supplier scorecard, rebuilt from per-supplier aggregates when stale
+CREATE TABLE IF NOT EXISTS supplier_scorecards (
+    supplier_id INT PRIMARY KEY,
+    supplier_name VARCHAR(100) NOT NULL,
+    contact VARCHAR(100),
+    reliability_score INT,
+    products_supplied INT NOT NULL DEFAULT 0,
+    stock_units INT NOT NULL DEFAULT 0,
+    out_of_stock_items INT NOT NULL DEFAULT 0,
+    avg_stock_level DECIMAL(12,2),
+    total_revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    items_sold INT NOT NULL DEFAULT 0,
+    last_delivery DATE,
+    activity_status VARCHAR(20) NOT NULL,
+    composite_score DECIMAL(5,1) NOT NULL,
+    grade VARCHAR(10) NOT NULL
+);
+
+-- Per-product sales stats, updated at checkout; rolling windows are
+-- recomputed daily from sale_line_fact
+CREATE TABLE IF NOT EXISTS product_sales_stats (
+    product_id INT PRIMARY KEY,
+    last_sale_time TIMESTAMP,
+    units_sold_total INT NOT NULL DEFAULT 0,
+    units_7d INT NOT NULL DEFAULT 0,
+    units_30d INT NOT NULL DEFAULT 0,
+    units_90d INT NOT NULL DEFAULT 0,
+    revenue_90d DECIMAL(14,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_product_sales_stats_last_sale ON product_sales_stats(last_sale_time);
+
+-- When a purchase order was booked into stock (supplier lead-time statistics)
+ALTER TABLE purchase_orders ADD COLUMN IF NOT EXISTS received_at TIMESTAMP;
+
+-- Notification inbox: unread queue (paged by notification_id), unread
+-- low-stock dedupe per product, and compaction of old read notifications
+CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(notification_id) WHERE status = 'unread';
+CREATE INDEX IF NOT EXISTS idx_notifications_unread_product ON notifications(product_id, notification_type) WHERE status = 'unread';
+CREATE INDEX IF NOT EXISTS idx_notifications_read_at ON notifications(read_at) WHERE status = 'read';
+
+-- Every price change, grouped by the batch (e.g. one clearance run) that made it
+CREATE TABLE IF NOT EXISTS price_history (
+    history_id BIGSERIAL PRIMARY KEY,
+    product_id INT NOT NULL REFERENCES products(product_id),
+    old_price DECIMAL(10,2) NOT NULL,
+    new_price DECIMAL(10,2) NOT NULL,
+    reason VARCHAR(20) NOT NULL,
+    batch_id VARCHAR(32) NOT NULL,
+    changed_by INT REFERENCES employees(employee_id),
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_price_history_product ON price_history(product_id, changed_at);
+CREATE INDEX IF NOT EXISTS idx_price_history_batch ON price_history(batch_id);
+
+-- Change counters bumped by catalog/stock/price writers; the report cache
+-- reuses results while these (and MAX(sale_id)) are unchanged
+CREATE TABLE IF NOT EXISTS data_versions (
+    source VARCHAR(30) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Latest precomputed copy of each standard report (see report_scheduler.py)
+CREATE TABLE IF NOT EXISTS report_snapshots (
+    report_name VARCHAR(50) PRIMARY KEY,
+    generated_at TIMESTAMP NOT NULL,
+    row_count INT NOT NULL,
+    duration_ms INT,
+    params TEXT,
+    payload TEXT NOT NULL
+);
+
+-- Market basket counts (baskets per product and per product pair, product_a < product_b),
+-- maintained incrementally by market_basket.py, and the derived association rules
+CREATE TABLE IF NOT EXISTS product_basket_counts (
+    product_id INT PRIMARY KEY,
+    baskets INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS product_pair_counts (
+    product_a INT NOT NULL,
+    product_b INT NOT NULL,
+    baskets INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (product_a, product_b)
+);
+
+CREATE TABLE IF NOT EXISTS product_associations (
+    product_id INT NOT NULL,
+    related_product_id INT NOT NULL,
+    pair_baskets INT NOT NULL,
+    support DOUBLE PRECISION NOT NULL,
+    confidence DOUBLE PRECISION NOT NULL,
+    lift DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (product_id, related_product_id)
+);
+
+-- RFM (recency, frequency, monetary) scores and segment per customer,
+-- refreshed by customer_segments.py for customers with new sales
+CREATE TABLE IF NOT EXISTS customer_segments (
+    customer_id INT PRIMARY KEY REFERENCES customers(customer_id) ON DELETE CASCADE,
+    last_purchase TIMESTAMP NOT NULL,
+    frequency INT NOT NULL,
+    monetary DECIMAL(12,2) NOT NULL,
+    r_score SMALLINT NOT NULL,
+    f_score SMALLINT NOT NULL,
+    m_score SMALLINT NOT NULL,
+    rfm_score VARCHAR(3) NOT NULL,
+    segment VARCHAR(30) NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_customer_segments_segment ON customer_segments(segment, customer_id);
+CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales(customer_id);
+
+-- Running EWMA mean/variance per employee and per product metric, used by
+-- sale_anomalies.py to flag unusual sales into notifications
+CREATE TABLE IF NOT EXISTS anomaly_stats (
+    entity_type VARCHAR(10) NOT NULL,
+    entity_id INT NOT NULL,
+    metric VARCHAR(20) NOT NULL,
+    observations INT NOT NULL,
+    mean DOUBLE PRECISION NOT NULL,
+    variance DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (entity_type, entity_id, metric)
+);
+
+-- Mergeable per-day sketches (HyperLogLog of customers, basket-value
+-- quantiles, count-min of units per product) kept by sales_sketches.py
+CREATE TABLE IF NOT EXISTS daily_sketches (
+    sale_date DATE NOT NULL,
+    sketch VARCHAR(20) NOT NULL,
+    payload BYTEA NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (sale_date, sketch)
+);
+
+-- Low stock is stock strictly below the product's threshold; the flag is
+-- generated so every caller shares one definition and the partial indexes
+-- make low/zero-stock lookups proportional to the matches
+ALTER TABLE products ADD COLUMN IF NOT EXISTS is_low_stock BOOLEAN
+    GENERATED ALWAYS AS (COALESCE(stock_quantity < low_stock_threshold, FALSE)) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_products_low_stock ON products(stock_quantity) WHERE is_low_stock;
+CREATE INDEX IF NOT EXISTS idx_products_out_of_stock ON products(product_id) WHERE stock_quantity = 0;
+
+-- Report views read by report.py, refreshed (CONCURRENTLY, hence the unique
+-- indexes) by report_views.py from the report scheduler
+CREATE MATERIALIZED VIEW IF NOT EXISTS daily_sales_report AS
+SELECT bucket as date,
+       sale_count as transactions,
+       revenue as total_revenue,
+       units as units_sold,
+       ROUND(revenue / NULLIF(sale_count, 0), 2) as avg_sale
+FROM sales_rollups
+WHERE grain = 'day' AND dim_type = 'all' AND dim_id = 0;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_sales_report_date ON daily_sales_report(date);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS best_selling_products AS
+SELECT p.product_id, p.name, c.name as category,
+       s.units_sold_total as units_sold,
+       s.units_30d,
+       s.revenue_90d,
+       s.last_sale_time
+FROM product_sales_stats s
+JOIN products p ON p.product_id = s.product_id
+LEFT JOIN categories c ON c.category_id = p.category_id
+WHERE s.units_sold_total > 0;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_best_selling_products_id ON best_selling_products(product_id);
+CREATE INDEX IF NOT EXISTS idx_best_selling_products_units ON best_selling_products(units_sold DESC);
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS low_stock_products AS
+SELECT p.product_id, p.name, c.name as category, sp.name as supplier,
+       p.stock_quantity, p.low_stock_threshold,
+       p.low_stock_threshold - p.stock_quantity as shortfall
+FROM products p
+LEFT JOIN categories c ON c.category_id = p.category_id
+LEFT JOIN suppliers sp ON sp.supplier_id = p.supplier_id
+WHERE p.is_low_stock;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_low_stock_products_id ON low_stock_products(product_id);
+CREATE INDEX IF NOT EXISTS idx_low_stock_products_stock ON low_stock_products(stock_quantity);
+
+-- Cold storage for sales: sales_partitions.py moves closed months out of the
+-- hot sales/sale_items tables into these, one range partition per month
+CREATE INDEX IF NOT EXISTS idx_sales_time ON sales(sale_time);
+
+CREATE TABLE IF NOT EXISTS sales_archive (
+    sale_id INT NOT NULL,
+    sale_time TIMESTAMP NOT NULL,
+    total_amount DECIMAL(10,2) NOT NULL,
+    payment_method VARCHAR(50) NOT NULL,
+    customer_id INT,
+    employee_id INT,
+    PRIMARY KEY (sale_id, sale_time)
+) PARTITION BY RANGE (sale_time);
+
+CREATE INDEX IF NOT EXISTS idx_sales_archive_customer ON sales_archive(customer_id);
+
+CREATE TABLE IF NOT EXISTS sale_items_archive (
+    sale_item_id INT NOT NULL,
+    sale_id INT NOT NULL,
+    sale_time TIMESTAMP NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    unit_price DECIMAL(10,2) NOT NULL,
+    subtotal DECIMAL(10,2),
+    PRIMARY KEY (sale_item_id, sale_time)
+) PARTITION BY RANGE (sale_time);
+
+CREATE INDEX IF NOT EXISTS idx_sale_items_archive_sale ON sale_items_archive(sale_id);
+
+-- Full history for lifetime queries (customer value, segments, totals)
+CREATE OR REPLACE VIEW sales_history AS
+SELECT sale_id, sale_time, total_amount, payment_method, customer_id, employee_id FROM sales
+UNION ALL
+SELECT sale_id, sale_time, total_amount, payment_method, customer_id, employee_id FROM sales_archive;
+
+CREATE OR REPLACE VIEW sale_items_history AS
+SELECT sale_item_id, sale_id, product_id, quantity, unit_price, subtotal FROM sale_items
+UNION ALL
+SELECT sale_item_id, sale_id, product_id, quantity, unit_price, subtotal FROM sale_items_archive;
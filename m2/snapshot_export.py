@@ -0,0 +1,177 @@
+# snapshot_export.py
+import os
+import json
+import shutil
+import datetime
+import pandas as pd
+from sqlalchemy import text
+from db import get_engine
+from auth import has_permission
+
+engine = get_engine()
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+FACT_NAME = "sales_fact"
+CHUNK_ROWS = 50000
+STATE_FILE = "_state.json"
+
+FACT_QUERY = """
+    SELECT sale_item_id, sale_id, sale_time,
+           product_id, category_id, supplier_id,
+           customer_id, employee_id,
+           quantity, unit_price, line_revenue
+    FROM sale_line_fact
+    WHERE sale_id > :last_sale_id AND sale_id <= :upper_sale_id
+    ORDER BY sale_id, sale_item_id
+"""
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.feather
+        import pyarrow.dataset
+    except ImportError:
+        raise RuntimeError("pyarrow is required for columnar snapshots (pip install pyarrow)")
+    return pyarrow
+
+
+def fact_dir(snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, FACT_NAME)
+
+
+def read_state(snapshot_dir=SNAPSHOT_DIR):
+    path = os.path.join(fact_dir(snapshot_dir), STATE_FILE)
+    if not os.path.exists(path):
+        return {"last_sale_id": 0, "rows": 0, "runs": 0}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_state(snapshot_dir, state):
+    path = os.path.join(fact_dir(snapshot_dir), STATE_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _normalize_chunk(df):
+    """Give every chunk the same column types so partitions share one schema."""
+    df["sale_time"] = pd.to_datetime(df["sale_time"])
+    for col in ("unit_price", "line_revenue"):
+        df[col] = df[col].astype("float64")
+    for col in ("customer_id", "employee_id"):
+        df[col] = df[col].astype("Int64")
+    df["month"] = df["sale_time"].dt.strftime("%Y-%m")
+    return df
+
+
+def export_sales_snapshot(engine, snapshot_dir=SNAPSHOT_DIR, fmt="parquet", chunk_rows=CHUNK_ROWS):
+    """
+    Append sale lines with sale_id above the last exported one to month-partitioned
+    columnar files (<snapshot_dir>/sales_fact/month=YYYY-MM/part-*.parquet|arrow).
+    Returns a dict with the number of rows written and the new high-water sale_id.
+    """
+    pa = _require_pyarrow()
+    if fmt not in ("parquet", "arrow"):
+        raise ValueError("fmt must be 'parquet' or 'arrow'")
+
+    base_dir = fact_dir(snapshot_dir)
+    os.makedirs(base_dir, exist_ok=True)
+    state = read_state(snapshot_dir)
+    last_sale_id = state["last_sale_id"]
+
+    with engine.connect() as conn:
+        upper = conn.execute(text("SELECT COALESCE(MAX(sale_id), 0) FROM sale_line_fact")).scalar()
+        if upper <= last_sale_id:
+            return {"rows": 0, "last_sale_id": last_sale_id, "files": 0}
+
+        # Parts are staged first and only moved into the partitions once every
+        # chunk was written, so a failed run never leaves half an export behind.
+        # Part names depend only on where the run starts and the chunk number:
+        # the state advances after publishing, so a run interrupted while
+        # publishing is redone from the same sale_id and overwrites its parts.
+        run_id = datetime.datetime.now().strftime("%Y%m%d%H%M%S%f")
+        staging = os.path.join(base_dir, f"_staging_{run_id}")
+        os.makedirs(staging)
+        staged, rows = [], 0
+        try:
+            chunks = pd.read_sql(text(FACT_QUERY), conn.execution_options(stream_results=True),
+                                 params={"last_sale_id": last_sale_id, "upper_sale_id": upper},
+                                 chunksize=chunk_rows)
+            for chunk_no, chunk in enumerate(chunks):
+                chunk = _normalize_chunk(chunk)
+                for month, part in chunk.groupby("month"):
+                    table = pa.Table.from_pandas(part.drop(columns="month"), preserve_index=False)
+                    name = f"part-{last_sale_id + 1:010d}-{chunk_no:05d}.{fmt}"
+                    path = os.path.join(staging, f"month={month}", name)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    if fmt == "parquet":
+                        pa.parquet.write_table(table, path, compression="zstd")
+                    else:
+                        pa.feather.write_feather(table, path, compression="zstd")
+                    staged.append((month, name, path))
+                rows += len(chunk)
+
+            published = []
+            try:
+                for month, name, path in staged:
+                    target_dir = os.path.join(base_dir, f"month={month}")
+                    os.makedirs(target_dir, exist_ok=True)
+                    os.replace(path, os.path.join(target_dir, name))
+                    published.append(os.path.join(target_dir, name))
+            except Exception:
+                for path in published:
+                    os.remove(path)
+                raise
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    state.update({
+        "last_sale_id": upper,
+        "rows": state["rows"] + rows,
+        "runs": state["runs"] + 1,
+        "updated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+    })
+    _write_state(snapshot_dir, state)
+    return {"rows": rows, "last_sale_id": upper, "files": len(staged)}
+
+
+def load_sales_snapshot(snapshot_dir=SNAPSHOT_DIR, months=None, columns=None, fmt="parquet"):
+    """Read the columnar sale-line fact (optionally only some months/columns) into a DataFrame."""
+    pa = _require_pyarrow()
+    base_dir = fact_dir(snapshot_dir)
+    if not os.path.isdir(base_dir):
+        return pd.DataFrame()
+    dataset = pa.dataset.dataset(base_dir, format="parquet" if fmt == "parquet" else "feather",
+                                 partitioning="hive", exclude_invalid_files=True)
+    filter_expr = None
+    if months:
+        filter_expr = pa.dataset.field("month").isin(list(months))
+    return dataset.to_table(columns=columns, filter=filter_expr).to_pandas()
+
+
+# ------------------ CLI ------------------
+def export_analytics_snapshot():
+    """Export new sale lines to the columnar analytics snapshot"""
+    if not has_permission(["MANAGER", "ADMIN"]):
+        return
+
+    try:
+        fmt = input("Snapshot format [parquet/arrow] (default parquet): ").strip().lower() or "parquet"
+        before = read_state()
+        result = export_sales_snapshot(engine, fmt=fmt)
+        if result["rows"] == 0:
+            print(f"✅ Snapshot already up to date (last sale ID {before['last_sale_id']})")
+            return
+        print(f"✅ Exported {result['rows']} sale lines in {result['files']} file(s)")
+        print(f"   Sale IDs {before['last_sale_id'] + 1} → {result['last_sale_id']}")
+        print(f"   Location: {fact_dir()}")
+    except Exception as e:
+        print(f"❌ Snapshot export error: {e}")
+
+
+if __name__ == "__main__":
+    print(export_sales_snapshot(engine))
@@ -0,0 +1,68 @@
+# stock_alerts.py
+from sqlalchemy import text
+from report_cache import bump_data_version
+
+ADJUST_STOCK = text("""
+    UPDATE products
+    SET stock_quantity = stock_quantity + :delta
+    WHERE product_id = :pid
+    RETURNING name, stock_quantity, low_stock_threshold
+""")
+
+# At most one unread low-stock notification per product
+RAISE_LOW_STOCK = text("""
+    INSERT INTO notifications (product_id, message, notification_type)
+    SELECT :pid, :message, 'low_stock'
+    WHERE NOT EXISTS (
+        SELECT 1 FROM notifications
+        WHERE product_id = :pid AND notification_type = 'low_stock' AND status = 'unread'
+    )
+""")
+
+
+def crossed_below(old_stock, new_stock, threshold):
+    """True when a stock change takes a product from at/above its threshold to below it."""
+    return threshold is not None and new_stock < threshold <= old_stock
+
+
+def low_stock_message(name, stock, threshold):
+    if stock <= 0:
+        return f"{name} is out of stock (threshold {threshold})"
+    return f"{name} is low on stock: {stock} left (threshold {threshold})"
+
+
+def adjust_stock(conn, product_id, delta):
+    """
+    Add delta (negative for sales) to a product's stock inside the caller's
+    transaction, raising a low-stock notification if this change crosses the
+    threshold. Returns (name, new_stock, threshold), or None if the product does not exist.
+    """
+    row = conn.execute(ADJUST_STOCK, {"delta": delta, "pid": product_id}).fetchone()
+    if row is None:
+        return None
+    name, new_stock, threshold = row
+    if delta < 0 and crossed_below(new_stock - delta, new_stock, threshold):
+        conn.execute(RAISE_LOW_STOCK, {"pid": product_id,
+                                       "message": low_stock_message(name, new_stock, threshold)})
+    return row
+
+
+def set_stock(conn, product_id, quantity):
+    """Set a product's stock to an absolute quantity, going through adjust_stock."""
+    current = conn.execute(text("""
+        SELECT stock_quantity FROM products WHERE product_id = :pid
+    """), {"pid": product_id}).scalar()
+    if current is None:
+        return None
+    bump_data_version(conn)
+    return adjust_stock(conn, product_id, quantity - current)
+
+
+def decrement_for_sale(conn, items):
+    """Take sold quantities out of stock; items are (product_id, quantity) pairs."""
+    totals = {}
+    for product_id, quantity in items:
+        totals[product_id] = totals.get(product_id, 0) + quantity
+    # Fixed product order so concurrent sales lock rows in the same sequence
+    for product_id, quantity in sorted(totals.items()):
+        adjust_stock(conn, product_id, -quantity)
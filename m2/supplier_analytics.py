@@ -3,6 +3,9 @@ from sqlalchemy import text
 from tabulate import tabulate
 from db import get_engine
 from auth import has_permission
+from analytics_backend import fetch_rows
+from supplier_scorecards import (ensure_fresh_scorecards, refresh_supplier_scorecards,
+                                 scorecards_refreshed_at, SCORECARD_COLUMNS)
 from datetime import datetime, timedelta
 import decimal
 
@@ -23,55 +26,21 @@ def supplier_scorecard_system():
         return
         
     try:
-        # Use separate connections for each query to avoid connection issues
+        # Scorecards are cached in supplier_scorecards and rebuilt when stale
+        ensure_fresh_scorecards(engine)
+        supplier_data = fetch_rows(f"""
+            SELECT {SCORECARD_COLUMNS}
+            FROM supplier_scorecards
+            ORDER BY total_revenue DESC
+        """, report="supplier_scorecard")
         with engine.connect() as conn:
-            # Supplier Performance Metrics
-            supplier_data = conn.execute(text("""
-                SELECT 
-                    s.supplier_id,
-                    s.name as supplier_name,
-                    s.contact_info,
-                    s.reliability_score,
-                    COUNT(p.product_id) as products_supplied,
-                    SUM(p.stock_quantity) as current_stock_value,
-                    COALESCE(SUM(si.quantity * si.unit_price), 0) as total_revenue_generated,
-                    COALESCE(COUNT(DISTINCT si.sale_item_id), 0) as total_items_sold,
-                    MAX(s.last_delivery_date) as last_delivery,
-                    CASE 
-                        WHEN MAX(s.last_delivery_date) IS NULL THEN 'No Deliveries'
-                        WHEN MAX(s.last_delivery_date) >= CURRENT_DATE - INTERVAL '30 days' THEN 'Active'
-                        WHEN MAX(s.last_delivery_date) >= CURRENT_DATE - INTERVAL '90 days' THEN 'Moderate'
-                        ELSE 'Inactive'
-                    END as activity_status
-                FROM suppliers s
-                LEFT JOIN products p ON s.supplier_id = p.supplier_id
-                LEFT JOIN sale_items si ON p.product_id = si.product_id
-                LEFT JOIN sales s2 ON si.sale_id = s2.sale_id
-                GROUP BY s.supplier_id, s.name, s.contact_info, s.reliability_score
-                ORDER BY total_revenue_generated DESC
-            """)).fetchall()
-        
-        # Use a new connection for the second query
-        with engine.connect() as conn2:
-            # Delivery Performance 
-            delivery_metrics = conn2.execute(text("""
-                SELECT 
-                    s.supplier_id,
-                    s.name,
-                    COUNT(p.product_id) as active_products,
-                    AVG(p.stock_quantity) as avg_stock_level,
-                    SUM(CASE WHEN p.stock_quantity = 0 THEN 1 ELSE 0 END) as out_of_stock_items,
-                    ROUND(COUNT(p.product_id) * 100.0 / NULLIF((
-                        SELECT COUNT(*) FROM products WHERE supplier_id = s.supplier_id
-                    ), 0), 2) as product_coverage
-                FROM suppliers s
-                LEFT JOIN products p ON s.supplier_id = p.supplier_id
-                GROUP BY s.supplier_id, s.name
-            """)).fetchall()
+            refreshed_at = scorecards_refreshed_at(conn)
             
         print("\n" + "="*100)
         print("🏆 SUPPLIER SCORECARD SYSTEM")
         print("="*100)
+        if refreshed_at:
+            print(f"Scores as of {refreshed_at:%Y-%m-%d %H:%M}")
         
         # Display Supplier Scorecards
         print("\n📊 SUPPLIER PERFORMANCE RANKINGS")
@@ -79,39 +48,19 @@ def supplier_scorecard_system():
         
         scorecard_table = []
         for supplier in supplier_data:
-            # SAFE CALCULATIONS - Convert everything to float first
-            reliability = safe_float_convert(supplier[3] or 80)  # Default if null
-            revenue = safe_float_convert(supplier[6])
-            revenue_score = min(100.0, (revenue / 10000.0) * 10.0) if revenue > 0 else 0.0
-            
-            activity_bonus = 20.0 if supplier[9] == 'Active' else 10.0 if supplier[9] == 'Moderate' else 0.0
-            
-            # FIXED: Use float arithmetic instead of decimal * float
-            composite_score = min(100.0, reliability * 0.6 + revenue_score * 0.3 + activity_bonus)
-            
-            # Grade assignment
-            if composite_score >= 90:
-                grade = "A+ 🏅"
-            elif composite_score >= 80:
-                grade = "A 👍"
-            elif composite_score >= 70:
-                grade = "B ✅"
-            elif composite_score >= 60:
-                grade = "C ⚠️"
-            else:
-                grade = "D ❌"
-            
+            revenue = safe_float_convert(supplier[8])
             scorecard_table.append({
                 'Supplier ID': supplier[0],
                 'Supplier Name': supplier[1],
+                'Contact': supplier[2] or 'N/A',
                 'Products': supplier[4],
                 'Total Revenue': f"₹{revenue:,.2f}",
-                'Items Sold': supplier[7],
-                'Reliability': f"{supplier[3] or 'N/A'}",
-                'Last Delivery': supplier[8].strftime('%Y-%m-%d') if supplier[8] else 'Never',
-                'Activity': supplier[9],
-                'Composite Score': f"{composite_score:.1f}",
-                'Grade': grade
+                'Items Sold': supplier[9],
+                'Reliability': f"{supplier[3] if supplier[3] is not None else 'N/A'}",
+                'Last Delivery': str(supplier[10])[:10] if supplier[10] else 'Never',
+                'Activity': supplier[11],
+                'Composite Score': f"{safe_float_convert(supplier[12]):.1f}",
+                'Grade': supplier[13]
             })
         
         print(tabulate(scorecard_table, headers="keys", tablefmt="grid"))
@@ -121,18 +70,18 @@ def supplier_scorecard_system():
         print("-" * 80)
         
         delivery_table = []
-        for delivery in delivery_metrics:
-            stock_health = "✅ Good" if delivery[4] == 0 else "⚠️ Warning" if delivery[4] <= 2 else "❌ Critical"
-            avg_stock = safe_float_convert(delivery[3])
-            coverage = safe_float_convert(delivery[5])
+        for supplier in supplier_data:
+            out_of_stock = supplier[6]
+            stock_health = "✅ Good" if out_of_stock == 0 else "⚠️ Warning" if out_of_stock <= 2 else "❌ Critical"
+            avg_stock = safe_float_convert(supplier[7])
             
             delivery_table.append({
-                'Supplier': delivery[1],
-                'Active Products': delivery[2],
+                'Supplier': supplier[1],
+                'Active Products': supplier[4],
+                'Stock Units': supplier[5],
                 'Avg Stock': f"{avg_stock:.0f}",
-                'Out of Stock': delivery[4],
-                'Stock Health': stock_health,
-                'Coverage': f"{coverage:.1f}%"
+                'Out of Stock': out_of_stock,
+                'Stock Health': stock_health
             })
         
         print(tabulate(delivery_table, headers="keys", tablefmt="grid"))
@@ -172,7 +121,7 @@ def update_supplier_reliability():
         return
         
     try:
-        with engine.connect() as conn:
+        with engine.begin() as conn:
             suppliers = conn.execute(text("""
                 SELECT supplier_id, name, reliability_score 
                 FROM suppliers 
@@ -205,10 +154,13 @@ def update_supplier_reliability():
             """), {"score": score, "sup_id": int(supplier_id)})
             
             updated_supplier = result.fetchone()
-            if updated_supplier:
-                print(f"✅ Updated reliability score for '{updated_supplier[0]}' to {score}")
-            else:
-                print("❌ Supplier not found")
+            
+        if updated_supplier:
+            # Regrade right away instead of waiting for the cached scorecard to expire
+            refresh_supplier_scorecards(engine)
+            print(f"✅ Updated reliability score for '{updated_supplier[0]}' to {score}")
+        else:
+            print("❌ Supplier not found")
                 
     except Exception as e:
         print(f"❌ Error updating supplier score: {e}")
\ No newline at end of file
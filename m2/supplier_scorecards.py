@@ -0,0 +1,158 @@
+# supplier_scorecards.py
+import os
+import datetime
+from sqlalchemy import text
+from etl_state import set_watermark, get_job_state, as_datetime
+
+JOB_NAME = "supplier_scorecards"
+# The cached scorecard is rebuilt on read once it is older than this
+SCORECARD_MAX_AGE_MINUTES = int(os.getenv("SCORECARD_MAX_AGE_MINUTES", "60"))
+DEFAULT_RELIABILITY = 80
+
+# Every source is aggregated to one row per supplier before the join, so
+# stock, sales and deliveries never multiply each other.
+SCORECARD_SOURCE = """
+    SELECT
+        s.supplier_id,
+        s.name,
+        COALESCE(s.email, s.phone) as contact,
+        s.reliability_score,
+        COALESCE(ps.products_supplied, 0),
+        COALESCE(ps.stock_units, 0),
+        COALESCE(ps.out_of_stock_items, 0),
+        ps.avg_stock_level,
+        COALESCE(fs.total_revenue, 0),
+        COALESCE(fs.items_sold, 0),
+        po.last_delivery
+    FROM suppliers s
+    LEFT JOIN (
+        SELECT supplier_id,
+               COUNT(*) as products_supplied,
+               SUM(stock_quantity) as stock_units,
+               SUM(CASE WHEN stock_quantity = 0 THEN 1 ELSE 0 END) as out_of_stock_items,
+               AVG(stock_quantity) as avg_stock_level
+        FROM products
+        GROUP BY supplier_id
+    ) ps ON ps.supplier_id = s.supplier_id
+    LEFT JOIN (
+        SELECT supplier_id,
+               SUM(line_revenue) as total_revenue,
+               COUNT(*) as items_sold
+        FROM sale_line_fact
+        GROUP BY supplier_id
+    ) fs ON fs.supplier_id = s.supplier_id
+    LEFT JOIN (
+        SELECT supplier_id, MAX(COALESCE(received_at, order_date)) as last_delivery
+        FROM purchase_orders
+        WHERE status = 'RECEIVED'
+        GROUP BY supplier_id
+    ) po ON po.supplier_id = s.supplier_id
+"""
+
+INSERT_SCORECARD = text("""
+    INSERT INTO supplier_scorecards (
+        supplier_id, supplier_name, contact, reliability_score,
+        products_supplied, stock_units, out_of_stock_items, avg_stock_level,
+        total_revenue, items_sold, last_delivery, activity_status,
+        composite_score, grade
+    ) VALUES (
+        :supplier_id, :supplier_name, :contact, :reliability_score,
+        :products_supplied, :stock_units, :out_of_stock_items, :avg_stock_level,
+        :total_revenue, :items_sold, :last_delivery, :activity_status,
+        :composite_score, :grade
+    )
+""")
+
+SCORECARD_COLUMNS = """
+    supplier_id, supplier_name, contact, reliability_score,
+    products_supplied, stock_units, out_of_stock_items, avg_stock_level,
+    total_revenue, items_sold, last_delivery, activity_status,
+    composite_score, grade
+"""
+
+
+def activity_status(last_delivery, today=None):
+    """Classify a supplier by the date of its last received purchase order."""
+    if last_delivery is None:
+        return "No Deliveries"
+    today = today or datetime.date.today()
+    age = (today - as_datetime(last_delivery).date()).days
+    if age <= 30:
+        return "Active"
+    if age <= 90:
+        return "Moderate"
+    return "Inactive"
+
+
+def composite_score(reliability, revenue, activity):
+    """Weighted 0-100 score from reliability, revenue and delivery activity."""
+    reliability = float(DEFAULT_RELIABILITY if reliability is None else reliability)
+    revenue = float(revenue or 0)
+    revenue_score = min(100.0, (revenue / 10000.0) * 10.0) if revenue > 0 else 0.0
+    activity_bonus = 20.0 if activity == "Active" else 10.0 if activity == "Moderate" else 0.0
+    return min(100.0, reliability * 0.6 + revenue_score * 0.3 + activity_bonus)
+
+
+def grade_for(score):
+    if score >= 90:
+        return "A+ 🏅"
+    if score >= 80:
+        return "A 👍"
+    if score >= 70:
+        return "B ✅"
+    if score >= 60:
+        return "C ⚠️"
+    return "D ❌"
+
+
+def refresh_supplier_scorecards(engine):
+    """Recompute the cached supplier_scorecards table. Returns the number of suppliers."""
+    today = datetime.date.today()
+    with engine.begin() as conn:
+        rows = conn.execute(text(SCORECARD_SOURCE)).fetchall()
+        scorecards = []
+        for row in rows:
+            last_delivery = as_datetime(row[10])
+            activity = activity_status(last_delivery, today)
+            score = round(composite_score(row[3], row[8], activity), 1)
+            scorecards.append({
+                "supplier_id": row[0],
+                "supplier_name": row[1],
+                "contact": row[2],
+                "reliability_score": row[3],
+                "products_supplied": row[4],
+                "stock_units": row[5],
+                "out_of_stock_items": row[6],
+                "avg_stock_level": round(float(row[7]), 2) if row[7] is not None else None,
+                "total_revenue": row[8],
+                "items_sold": row[9],
+                "last_delivery": last_delivery.date().isoformat() if last_delivery else None,
+                "activity_status": activity,
+                "composite_score": score,
+                "grade": grade_for(score),
+            })
+
+        conn.execute(text("DELETE FROM supplier_scorecards"))
+        if scorecards:
+            conn.execute(INSERT_SCORECARD, scorecards)
+        set_watermark(conn, JOB_NAME, 0, {
+            "refreshed_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "suppliers": len(scorecards),
+        })
+    return len(scorecards)
+
+
+def scorecards_refreshed_at(conn):
+    state = get_job_state(conn, JOB_NAME)
+    return as_datetime(state["refreshed_at"]) if state else None
+
+
+def ensure_fresh_scorecards(engine, max_age_minutes=SCORECARD_MAX_AGE_MINUTES):
+    """Refresh the cached scorecards if they were never built or are older than max_age_minutes."""
+    with engine.connect() as conn:
+        refreshed_at = scorecards_refreshed_at(conn)
+    max_age = datetime.timedelta(minutes=max_age_minutes)
+    if refreshed_at is None or datetime.datetime.now() - refreshed_at > max_age:
+        refresh_supplier_scorecards(engine)
+        return True
+    return False
@@ -2,29 +2,126 @@
 from sqlalchemy import text
 from db import get_engine
 from auth import has_permission
-import datetime
+from backup import (BACKUP_DIR, create_backup, latest_manifest, verify_backup,
+                    backup_chain, restore_backup, load_manifest)
+from sale_events import catch_up
+from sales_rollups import rebuild_rollups
+from supplier_scorecards import refresh_supplier_scorecards
+from product_sales_stats import rebuild_product_sales_stats
+from customer_segments import rebuild_customer_segments
+from report_views import refresh_report_views
+from sales_partitions import rollover_sales, purge_archive, partition_summary, HOT_MONTHS
+from notification_inbox import compact_notifications, READ_RETENTION_DAYS
+from report_cache import bump_data_version
+from etl_state import days_ago
 
 engine = get_engine()
 
 def system_backup():
-    """Create database backup"""
+    """Create a full or incremental database backup"""
     if not has_permission(["ADMIN"]):
         return
         
     try:
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = f"backup_supermarket_{timestamp}.sql"
+        mode = input("Backup type [full/incremental] (default full): ").strip().lower() or "full"
+        if mode not in ("full", "incremental"):
+            print("❌ Choose 'full' or 'incremental'")
+            return
+
+        def show_progress(status, remaining, total):
+            print(f"\r📦 Copied {total - remaining}/{total} pages", end="")
+
+        manifest_path = create_backup(engine, mode, progress=show_progress)
+        manifest = load_manifest(manifest_path)
+        print(f"\n✅ {mode.title()} backup created: {manifest_path}")
+        for entry in manifest["files"]:
+            rows = f" ({entry['rows']} rows)" if entry["rows"] is not None else ""
+            print(f"   • {entry['path']}{rows} sha256={entry['sha256'][:12]}…")
+        print(f"   High-water marks: {manifest['high_water']}")
         
-        # This would use pg_dump in production
-        print(f"🔧 Backup functionality would create: {backup_file}")
-        print("💡 In production, implement pg_dump command here")
+    except Exception as e:
+        print(f"❌ Backup error: {e}")
+
+def system_restore():
+    """Verify and restore a backup chain"""
+    if not has_permission(["ADMIN"]):
+        return
         
-        # For now, export critical tables
-        tables = ['products', 'sales', 'customers', 'employees']
-        print(f"📦 Would backup tables: {', '.join(tables)}")
+    try:
+        latest = latest_manifest(dialect=engine.dialect.name)
+        if latest is None:
+            print(f"❌ No backups found in '{BACKUP_DIR}'")
+            return
+        manifest_path = input(f"Manifest to restore (default {latest}): ").strip() or latest
+
+        problems = verify_backup(manifest_path)
+        if problems:
+            print("❌ Backup verification failed:")
+            for problem in problems:
+                print(f"   • {problem}")
+            return
+        print(f"✅ Checksums verified for {len(backup_chain(manifest_path))} backup file set(s)")
+
+        print("WARNING: This will replace the current database contents!")
+        confirm = input("Type 'RESTORE' to confirm: ").strip()
+        if confirm != 'RESTORE':
+            print("❌ Cancelled")
+            return
+
+        restore_backup(engine, manifest_path)
+        print("✅ Restore completed")
         
     except Exception as e:
-        print(f"❌ Backup error: {e}")
+        print(f"❌ Restore error: {e}")
+
+def refresh_analytics():
+    """Catch up derived analytics tables with sales they have not seen yet"""
+    if not has_permission(["ADMIN"]):
+        return
+        
+    try:
+        added = catch_up(engine)
+        products = rebuild_product_sales_stats(engine)
+        suppliers = refresh_supplier_scorecards(engine)
+        customers = rebuild_customer_segments(engine)
+        view_rows = refresh_report_views(engine)
+        compacted = compact_notifications(engine)
+        print(f"✅ Analytics tables up to date ({added} new sale lines loaded)")
+        print(f"   Sales stats rebuilt for {products} products")
+        print(f"   Supplier scorecards rebuilt for {suppliers} suppliers")
+        print(f"   Customer segments rebuilt for {customers} customers")
+        print(f"   Report views refreshed ({view_rows} rows)")
+        print(f"   {compacted} notifications read over {READ_RETENTION_DAYS} days ago removed")
+    except Exception as e:
+        print(f"❌ Analytics refresh error: {e}")
+
+def rebuild_sales_rollups():
+    """Rebuild or backfill the hourly/daily/monthly sales rollups"""
+    if not has_permission(["ADMIN"]):
+        return
+        
+    try:
+        since = input("Rebuild from month (YYYY-MM, blank for all history): ").strip() or None
+        catch_up(engine)
+        written = rebuild_rollups(engine, since)
+        scope = f"since {since}" if since else "for all history"
+        print(f"✅ Rebuilt {written} rollup rows {scope}")
+    except Exception as e:
+        print(f"❌ Rollup rebuild error: {e}")
+
+def archive_old_sales():
+    """Move closed months of sales out of the hot tables into the archive"""
+    if not has_permission(["ADMIN"]):
+        return
+        
+    try:
+        catch_up(engine)
+        moved = rollover_sales(engine)
+        summary = partition_summary(engine)
+        print(f"✅ Moved {moved} sales older than {HOT_MONTHS} months to the archive")
+        print(f"   Hot: {summary['hot'][0]} sales | Archived: {summary['archived']} sales")
+    except Exception as e:
+        print(f"❌ Archive error: {e}")
 
 def system_health_check():
     """Check system health and statistics"""
@@ -76,7 +173,7 @@ def purge_old_data():
         with engine.begin() as conn:
             # Count records to be deleted
             count = conn.execute(text("""
-                SELECT COUNT(*) FROM sales 
+                SELECT COUNT(*) FROM sales_history 
                 WHERE sale_time < CURRENT_DATE - INTERVAL ':days days'
             """), {"days": days}).fetchone()[0]
             
@@ -92,6 +189,8 @@ def purge_old_data():
                     DELETE FROM sales 
                     WHERE sale_time < CURRENT_DATE - INTERVAL ':days days'
                 """), {"days": days})
+                purge_archive(conn, days_ago(days))
+                bump_data_version(conn, "sales")
                 print(f"✅ Deleted {count} old sales records")
             else:
                 print("❌ Cancelled")
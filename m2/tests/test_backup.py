@@ -0,0 +1,116 @@
+# test_backup.py - backup/restore round trips with archived sales
+import datetime
+import pytest
+from sqlalchemy import create_engine, text
+
+
+def _history_totals(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("""
+            SELECT COUNT(*), COUNT(DISTINCT sale_id), SUM(total_amount) FROM sales_history
+        """)).fetchone()
+
+
+def test_sqlite_round_trip_includes_sales_archives(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    import db_config
+    import init_db
+    from backup import create_backup, restore_backup, load_manifest
+    from sale_events import catch_up
+    from sales_partitions import rollover_sales
+
+    init_db.init_database()
+    engine = db_config.get_engine()
+    now = datetime.datetime.now()
+    with engine.begin() as conn:
+        product_id = conn.execute(text("SELECT MIN(product_id) FROM products")).scalar()
+        for days in range(600, -1, -30):
+            sale_id = conn.execute(text("""
+                INSERT INTO sales (sale_time, total_amount, payment_method, customer_id, employee_id)
+                VALUES (:t, 5, 'CASH', 1, 1)
+            """), {"t": now - datetime.timedelta(days=days)}).lastrowid
+            conn.execute(text("""
+                INSERT INTO sale_items (sale_id, product_id, quantity, unit_price) VALUES (:s, :p, 2, 2.5)
+            """), {"s": sale_id, "p": product_id})
+    catch_up(engine)
+    assert rollover_sales(engine) > 0
+    engine = db_config.get_engine()
+    expected = _history_totals(engine)
+
+    manifest = create_backup(engine, backup_dir="backups")
+    assert any(e["format"] == "sqlite-archive" for e in load_manifest(manifest)["files"])
+
+    # Lose a whole archive year and some hot rows, then restore
+    year = db_config.sales_archive_years()[0]
+    engine.dispose()
+    (tmp_path / db_config.sales_archive_path(year)).unlink()
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM sale_items"))
+        conn.execute(text("DELETE FROM sales"))
+
+    restore_backup(engine, manifest)
+    assert _history_totals(db_config.get_engine()) == expected
+
+
+def _postgres_engine(schema):
+    import db
+    engine = create_engine(db.get_connection_string(),
+                           connect_args={"options": f"-csearch_path={schema}"})
+    try:
+        with engine.connect():
+            pass
+    except Exception:
+        pytest.skip("no Postgres server available")
+    return engine
+
+
+def test_postgres_round_trip_backs_up_partitions_once(tmp_path):
+    from backup import create_backup, restore_backup, load_manifest
+
+    schema = "backup_round_trip"
+    engine = _postgres_engine(schema)
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {schema}"))
+        conn.execute(text("CREATE TABLE sales (sale_id SERIAL PRIMARY KEY, sale_time TIMESTAMP)"))
+        conn.execute(text("""
+            CREATE TABLE sale_items (sale_item_id SERIAL PRIMARY KEY,
+                                     sale_id INT REFERENCES sales(sale_id) ON DELETE CASCADE)
+        """))
+        conn.execute(text("""
+            CREATE TABLE sales_archive (sale_id INT NOT NULL, sale_time TIMESTAMP NOT NULL,
+                                        PRIMARY KEY (sale_id, sale_time))
+            PARTITION BY RANGE (sale_time)
+        """))
+        conn.execute(text("CREATE INDEX idx_sales_archive_time ON sales_archive(sale_time)"))
+        for month in ("2024_01", "2024_02"):
+            start = month.replace("_", "-") + "-01"
+            end = "2024-02-01" if month == "2024_01" else "2024-03-01"
+            conn.execute(text(f"""
+                CREATE TABLE sales_archive_{month} PARTITION OF sales_archive
+                FOR VALUES FROM ('{start}') TO ('{end}')
+            """))
+        conn.execute(text("""
+            INSERT INTO sales_archive
+            SELECT g, TIMESTAMP '2024-01-01' + g * INTERVAL '1 day' FROM generate_series(0, 50) g
+        """))
+        conn.execute(text("INSERT INTO sales (sale_time) VALUES (now()), (now())"))
+        conn.execute(text("INSERT INTO sale_items (sale_id) VALUES (1), (2)"))
+    try:
+        manifest = create_backup(engine, backup_dir=str(tmp_path))
+        tables = [e["table"] for e in load_manifest(manifest)["files"]]
+        assert "sales_archive" in tables
+        assert not [t for t in tables if t.startswith("sales_archive_")]
+
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE sales_archive_2024_02"))
+        restore_backup(engine, manifest)
+
+        with engine.connect() as conn:
+            assert conn.execute(text("SELECT COUNT(*), COUNT(DISTINCT sale_id) FROM sales_archive")).fetchone() == (51, 51)
+            assert conn.execute(text("SELECT COUNT(*) FROM sales_archive_2024_02")).scalar() == 20
+            assert conn.execute(text("SELECT COUNT(*) FROM sale_items")).scalar() == 2
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        engine.dispose()
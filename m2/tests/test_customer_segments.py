@@ -0,0 +1,31 @@
+# test_customer_segments.py - RFM scoring edge cases
+import datetime
+import pandas as pd
+from customer_segments import rfm_breakpoints, score_rfm
+
+
+def _aggregates(days_ago, today):
+    return pd.DataFrame({
+        "customer_id": range(1, len(days_ago) + 1),
+        "last_purchase": [pd.Timestamp(today - datetime.timedelta(days=d)) for d in days_ago],
+        "frequency": [1] * len(days_ago),
+        "monetary": [10.0] * len(days_ago),
+    })
+
+
+def test_customers_who_bought_today_get_the_best_recency_score():
+    today = datetime.date(2026, 10, 19)
+    aggregates = _aggregates([0] * 6, today)
+    scored = score_rfm(aggregates, rfm_breakpoints(aggregates, today), today)
+    assert scored["r_score"].tolist() == [5] * 6
+
+
+def test_recency_ties_at_a_cut_point_take_the_better_bin():
+    today = datetime.date(2026, 10, 19)
+    aggregates = _aggregates([0, 0, 0, 10, 10, 10, 30, 30, 60, 90], today)
+    scored = score_rfm(aggregates, rfm_breakpoints(aggregates, today), today)
+    by_days = dict(zip([0, 0, 0, 10, 10, 10, 30, 30, 60, 90], scored["r_score"]))
+    assert by_days[0] == 5
+    assert by_days[0] > by_days[10] > by_days[30] > by_days[90]
+    # Same recency, same score
+    assert scored.groupby(scored["last_purchase"])["r_score"].nunique().max() == 1
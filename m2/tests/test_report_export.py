@@ -0,0 +1,32 @@
+# test_report_export.py - chunked exports
+import decimal
+import pandas as pd
+import pyarrow.parquet as pq
+import report_export
+from report_export import export_chunks
+
+
+def test_parquet_leading_all_null_chunk(tmp_path):
+    chunks = [pd.DataFrame({"a": [1, 2], "b": [None, None]}),
+              pd.DataFrame({"a": [3], "b": ["x"]})]
+    path, rows = export_chunks(iter(chunks), "out", "parquet", directory=str(tmp_path))
+    table = pq.read_table(path)
+    assert rows == 3
+    assert table.column("b").to_pylist() == [None, None, "x"]
+    assert table.column("a").to_pylist() == [1, 2, 3]
+
+
+def test_parquet_column_null_past_the_hold_back_limit_is_written_as_strings(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_export, "PARQUET_SCHEMA_ROWS", 2)
+    chunks = [pd.DataFrame({"discount": [None, None]}),
+              pd.DataFrame({"discount": [None]}),
+              pd.DataFrame({"discount": [decimal.Decimal("2.50")]})]
+    path, rows = export_chunks(iter(chunks), "out", "parquet", directory=str(tmp_path))
+    assert rows == 4
+    assert pq.read_table(path).column("discount").to_pylist() == [None, None, None, "2.50"]
+
+
+def test_parquet_all_null_column_stays_null(tmp_path):
+    chunks = [pd.DataFrame({"a": [1], "b": [None]}), pd.DataFrame({"a": [2], "b": [None]})]
+    path, rows = export_chunks(iter(chunks), "out", "parquet", directory=str(tmp_path))
+    assert pq.read_table(path).column("b").to_pylist() == [None, None]